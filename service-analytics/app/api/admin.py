@@ -0,0 +1,28 @@
+# app/api/admin.py
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.core.security import require_admin
+from app.utils.profiler import profile_store
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.get("/profiles")
+async def list_profiles():
+    """
+    Recent request profiles of this replica, newest first.
+    """
+    return {"profiles": profile_store.list(), **profile_store.stats()}
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def download_profile(profile_id: str):
+    """
+    A profile as collapsed stacks ("frame;frame count" per line).
+    Open it in https://www.speedscope.app or pipe it to flamegraph.pl for a flamegraph.
+    """
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (it may have been evicted)")
+    return PlainTextResponse(
+        profile.collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+    )
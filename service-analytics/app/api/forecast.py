@@ -1,20 +1,139 @@
 # app/api/forecast.py
-from fastapi import APIRouter, HTTPException, Query
+import asyncio
+import random
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from app.core.db import db
 from app.core.config import settings
-from app.services.forecasting_service import generate_forecast_for_sku
-from app.models.forecast_response import ForecastResponse, DailyPrediction
+from app.core.executor import ComputeQueueFullError
+from app.core.security import is_admin_token
+from app.utils.profiler import profile_request
+from app.utils.logger import logger
+from app.services.forecasting_service import generate_forecast_for_sku, fetch_histories, regenerations
+from app.services.forecast_cache import forecast_cache
+from app.services.export_service import export_forecasts, export_snapshots, ndjson_stream
+from app.models.forecast_request import BatchForecastRequest
+from app.models.forecast_response import ForecastResponse, DailyPrediction, BatchForecastResponse, BatchForecastError
 
 router = APIRouter()
 
+_background_refreshes = set()
+
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+def _is_stale(existing_forecast: dict, days: int, latest_snapshot_at) -> bool:
+    """
+    A forecast is stale if:
+    A) It was generated with a shorter horizon than currently requested
+    B) New data (snapshots) has arrived since it was generated
+    """
+    if existing_forecast.get("forecast_horizon", 0) < days:
+        return True
+    return latest_snapshot_at is not None and latest_snapshot_at > existing_forecast.get("generated_at")
+
+def _to_response(forecast_doc: dict, days: int, is_stale: bool = False) -> ForecastResponse:
+    # Filter the forecast_data to match strictly the requested 'days' (if we have more cached)
+    all_predictions = forecast_doc.get("forecasts", [])
+    sliced_predictions = all_predictions[:days]
+
+    return ForecastResponse(
+        product_sku=forecast_doc["product_sku"],
+        model_version=forecast_doc["model_version"],
+        forecast_horizon_days=days,
+        confidence_score=forecast_doc.get("confidence_score_r2", 0.0),
+        generated_at=forecast_doc["generated_at"],
+        is_stale=is_stale,
+        forecast_data=[
+            DailyPrediction(date=p["date"], predicted_demand=p["predicted_units"])
+            for p in sliced_predictions
+        ]
+    )
+
+async def _regenerate(sku: str, days: int, history=None) -> dict:
+    """
+    Runs the forecasting pipeline, translating capacity problems into HTTP errors.
+    """
+    # Note: The CPU-bound stages run on the compute executor, so awaiting
+    # here does not block other requests or the change stream listener.
+    try:
+        forecast_doc = await regenerations.run(
+            (sku, days),
+            lambda: generate_forecast_for_sku(sku, horizon=days, history=history)
+        )
+    except ComputeQueueFullError:
+        raise HTTPException(status_code=503, detail="Forecasting capacity exhausted, retry shortly")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Forecast generation timed out")
+
+    if not forecast_doc:
+        raise HTTPException(status_code=404, detail="Insufficient historical data to generate forecast")
+    return forecast_doc
+
+def _refresh_in_background(sku: str, days: int, generation: int) -> None:
+    """
+    Stale-while-revalidate: regenerates (at most once per key) without blocking the request.
+    """
+    if regenerations.in_flight((sku, days)):
+        return
+
+    async def refresh() -> None:
+        try:
+            forecast_cache.put(await _regenerate(sku, days), generation)
+        except HTTPException as e:
+            logger.warning(f"⚠️ Background refresh for {sku} failed: {e.detail}")
+        except Exception as e:
+            logger.error(f"❌ Background refresh for {sku} failed: {e}")
+
+    # Keep a reference so the task is not garbage collected mid-flight
+    task = asyncio.create_task(refresh())
+    _background_refreshes.add(task)
+    task.add_done_callback(_background_refreshes.discard)
+
+def _profiling_trigger(requested: bool, admin_token: Optional[str]) -> Optional[str]:
+    """
+    Why this request is profiled ("admin" or "sampled"), or None.
+    """
+    if requested:
+        if not is_admin_token(admin_token):
+            raise HTTPException(status_code=403, detail="Profiling requires an admin token")
+        return "admin"
+    if settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
 @router.get("/predict/{sku}", response_model=ForecastResponse)
-async def get_prediction(sku: str, days: int = Query(7, gt=0, le=30)):
+async def get_prediction(
+    sku: str,
+    days: int = Query(7, gt=0, le=30),
+    profile: bool = Query(False, description="Profile this request (admin only)"),
+    x_profile: bool = Header(False),
+    x_admin_token: Optional[str] = Header(None)
+):
     """
-    Get demand forecast for a product. 
+    Get demand forecast for a product.
     Smartly determines if the cached forecast is fresh enough or needs regeneration.
+
+    With `?profile=true` or `X-Profile: true` (plus `X-Admin-Token`), or when
+    picked by PROFILE_SAMPLE_RATE, the request is profiled; see /api/admin/profiles.
     """
+    trigger = _profiling_trigger(profile or x_profile, x_admin_token)
+    if trigger is None:
+        return await _get_prediction(sku, days)
+
+    async with profile_request("GET /api/forecast/predict/{sku}", trigger, sku=sku, days=days):
+        return await _get_prediction(sku, days)
+
+async def _get_prediction(sku: str, days: int) -> ForecastResponse:
+    # 0. In-process cache: invalidated by this replica's ETL only, so a hit may
+    #    miss another replica's snapshots for up to FORECAST_CACHE_TTL_SECONDS
+    cached = forecast_cache.get(sku, days)
+    if cached:
+        return _to_response(cached, days)
+
+    generation = forecast_cache.generation(sku)
     db_instance = db.get_db()
-    
+
     # 1. Fetch existing forecast
     existing_forecast = await db_instance[settings.COLLECTION_FORECASTS].find_one(
         {"product_sku": sku}
@@ -24,54 +143,129 @@ async def get_prediction(sku: str, days: int = Query(7, gt=0, le=30)):
 
     if not existing_forecast:
         should_regenerate = True
+    elif _is_stale(existing_forecast, days, latest_snapshot_at=None):
+        # 2a. Freshness Check A: Horizon
+        should_regenerate = True
     else:
-        # 2. Freshness Check: Is the existing forecast stale?
-        # A forecast is stale if:
-        # A) It was generated with a shorter horizon than currently requested
-        # B) New data (snapshots) has arrived since it was generated
-        
-        # Check A: Horizon
-        if existing_forecast.get("forecast_horizon", 0) < days:
+        # 2b. Freshness Check B: Look for any snapshot created AFTER the forecast
+        new_data_exists = await db_instance[settings.COLLECTION_DAILY_SNAPSHOTS].find_one({
+            "product_sku": sku,
+            "generated_at": {"$gt": existing_forecast.get("generated_at")}
+        })
+
+        if new_data_exists and settings.FORECAST_STALE_WHILE_REVALIDATE:
+            # 2c. Serve the existing forecast now and refresh it off the request path
+            _refresh_in_background(sku, days, generation)
+            return _to_response(existing_forecast, days, is_stale=True)
+
+        if new_data_exists:
             should_regenerate = True
-        else:
-            # Check B: Data Freshness
-            last_generation_time = existing_forecast.get("generated_at")
-            
-            # Look for any snapshot created AFTER the forecast
-            new_data_exists = await db_instance[settings.COLLECTION_DAILY_SNAPSHOTS].find_one({
-                "product_sku": sku,
-                "generated_at": {"$gt": last_generation_time}
-            })
-            
-            if new_data_exists:
-                should_regenerate = True
 
     # 3. Regenerate or Reuse
     if should_regenerate:
         # Invoke Phase 4 Service
-        # Note: This awaits the potentially expensive operation. 
-        # In a higher-load system, this might be offloaded to a background worker,
-        # but for this microservice design, direct await is acceptable.
-        forecast_doc = await generate_forecast_for_sku(sku, horizon=days)
-        
-        if not forecast_doc:
-            raise HTTPException(status_code=404, detail="Insufficient historical data to generate forecast")
+        forecast_doc = await _regenerate(sku, days)
     else:
         forecast_doc = existing_forecast
 
+    forecast_cache.put(forecast_doc, generation)
+
     # 4. Map to Response Model
-    # Filter the forecast_data to match strictly the requested 'days' (if we have more cached)
-    all_predictions = forecast_doc.get("forecasts", [])
-    sliced_predictions = all_predictions[:days]
+    return _to_response(forecast_doc, days)
 
-    return ForecastResponse(
-        product_sku=forecast_doc["product_sku"],
-        model_version=forecast_doc["model_version"],
-        forecast_horizon_days=days,
-        confidence_score=forecast_doc.get("confidence_score_r2", 0.0),
-        generated_at=forecast_doc["generated_at"],
-        forecast_data=[
-            DailyPrediction(date=p["date"], predicted_demand=p["predicted_units"]) 
-            for p in sliced_predictions
-        ]
-    )
\ No newline at end of file
+@router.post("/predict/batch", response_model=BatchForecastResponse)
+async def get_batch_prediction(request: BatchForecastRequest):
+    """
+    Get demand forecasts for many products in one request.
+
+    Uses a constant number of queries for the freshness checks (one `$in` for
+    existing forecasts, one grouped probe for the newest snapshot per SKU, one
+    `$in` for the history of stale SKUs) and regenerates stale SKUs concurrently.
+    Failures are reported per SKU instead of failing the whole batch.
+    """
+    db_instance = db.get_db()
+    days = request.days
+    skus = list(dict.fromkeys(request.skus)) # De-duplicate, keep order
+
+    # 1. Fetch existing forecasts
+    existing = {
+        doc["product_sku"]: doc
+        async for doc in db_instance[settings.COLLECTION_FORECASTS].find({"product_sku": {"$in": skus}})
+    }
+
+    # 2. Newest snapshot per SKU (one grouped query instead of one probe per SKU)
+    latest_snapshot_at = {
+        row["_id"]: row["latest"]
+        async for row in db_instance[settings.COLLECTION_DAILY_SNAPSHOTS].aggregate([
+            {"$match": {"product_sku": {"$in": list(existing)}}},
+            {"$sort": {"product_sku": 1, "generated_at": -1}},
+            {"$group": {"_id": "$product_sku", "latest": {"$first": "$generated_at"}}}
+        ])
+    } if existing else {}
+
+    stale = [
+        sku for sku in skus
+        if sku not in existing or _is_stale(existing[sku], days, latest_snapshot_at.get(sku))
+    ]
+
+    # 3. Regenerate only the stale ones, concurrently, from one history query
+    histories = await fetch_histories(stale) if stale else {}
+    semaphore = asyncio.Semaphore(settings.BATCH_FORECAST_CONCURRENCY)
+    errors = []
+
+    async def regenerate(sku: str) -> None:
+        async with semaphore:
+            try:
+                existing[sku] = await _regenerate(sku, days, history=histories[sku])
+            except HTTPException as e:
+                existing.pop(sku, None)
+                errors.append(BatchForecastError(product_sku=sku, status_code=e.status_code, detail=e.detail))
+            except Exception as e:
+                logger.error(f"❌ Batch forecast failed for {sku}: {e}")
+                existing.pop(sku, None)
+                errors.append(BatchForecastError(product_sku=sku, status_code=500, detail=str(e)))
+
+    await asyncio.gather(*(regenerate(sku) for sku in stale))
+
+    # 4. Map to Response Models (request order)
+    return BatchForecastResponse(
+        forecasts=[_to_response(existing[sku], days) for sku in skus if sku in existing],
+        errors=errors
+    )
+
+def _ndjson_response(records, compress: bool, filename: str) -> StreamingResponse:
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.ndjson"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(ndjson_stream(records, compress), media_type="application/x-ndjson", headers=headers)
+
+@router.get("/export/forecasts")
+async def export_forecast_documents(
+    after_sku: Optional[str] = Query(None, description="Keyset cursor: the last product_sku of the previous page"),
+    limit: int = Query(0, ge=0, description="Maximum SKUs in this page (0 = all)"),
+    model_version: Optional[str] = None,
+    start_date: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    end_date: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    gzip: bool = False
+):
+    """
+    Streams the latest forecast of every SKU as NDJSON (one document per line),
+    in SKU order. Memory stays flat regardless of catalog size.
+    """
+    records = export_forecasts(after_sku, limit, model_version, start_date, end_date)
+    return _ndjson_response(records, gzip, "forecasts")
+
+@router.get("/export/snapshots")
+async def export_snapshot_documents(
+    after_sku: Optional[str] = Query(None, description="Keyset cursor: the last product_sku of the previous page"),
+    limit: int = Query(0, ge=0, description="Maximum SKUs in this page (0 = all)"),
+    start_date: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    end_date: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    gzip: bool = False
+):
+    """
+    Streams daily sales snapshots as NDJSON ordered by (product_sku, date_key).
+    A page never splits a SKU's history.
+    """
+    records = export_snapshots(after_sku, limit, start_date, end_date)
+    return _ndjson_response(records, gzip, "snapshots")
@@ -0,0 +1,30 @@
+# app/api/sales.py
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.services.rollup_service import query_rollups
+from app.models.sales_response import RollupResponse, RollupPoint
+
+router = APIRouter()
+
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+@router.get("/rollups/{granularity}", response_model=RollupResponse)
+async def get_rollups(
+    granularity: Literal["weekly", "monthly", "catalog_daily"],
+    sku: Optional[str] = Query(None, description="Required for weekly and monthly rollups"),
+    start: Optional[str] = Query(None, pattern=DATE_PATTERN, description="Earliest period start (inclusive)"),
+    end: Optional[str] = Query(None, pattern=DATE_PATTERN, description="Latest period start (inclusive)")
+):
+    """
+    Pre-aggregated sales per period, read straight from the rollup collections
+    (no aggregation over the daily snapshots).
+    """
+    if granularity != "catalog_daily" and not sku:
+        raise HTTPException(status_code=422, detail=f"'sku' is required for {granularity} rollups")
+
+    rows = await query_rollups(granularity, sku, start, end)
+    return RollupResponse(
+        granularity=granularity,
+        product_sku=sku if granularity != "catalog_daily" else None,
+        points=[RollupPoint(**row) for row in rows]
+    )
@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -9,6 +10,20 @@ class Settings(BaseSettings):
     # Database (Load from .env)
     MONGO_URI: str
     DB_NAME: str = "inventory_analytics"
+    MONGO_ENSURE_INDEXES: bool = True  # Create the compound indexes the read paths rely on at startup (in the background)
+
+    # MongoDB Client Pools (GET /health reports their saturation)
+    MONGO_MAX_POOL_SIZE: int = 100  # Write client: ETL, checkpoints, forecasts, leases
+    MONGO_MIN_POOL_SIZE: int = 0  # Connections kept open per server, per client
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 0  # Fail a checkout after waiting this long for a free connection (0 = wait)
+    MONGO_WRITE_CONCERN: str = ""  # "" = server default, "majority" or a number of nodes
+    MONGO_WRITE_JOURNAL: Optional[bool] = None  # Wait for the journal before acknowledging (None = server default)
+    MONGO_COMPRESSORS: str = "zstd,snappy"  # Wire compression preference; unavailable ones are skipped ("" = off)
+    MONGO_READ_URI: Optional[str] = None  # Analytical reads; defaults to MONGO_URI (e.g. an Atlas analytics node)
+    MONGO_READ_MAX_POOL_SIZE: int = 20  # Separate pool for exports, rollup queries and catalog scans (0 = share the write client)
+    MONGO_READ_PREFERENCE: str = "secondaryPreferred"
+    MONGO_READ_MAX_STALENESS_SECONDS: int = 0  # Skip secondaries lagging more than this (0 = no limit, minimum 90)
+    MONGO_READ_BATCH_SIZE: int = 1000  # Documents per round trip for history and rollup scans (driver default: 101 first)
     
     # Collection Names (Constants)
     COLLECTION_ORDERS: str = "orders"  # We read from this (Operational)
@@ -16,9 +31,103 @@ class Settings(BaseSettings):
     COLLECTION_DAILY_SNAPSHOTS: str = "daily_sales_snapshots"
     COLLECTION_FORECASTS: str = "demand_forecasts"
     COLLECTION_PRODUCTS: str = "products"  # For SKU lookup
+    COLLECTION_CHECKPOINTS: str = "etl_checkpoints"  # Resume tokens & job progress
+    COLLECTION_MODEL_REGISTRY: str = "model_registry"  # Fitted coefficients per SKU
+    COLLECTION_TRAINING_STATS: str = "training_stats"  # Per-SKU OLS sufficient statistics
+    COLLECTION_LEASES: str = "etl_leases"  # Partition leases & replica heartbeats
+    COLLECTION_WEEKLY_ROLLUPS: str = "sales_rollups_weekly"  # Per SKU and ISO week
+    COLLECTION_MONTHLY_ROLLUPS: str = "sales_rollups_monthly"  # Per SKU and month
+    COLLECTION_CATALOG_DAILY_ROLLUPS: str = "sales_rollups_catalog_daily"  # All SKUs per day
     
+    # ETL Config
+    ETL_BULK_WRITES: bool = True  # One $in lookup + two bulk_writes per order instead of 3 round trips per item
+    ETL_BATCH_SIZE: int = 500  # Flush the change stream buffer at this many events...
+    ETL_BATCH_MAX_LATENCY_MS: int = 200  # ...or once the oldest buffered event is this old
+    ETL_CHECKPOINT_NAME: str = "orders_stream"
+    ETL_RETRY_MAX_DELAY_SECONDS: float = 30.0
+    ETL_WORKER_CONCURRENCY: int = 8  # Partitioned asyncio ETL workers (1 = serial)
+    ETL_WORKER_QUEUE_SIZE: int = 1000  # Per-worker queue bound (backpressure on the stream)
+    ETL_PARTITION_KEY: str = "sku"  # "sku" or "order_id"
+    ETL_DRAIN_TIMEOUT_SECONDS: float = 10.0
+    ROLLUPS_ENABLED: bool = True  # Maintain weekly/monthly/catalog-daily rollups alongside the snapshots
+
+    # Multi-replica Change Stream Consumption (leases in COLLECTION_LEASES)
+    ETL_COORDINATION_ENABLED: bool = True  # Replicas lease stream partitions instead of each reading everything
+    ETL_PARTITIONS: int = 1  # Disjoint slices of the order stream (hash of order_id); set >= replica count
+    ETL_LEASE_TTL_SECONDS: float = 30.0  # A dead replica's partitions fail over after this long
+    ETL_LEASE_RENEW_SECONDS: float = 10.0  # Renewal / rebalancing interval
+    REPLICA_ID: Optional[str] = None  # Defaults to <hostname>-<pid>
+
+    # Historical Backfill (python -m app.workers.backfill)
+    BACKFILL_WORKERS: int = 4
+    BACKFILL_CHUNK_SIZE: int = 1000
+
+    # Product Catalog Cache (product_id -> SKU)
+    PRODUCT_CACHE_ENABLED: bool = True
+    PRODUCT_CACHE_MAX_SIZE: int = 50_000
+
     # ML Config
     MODEL_VERSION: str = "v1.0_linear"
+    MODEL_REGISTRY_ENABLED: bool = True  # Reuse stored coefficients while the data watermark is unchanged
+    FORECAST_TRAINING_WINDOW: int = 730  # Newest snapshots per SKU used for training (0 = whole history)
+    TRAINING_MODE: str = "full"  # "full" refit or "incremental" (solve from ETL-maintained sufficient statistics)
+
+    # Local Columnar History Store (optional, requires pyarrow)
+    HISTORY_STORE_ENABLED: bool = False
+    HISTORY_STORE_PATH: str = "data/history_store"
+    HISTORY_STORE_BUCKETS: int = 64  # SKU hash partitions (one Parquet file each)
+    HISTORY_STORE_COMPACT_INTERVAL_SECONDS: float = 300.0
+
+    # Calendar Features (holidays for training and forecasting)
+    CALENDAR_REGION: str = "US"  # Built-in holiday rules to use (see app/ml/calendar.py)
+    CALENDAR_START_YEAR: int = 2015
+    CALENDAR_END_YEAR: int = 2040
+    CALENDAR_EXTRA_HOLIDAYS: str = ""  # Comma-separated YYYY-MM-DD dates added to the region's holidays
+    CALENDAR_HOLIDAYS_FILE: Optional[str] = None  # JSON {"<region>": ["YYYY-MM-DD", ...]}
+
+    # Forecast Cache (GET /api/forecast/predict/{sku})
+    FORECAST_CACHE_ENABLED: bool = True
+    FORECAST_CACHE_MAX_SIZE: int = 10_000
+    FORECAST_CACHE_TTL_SECONDS: float = 300.0  # Max staleness of a hit for snapshots written by other replicas (invalidation is in-process)
+    FORECAST_STALE_WHILE_REVALIDATE: bool = False  # Serve the outdated forecast (is_stale=true) while it regenerates
+
+    # Forecast Precomputation Scheduler
+    FORECAST_SCHEDULER_ENABLED: bool = True
+    FORECAST_SCHEDULER_INTERVAL_SECONDS: float = 30.0  # Poll interval while no SKU is dirty
+    FORECAST_SCHEDULER_BATCH_SIZE: int = 200  # SKUs regenerated per batch (hottest first)
+    FORECAST_SCHEDULER_CONCURRENCY: int = 2  # Concurrent regenerations
+    FORECAST_SCHEDULER_EXECUTOR_SHARE: float = 0.5  # Max share of the compute queue the scheduler may occupy
+    FORECAST_SCHEDULER_HORIZON: int = 30  # Precompute the longest horizon the API serves
+    FORECAST_SWEEP_HOUR_UTC: int = 2  # Hour of the nightly full-catalog sweep (-1 disables)
+    FORECAST_SWEEP_VELOCITY_DAYS: int = 7  # Window used to rank SKUs in the sweep
+
+    # Batch Forecasting (POST /api/forecast/predict/batch)
+    BATCH_FORECAST_MAX_SKUS: int = 5000
+    BATCH_FORECAST_CONCURRENCY: int = 16  # Concurrent regenerations per batch request
+
+    # Bulk Export (GET /api/forecast/export/...)
+    EXPORT_CURSOR_BATCH_SIZE: int = 1000  # Documents per cursor round trip
+    EXPORT_CHUNK_BYTES: int = 64 * 1024  # NDJSON bytes per streamed chunk (before gzip)
+
+    # Compute Executor (CPU-bound forecasting stages)
+    COMPUTE_EXECUTOR: str = "process"  # "process" or "thread"
+    COMPUTE_MAX_WORKERS: int = 0  # 0 = one worker per CPU core
+    COMPUTE_MAX_PENDING: int = 64  # Queued + running jobs before new ones are rejected
+    COMPUTE_TIMEOUT_SECONDS: float = 30.0
+
+    # Admin Endpoints & Request Profiling (/api/admin)
+    ADMIN_TOKEN: Optional[str] = None  # Sent as X-Admin-Token; admin endpoints are closed while unset
+    PROFILE_SAMPLE_RATE: float = 0.0  # Fraction of forecast requests profiled without being asked
+    PROFILE_INTERVAL_MS: float = 5.0  # Stack sampling interval
+    PROFILE_MAX_STORED: int = 50  # Most recent profiles kept in memory per replica
+
+    # Metrics (GET /metrics, Prometheus text format)
+    METRICS_ENABLED: bool = True  # Cheap enough to leave on; false also skips recording
+
+    # Startup (cold start report in the logs and on /stats)
+    STARTUP_TARGET_SECONDS: float = 5.0  # Warn when the first healthy response comes later (0 = no target)
+    ML_WARMUP_ENABLED: bool = True  # Import pandas/scikit-learn in the background after startup
+    ML_WARMUP_DELAY_SECONDS: float = 1.0  # Let the first requests through before warming
 
     class Config:
         env_file = ".env"
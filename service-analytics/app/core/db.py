@@ -1,22 +1,231 @@
+import importlib.util
+import threading
+from typing import Dict, List
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from pymongo.monitoring import ConnectionCheckOutFailedReason, ConnectionPoolListener
 from app.core.config import settings
+from app.utils.metrics import metrics
+
+# Wire compressor -> module the driver needs for it
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+def available_compressors(names: str) -> List[str]:
+    """
+    The compressors of a comma-separated preference list the driver can use here.
+    """
+    available = []
+    for name in filter(None, (part.strip() for part in names.split(","))):
+        module = COMPRESSOR_MODULES.get(name)
+        if module is None:
+            print(f"⚠️ Unknown MongoDB compressor '{name}' ignored")
+        elif importlib.util.find_spec(module) is None:
+            print(f"⚠️ MongoDB compressor '{name}' needs the '{module}' package, skipped")
+        else:
+            available.append(name)
+    return available
+
+class PoolMonitor(ConnectionPoolListener):
+    """
+    Connection pool (CMAP) counters of one client, per server.
+
+    The driver calls the listener from its own threads, hence the lock.
+    """
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self.open: Dict[tuple, int] = {}
+        self.checked_out: Dict[tuple, int] = {}
+        self.waiting = 0
+        self.peak_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_timeouts = 0
+        self.checkout_wait_seconds = 0.0
+        self.max_checkout_wait_seconds = 0.0
+        self.pool_clears = 0
+
+    def pool_created(self, event) -> None:
+        with self._lock:
+            self.open.setdefault(event.address, 0)
+            self.checked_out.setdefault(event.address, 0)
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event) -> None:
+        with self._lock:
+            self.open.pop(event.address, None)
+            self.checked_out.pop(event.address, None)
+
+    def connection_created(self, event) -> None:
+        with self._lock:
+            self.open[event.address] = self.open.get(event.address, 0) + 1
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_closed(self, event) -> None:
+        with self._lock:
+            if self.open.get(event.address):
+                self.open[event.address] -= 1
+
+    def connection_check_out_started(self, event) -> None:
+        with self._lock:
+            self.waiting += 1
+
+    def connection_check_out_failed(self, event) -> None:
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+            if event.reason == ConnectionCheckOutFailedReason.TIMEOUT:
+                self.checkout_timeouts += 1
+
+    def connection_checked_out(self, event) -> None:
+        with self._lock:
+            self.waiting -= 1
+            self.checkouts += 1
+            self.checked_out[event.address] = self.checked_out.get(event.address, 0) + 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out[event.address])
+            wait = event.duration or 0.0
+            self.checkout_wait_seconds += wait
+            self.max_checkout_wait_seconds = max(self.max_checkout_wait_seconds, wait)
+
+    def connection_checked_in(self, event) -> None:
+        with self._lock:
+            if self.checked_out.get(event.address):
+                self.checked_out[event.address] -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            busiest = max(self.checked_out.values(), default=0)
+            return {
+                "max_pool_size": self.max_pool_size,
+                "servers": len(self.open),
+                "open_connections": sum(self.open.values()),
+                "checked_out": sum(self.checked_out.values()),
+                "waiting": self.waiting,
+                # Share of the busiest server's pool in use; requests queue at 1.0
+                "saturation": round(busiest / self.max_pool_size, 3) if self.max_pool_size else None,
+                "peak_checked_out": self.peak_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checkout_timeouts": self.checkout_timeouts,
+                "avg_checkout_wait_ms": round(self.checkout_wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_checkout_wait_ms": round(self.max_checkout_wait_seconds * 1000, 3),
+                "pool_clears": self.pool_clears
+            }
+
+def _client_options(max_pool_size: int, compressors: List[str]) -> dict:
+    options = {
+        "maxPoolSize": max_pool_size,
+        "minPoolSize": min(settings.MONGO_MIN_POOL_SIZE, max_pool_size),
+        "event_listeners": [PoolMonitor(max_pool_size)]
+    }
+    if settings.MONGO_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = settings.MONGO_WAIT_QUEUE_TIMEOUT_MS
+    if compressors:
+        # The server picks the first one it also supports
+        options["compressors"] = ",".join(compressors)
+    return options
 
 class Database:
-    client: AsyncIOMotorClient = None
+    client: AsyncIOMotorClient = None  # ETL writes and latency-sensitive reads (primary)
+    read_client: AsyncIOMotorClient = None  # Analytical scans; same as `client` when MONGO_READ_MAX_POOL_SIZE=0
+    pools: Dict[str, PoolMonitor] = {}
 
     def connect(self):
-        """Establish connection to MongoDB."""
-        self.client = AsyncIOMotorClient(settings.MONGO_URI)
+        """Establish connection to MongoDB (a write client and, optionally, a read client)."""
+        compressors = available_compressors(settings.MONGO_COMPRESSORS)
+        write_options = _client_options(settings.MONGO_MAX_POOL_SIZE, compressors)
+        if settings.MONGO_WRITE_CONCERN:
+            w = settings.MONGO_WRITE_CONCERN
+            write_options["w"] = int(w) if w.isdigit() else w
+        if settings.MONGO_WRITE_JOURNAL is not None:
+            write_options["journal"] = settings.MONGO_WRITE_JOURNAL
+        self.client = AsyncIOMotorClient(settings.MONGO_URI, **write_options)
+        self.pools = {"write": write_options["event_listeners"][0]}
         print(f"✅ Connected to MongoDB at {settings.MONGO_URI.split('@')[-1]}") # Log safe part of URI
 
+        if settings.MONGO_READ_MAX_POOL_SIZE:
+            read_uri = settings.MONGO_READ_URI or settings.MONGO_URI
+            read_options = _client_options(settings.MONGO_READ_MAX_POOL_SIZE, compressors)
+            read_options["readPreference"] = settings.MONGO_READ_PREFERENCE
+            if settings.MONGO_READ_MAX_STALENESS_SECONDS > 0:
+                read_options["maxStalenessSeconds"] = settings.MONGO_READ_MAX_STALENESS_SECONDS
+            self.read_client = AsyncIOMotorClient(read_uri, **read_options)
+            self.pools["read"] = read_options["event_listeners"][0]
+            print(f"✅ Analytical reads use a separate pool ({settings.MONGO_READ_PREFERENCE}) at {read_uri.split('@')[-1]}")
+        else:
+            self.read_client = self.client
+
     def close(self):
         """Close connection."""
+        if self.read_client is not None and self.read_client is not self.client:
+            self.read_client.close()
+        self.read_client = None
         if self.client:
             self.client.close()
             print("🛑 Disconnected from MongoDB")
 
+    async def ensure_indexes(self):
+        """
+        Creates the indexes the forecasting read paths rely on (no-op if they exist).
+        """
+        snapshots = self.get_db()[settings.COLLECTION_DAILY_SNAPSHOTS]
+        # Training window: find(product_sku).sort(date_key, -1).limit(window)
+        await snapshots.create_index([("product_sku", ASCENDING), ("date_key", ASCENDING)])
+        # Freshness probe: product_sku + generated_at > forecast/model time
+        await snapshots.create_index([("product_sku", ASCENDING), ("generated_at", ASCENDING)])
+        # Catalog-wide rollup refreshes by day
+        await snapshots.create_index("date_key")
+        # Replay-safe snapshot recompute (backfill): product_sku + timestamp range
+        await self.get_db()[settings.COLLECTION_RAW_EVENTS].create_index([("product_sku", ASCENDING), ("timestamp", ASCENDING)])
+        # Rollup repairs: catalog-wide timestamp range
+        await self.get_db()[settings.COLLECTION_RAW_EVENTS].create_index("timestamp")
+        # Rollup queries by SKU and period range; repairs by period
+        for name in (settings.COLLECTION_WEEKLY_ROLLUPS, settings.COLLECTION_MONTHLY_ROLLUPS):
+            await self.get_db()[name].create_index([("product_sku", ASCENDING), ("period_start", ASCENDING)])
+            await self.get_db()[name].create_index("period")
+        await self.get_db()[settings.COLLECTION_CATALOG_DAILY_ROLLUPS].create_index("period_start")
+        # Forecast upserts and keyset-paginated export by SKU
+        await self.get_db()[settings.COLLECTION_FORECASTS].create_index("product_sku")
+        # Heartbeats of replicas that are gone for good (and unused partitions) are dropped after a day
+        await self.get_db()[settings.COLLECTION_LEASES].create_index("expires_at", expireAfterSeconds=86400)
+        # Raw-event upserts by event_id; unique, so concurrent replays of an order
+        # insert it once (last: fails on data that already holds duplicates)
+        await self.get_db()[settings.COLLECTION_RAW_EVENTS].create_index("event_id", unique=True)
+        print("✅ MongoDB indexes ensured")
+
     def get_db(self):
         """Get the database instance."""
         return self.client[settings.DB_NAME]
 
-db = Database()
\ No newline at end of file
+    def get_read_db(self):
+        """
+        Database for analytical scans (nightly sweep, exports, rollups, store rebuilds).
+
+        May read from a secondary, i.e. lag the primary by the replication delay;
+        anything that must see the ETL's latest writes uses `get_db()`.
+        """
+        client = self.read_client if self.read_client is not None else self.client
+        return client[settings.DB_NAME]
+
+    def pool_stats(self) -> Dict[str, dict]:
+        return {name: monitor.stats() for name, monitor in self.pools.items()}
+
+db = Database()
+
+metrics.gauge(
+    "analytics_mongo_pool_checked_out", "MongoDB connections in use, per client", ["client"],
+    fn=lambda: {(name,): stats["checked_out"] for name, stats in db.pool_stats().items()}
+)
+metrics.gauge(
+    "analytics_mongo_pool_waiting", "Operations waiting for a MongoDB connection, per client", ["client"],
+    fn=lambda: {(name,): stats["waiting"] for name, stats in db.pool_stats().items()}
+)
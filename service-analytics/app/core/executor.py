@@ -0,0 +1,94 @@
+# app/core/executor.py
+import asyncio
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from app.core.config import settings
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+class ComputeQueueFullError(Exception):
+    """Raised when the compute executor already has its maximum of pending jobs."""
+
+class ComputeExecutor:
+    """
+    Runs CPU-bound work (pandas / scikit-learn) off the event loop.
+
+    Backed by a process pool (true parallelism, arguments must be picklable
+    plain data) or a thread pool (cheaper hand-off, limited by the GIL for
+    pure-Python work). Submissions are bounded and time-limited so a burst of
+    forecast requests cannot queue unbounded work behind the API.
+    """
+
+    def __init__(self, kind: str, max_workers: int, max_pending: int, timeout: float):
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._pending_lock = threading.Lock()  # Jobs are released from the pool's threads
+
+    def start(self) -> None:
+        if self._executor is not None:
+            return
+        if self.kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="compute")
+        logger.info(f"🧮 Compute executor started ({self.kind} pool, {self.max_workers} workers)")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Submits `fn(*args)` to the pool and awaits its result.
+
+        Raises:
+            ComputeQueueFullError: `max_pending` jobs are already queued or running.
+            asyncio.TimeoutError: the job did not finish within `timeout` seconds.
+        """
+        if self._executor is None:
+            self.start()
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                raise ComputeQueueFullError(f"Compute queue full ({self.max_pending} pending jobs)")
+            self._pending += 1
+
+        try:
+            job = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is freed when the job itself ends, not when we stop waiting:
+        # a timed-out job cannot be cancelled once it runs and still holds a worker
+        job.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.wrap_future(job), timeout=self.timeout)
+
+    def _release(self, job=None) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending
+        }
+
+compute_executor = ComputeExecutor(
+    kind=settings.COMPUTE_EXECUTOR,
+    max_workers=settings.COMPUTE_MAX_WORKERS or os.cpu_count() or 1,
+    max_pending=settings.COMPUTE_MAX_PENDING,
+    timeout=settings.COMPUTE_TIMEOUT_SECONDS
+)
+
+metrics.gauge(
+    "analytics_compute_pending_jobs", "Forecasting jobs queued or running on the compute executor",
+    fn=lambda: compute_executor.stats()["pending"]
+)
@@ -0,0 +1,20 @@
+# app/core/security.py
+import secrets
+from typing import Optional
+from fastapi import Header, HTTPException
+from app.core.config import settings
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """
+    True if `token` matches ADMIN_TOKEN (always False while no token is configured).
+    """
+    if not settings.ADMIN_TOKEN or not token:
+        return False
+    return secrets.compare_digest(token.encode(), settings.ADMIN_TOKEN.encode())
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    FastAPI dependency for admin-only endpoints.
+    """
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
@@ -0,0 +1,95 @@
+# app/core/startup.py
+"""
+Cold-start bookkeeping and the background warm-up of the ML stack.
+
+pandas and scikit-learn take ~2s to import, so the modules that use them
+import them inside the functions that need them: the API, the ETL and the
+change stream start without them. Once the service accepts traffic,
+`warm_up_ml` imports them where forecasts are computed (every compute worker
+process, or this process with a thread executor), so the first forecast does
+not pay for them either.
+"""
+import asyncio
+import importlib
+import time
+
+# Imported first by app.main, so this is (nearly) when the app started loading
+IMPORT_STARTED = time.perf_counter()
+
+from typing import Dict, Optional
+from app.core.config import settings
+from app.utils.logger import logger
+
+ML_MODULES = ("pandas", "sklearn.linear_model", "sklearn.metrics", "app.services.feature_engineering")
+
+def import_ml_stack() -> float:
+    """
+    Imports the ML stack into the calling process (runs in compute workers).
+
+    Returns:
+        Seconds spent importing (about 0 if it was already loaded).
+    """
+    started = time.perf_counter()
+    for name in ML_MODULES:
+        importlib.import_module(name)
+    return time.perf_counter() - started
+
+class StartupTimeline:
+    """
+    Seconds from the first import of `app.main` to each startup milestone
+    (imports, database, product cache, ready, first healthy response, ML warm).
+    """
+
+    def __init__(self, target_seconds: float):
+        self.started = IMPORT_STARTED
+        self.target_seconds = target_seconds
+        self.milestones: Dict[str, float] = {}
+        self.ml_import_seconds: Optional[float] = None  # Slowest worker's import
+
+    def mark(self, milestone: str) -> float:
+        """
+        Records a milestone (the first time only) and returns its elapsed seconds.
+        """
+        return self.milestones.setdefault(milestone, round(time.perf_counter() - self.started, 4))
+
+    def healthy(self) -> None:
+        """
+        Records the first healthy response and logs the startup report once.
+        """
+        if "first_healthy_response" in self.milestones:
+            return
+        elapsed = self.mark("first_healthy_response")
+        report = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.milestones.items())
+        if self.target_seconds and elapsed > self.target_seconds:
+            logger.warning(f"⚠️ Cold start over its {self.target_seconds:.1f}s target: {report}")
+        else:
+            logger.info(f"⏱️ Cold start: {report}")
+
+    async def warm_up_ml(self, executor, delay: float) -> None:
+        """
+        Imports the ML stack in the background, `delay` seconds after startup.
+        A failure only means the first forecast imports it instead.
+        """
+        await asyncio.sleep(delay)
+        # One job per process worker: each import takes over a second, so the
+        # pool spawns a worker per job instead of reusing an idle one
+        jobs = executor.max_workers if executor.kind == "process" else 1
+        try:
+            seconds = await asyncio.gather(*(executor.run(import_ml_stack) for _ in range(jobs)))
+        except Exception as e:
+            logger.warning(f"⚠️ ML warm-up failed, it will load on first use: {e}")
+            return
+        self.ml_import_seconds = round(max(seconds), 4)
+        self.mark("ml_warm")
+        logger.info(f"🔥 ML stack warmed in {jobs} {executor.kind} worker(s) ({self.ml_import_seconds:.2f}s)")
+
+    def stats(self) -> dict:
+        first_healthy = self.milestones.get("first_healthy_response")
+        return {
+            "seconds_since_start": dict(self.milestones),
+            "ml_import_seconds": self.ml_import_seconds,
+            "target_seconds": self.target_seconds,
+            "within_target": None if first_healthy is None or not self.target_seconds else first_healthy <= self.target_seconds
+        }
+
+startup_timeline = StartupTimeline(target_seconds=settings.STARTUP_TARGET_SECONDS)
@@ -1,37 +1,102 @@
 # app/main.py
 import asyncio
 from contextlib import asynccontextmanager
+from app.core.startup import startup_timeline # First, so the import cost below is timed
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from app.core.db import db
+from app.core.config import settings
+from app.core.executor import compute_executor
 from app.utils.logger import logger
-from app.workers.change_stream_listener import watch_orders
+from app.utils.metrics import metrics
+from app.workers.change_stream_listener import watch_orders, watch_products
+from app.workers.forecast_scheduler import forecast_scheduler
+from app.workers.partition_coordinator import partition_coordinator
+from app.services.product_cache import product_cache
+from app.services.forecast_cache import forecast_cache
+from app.services.forecasting_service import regenerations
+from app.services.history_store import history_store
+from app.utils.profiler import profile_store
 from app.api.forecast import router as forecast_router
+from app.api.admin import router as admin_router
+from app.api.sales import router as sales_router
+
+startup_timeline.mark("imports")
+
+async def _ensure_indexes():
+    try:
+        await db.ensure_indexes()
+    except Exception as e:
+        # Queries still work without them, only slower
+        logger.warning(f"⚠️ Could not ensure MongoDB indexes: {e}")
+    startup_timeline.mark("indexes")
+
+async def _warm_product_cache():
+    await product_cache.warm_up()
+    startup_timeline.mark("product_cache")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- Startup ---
     logger.info("🚀 Analytics Service starting up...")
     
-    # 1. Connect to Database
+    # 1. Connect to Database and start the compute pool for forecasting
     db.connect()
+    compute_executor.start()
+    startup_timeline.mark("database")
+
+    # Index builds can take a while on a large collection: run them in the
+    # background like every other startup job instead of delaying readiness
+    loop = asyncio.get_event_loop()
+    background_tasks = []
+    if settings.MONGO_ENSURE_INDEXES:
+        background_tasks.append(loop.create_task(_ensure_indexes()))
     
-    # 2. Start Background Worker (Phase 1: Change Stream)
+    # 2. Warm the Product Catalog Cache in the background and start its invalidator.
+    # The invalidator starts first so no product change is missed while warming;
+    # until the cache is warm the ETL resolves misses with one `$in` query.
+    if settings.PRODUCT_CACHE_ENABLED:
+        background_tasks.append(loop.create_task(watch_products()))
+        background_tasks.append(loop.create_task(_warm_product_cache()))
+
+    # 3. Start Background Worker (Phase 1: Change Stream)
     # We run this as a non-blocking background task
-    loop = asyncio.get_event_loop()
     change_stream_task = loop.create_task(watch_orders())
+
+    # 4. Precompute forecasts for SKUs with new data (and nightly for the whole catalog)
+    if settings.FORECAST_SCHEDULER_ENABLED:
+        background_tasks.append(loop.create_task(forecast_scheduler.run()))
+
+    # 5. Fold ETL deltas into the local columnar history store
+    if history_store.enabled:
+        background_tasks.append(loop.create_task(
+            history_store.run_compactor(settings.HISTORY_STORE_COMPACT_INTERVAL_SECONDS)
+        ))
+
+    # 6. Load pandas/scikit-learn into the compute workers once traffic is flowing
+    if settings.ML_WARMUP_ENABLED:
+        background_tasks.append(loop.create_task(
+            startup_timeline.warm_up_ml(compute_executor, settings.ML_WARMUP_DELAY_SECONDS)
+        ))
+    startup_timeline.mark("ready")
     
     yield
     
     # --- Shutdown ---
     logger.info("🛑 Analytics Service shutting down...")
     
-    # 3. Graceful Cleanup
+    # 7. Graceful Cleanup
     change_stream_task.cancel()
     try:
         await change_stream_task
     except asyncio.CancelledError:
         logger.info("✅ Change stream listener stopped gracefully")
-        
+
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+
+    compute_executor.shutdown()
     db.close()
 
 app = FastAPI(
@@ -42,21 +107,53 @@ app = FastAPI(
 
 # Register Routes
 app.include_router(forecast_router, prefix="/api/forecast", tags=["Forecasting"])
+app.include_router(sales_router, prefix="/api/sales", tags=["Sales"])
+app.include_router(admin_router, prefix="/api/admin", tags=["Admin"])
 
 # Health Check
 @app.get("/health", tags=["System"])
 async def health_check():
     """
     Simple health check for k8s/external monitoring.
-    Checks if the service is up and DB client is initialized.
+    Checks if the service is up and DB client is initialized, and reports
+    how saturated the MongoDB connection pools are.
     """
     db_status = "connected" if db.client else "disconnected"
+    startup_timeline.healthy()
     return {
         "status": "ok",
         "database": db_status,
+        "database_pools": db.pool_stats(),
         "service": "analytics-engine"
     }
 
+# Cache Statistics
+@app.get("/stats", tags=["System"])
+async def cache_stats():
+    """
+    In-process cache counters, used to see how much database load the caches remove.
+    """
+    return {
+        "product_cache": product_cache.stats(),
+        "forecast_cache": forecast_cache.stats(),
+        "forecast_regenerations": regenerations.stats(),
+        "forecast_scheduler": forecast_scheduler.stats(),
+        "history_store": history_store.stats(),
+        "request_profiles": profile_store.stats(),
+        "etl_partitions": partition_coordinator.stats(),
+        "startup": startup_timeline.stats()
+    }
+
+# Prometheus Metrics
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", tags=["System"], response_class=PlainTextResponse)
+    async def prometheus_metrics():
+        """
+        ETL stage and forecasting phase latencies, change stream lag and
+        throughput, queue depths and regeneration counts (Prometheus text format).
+        """
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
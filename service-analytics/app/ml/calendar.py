@@ -0,0 +1,139 @@
+# app/ml/calendar.py
+"""
+Calendar features shared by training (feature engineering) and inference
+(recursive forecasting).
+
+Holidays come from built-in rules per region (any year) plus optional extra
+dates from settings or a JSON file. Everything is precomputed into a dense
+table indexed by day ordinal, so features for any date range are a NumPy
+slice or fancy-index with no per-day Python work.
+
+Holiday file format (CALENDAR_HOLIDAYS_FILE):
+    {"US": ["2026-11-30", ...], "UK": ["2026-12-26", ...]}
+"""
+import json
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import numpy as np
+from app.core.config import settings
+
+# Column order of the table (and of the context features at the end of DemandLinearRegression.feature_order)
+CALENDAR_FEATURES = ["is_weekend", "is_holiday"]
+
+# 1970-01-01 as an ordinal, to convert datetime64[D] values
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+def _last_weekday(year: int, month: int, weekday: int) -> date:
+    last = (date(year, month + 1, 1) if month < 12 else date(year + 1, 1, 1)) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _us_retail_holidays(year: int) -> List[date]:
+    thanksgiving = _nth_weekday(year, 11, 3, 4)
+    return [
+        date(year, 1, 1),               # New Year's Day
+        _last_weekday(year, 5, 0),      # Memorial Day
+        date(year, 7, 4),               # Independence Day
+        thanksgiving,                   # Thanksgiving
+        thanksgiving + timedelta(days=1), # Black Friday
+        date(year, 12, 25),             # Christmas
+    ]
+
+# Built-in holiday rules: region -> year -> dates
+HOLIDAY_RULES: Dict[str, Callable[[int], List[date]]] = {
+    "US": _us_retail_holidays,
+}
+
+def load_holiday_file(path: str) -> Dict[str, List[str]]:
+    with open(path) as f:
+        return json.load(f)
+
+class CalendarTable:
+    """
+    Dense (days x features) table of calendar features for [start_year, end_year].
+
+    Dates outside the range still get `is_weekend`; their other features are 0.
+    """
+
+    def __init__(self, holidays: Iterable[date], start_year: int, end_year: int):
+        self.start_ordinal = date(start_year, 1, 1).toordinal()
+        self.end_ordinal = date(end_year, 12, 31).toordinal()
+        ordinals = np.arange(self.start_ordinal, self.end_ordinal + 1)
+
+        self.table = np.zeros((len(ordinals), len(CALENDAR_FEATURES)))
+        # date.fromordinal(1) is a Monday, so (ordinal - 1) % 7 == weekday()
+        self.table[:, 0] = (ordinals - 1) % 7 >= 5
+        holiday_ordinals = np.array(
+            [d.toordinal() for d in holidays if self.start_ordinal <= d.toordinal() <= self.end_ordinal],
+            dtype=np.int64
+        )
+        self.table[holiday_ordinals - self.start_ordinal, 1] = 1.0
+        self.holiday_ordinals: Set[int] = set(holiday_ordinals.tolist())
+
+    def lookup(self, ordinals: np.ndarray) -> np.ndarray:
+        """
+        Features for arbitrary day ordinals (any shape) -> shape + (n_features,).
+        """
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        index = ordinals - self.start_ordinal
+        inside = (index >= 0) & (index < len(self.table))
+        features = self.table[np.where(inside, index, 0)]
+        if not inside.all():
+            features[~inside] = 0.0
+            features[~inside, 0] = (ordinals[~inside] - 1) % 7 >= 5
+        return features
+
+    def range(self, start: date, days: int) -> np.ndarray:
+        """
+        Features for `days` consecutive days from `start` -> (days, n_features).
+        A plain slice when the range is inside the table.
+        """
+        index = start.toordinal() - self.start_ordinal
+        if 0 <= index and index + days <= len(self.table):
+            return self.table[index:index + days]
+        return self.lookup(start.toordinal() + np.arange(days))
+
+    def for_dates(self, dates: np.ndarray) -> np.ndarray:
+        """
+        Features for a datetime64 array (e.g. a pandas datetime column's values).
+        """
+        days = np.asarray(dates).astype("datetime64[D]").astype(np.int64)
+        return self.lookup(days + EPOCH_ORDINAL)
+
+    def is_holiday(self, day: date) -> bool:
+        return day.toordinal() in self.holiday_ordinals
+
+def build_calendar(region: str, start_year: int, end_year: int, extra_dates: Iterable[str] = (), holiday_file: Optional[str] = None) -> CalendarTable:
+    """
+    Holidays of `region` from the built-in rules, the optional file and `extra_dates`.
+    """
+    rule = HOLIDAY_RULES.get(region)
+    holidays: List[date] = []
+    if rule:
+        for year in range(start_year, end_year + 1):
+            holidays.extend(rule(year))
+
+    configured = list(extra_dates)
+    if holiday_file:
+        configured.extend(load_holiday_file(holiday_file).get(region, []))
+    holidays.extend(datetime.strptime(day, "%Y-%m-%d").date() for day in configured)
+
+    return CalendarTable(holidays, start_year, end_year)
+
+@lru_cache(maxsize=None)
+def get_calendar(region: Optional[str] = None) -> CalendarTable:
+    """
+    Shared calendar for a region (default: CALENDAR_REGION), built once per process.
+    """
+    extra = [day.strip() for day in settings.CALENDAR_EXTRA_HOLIDAYS.split(",") if day.strip()]
+    return build_calendar(
+        region or settings.CALENDAR_REGION,
+        settings.CALENDAR_START_YEAR,
+        settings.CALENDAR_END_YEAR,
+        extra_dates=extra,
+        holiday_file=settings.CALENDAR_HOLIDAYS_FILE
+    )
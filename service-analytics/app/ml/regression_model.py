@@ -1,10 +1,11 @@
 # app/ml/regression_model.py
 import numpy as np
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score
-from typing import List
-from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, List, Sequence
+from datetime import datetime
+from app.ml.calendar import CalendarTable, get_calendar
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 class DemandLinearRegression:
     """
@@ -13,7 +14,7 @@ class DemandLinearRegression:
     """
 
     def __init__(self):
-        self.model = LinearRegression()
+        self.model = None  # scikit-learn estimator, created by train (imported lazily)
         self.r2_score = 0.0
         # CRITICAL: This exact order must be maintained.
         # It matches the Feature Engineering output + the dynamic features we add here.
@@ -23,21 +24,29 @@ class DemandLinearRegression:
             'is_weekend', 'is_holiday'  # <--- NEW CONTEXT FEATURES
         ]
         
-        # Hardcoded holidays for forecast-time generation (Matches Feature Engineer)
-        self.static_holidays = {
-            "2023-01-01", "2023-05-29", "2023-07-04", "2023-11-23", "2023-11-24", "2023-12-25",
-            "2024-01-01", "2024-05-27", "2024-07-04", "2024-11-28", "2024-11-29", "2024-12-25",
-            "2025-01-01", "2025-05-26", "2025-07-04", "2025-11-27", "2025-11-28", "2025-12-25",
-        }
+        # Shared calendar table for forecast-time context (same one the Feature Engineer uses)
+        self.calendar = get_calendar()
+
+        # Fitted parameters (set by train)
+        self.coef_ = np.zeros(len(self.feature_order))
+        self.intercept_ = 0.0
 
-    def train(self, X: pd.DataFrame, y: pd.Series) -> None:
+    def train(self, X: "pd.DataFrame", y: "pd.Series") -> None:
         """
         Trains the model on historical data.
         """
+        from sklearn.linear_model import LinearRegression
+        from sklearn.metrics import r2_score
+
         # Filter X to only include the features we expect
         X_ordered = X[self.feature_order]
         
+        self.model = LinearRegression()
         self.model.fit(X_ordered, y)
+
+        # Plain arrays for the NumPy forecasting fast path
+        self.coef_ = np.asarray(self.model.coef_, dtype=np.float64)
+        self.intercept_ = float(self.model.intercept_)
         
         # Calculate Explainability Score (R²)
         predictions = self.model.predict(X_ordered)
@@ -46,7 +55,76 @@ class DemandLinearRegression:
         else:
             self.r2_score = 0.0
 
-    def predict(self, X: pd.DataFrame) -> np.ndarray:
+    def train_from_stats(self, stats: dict) -> None:
+        """
+        Solves the least-squares fit from sufficient statistics in constant time.
+
+        Mirrors scikit-learn's LinearRegression: the problem is centered (which
+        yields the intercept) and the minimum-norm solution is taken, so exactly
+        collinear features (trend_index is a combination of lag_1 and lag_7) get
+        the same coefficients as a full refit.
+
+        Args:
+            stats: Output of `sufficient_statistics` (possibly accumulated over time).
+        """
+        n = stats["n"]
+        xtx = np.asarray(stats["xtx"], dtype=np.float64)
+        xty = np.asarray(stats["xty"], dtype=np.float64)
+
+        mean_x = xtx[0, 1:] / n
+        mean_y = stats["sum_y"] / n
+
+        # Centered Gram matrix / cross products (covariance x n)
+        s_xx = xtx[1:, 1:] - n * np.outer(mean_x, mean_x)
+        s_xy = xty[1:] - n * mean_x * mean_y
+        s_yy = stats["sum_y2"] - n * mean_y ** 2
+
+        # Minimum-norm solve: drop numerically-null directions of the Gram matrix
+        eigenvalues, eigenvectors = np.linalg.eigh(s_xx)
+        keep = eigenvalues > STATS_RCOND * max(eigenvalues.max(), 0.0)
+        basis = eigenvectors[:, keep]
+        coef = basis @ ((basis.T @ s_xy) / eigenvalues[keep])
+
+        self.coef_ = coef
+        self.intercept_ = float(mean_y - mean_x @ coef)
+
+        # Calculate Explainability Score (R²) without revisiting the data
+        if n <= 1:
+            self.r2_score = 0.0
+        else:
+            sse = max(s_yy - 2 * coef @ s_xy + coef @ s_xx @ coef, 0.0)
+            if s_yy <= 1e-12 * max(stats["sum_y2"], 1.0):
+                self.r2_score = 1.0 if sse <= 1e-12 * max(stats["sum_y2"], 1.0) else 0.0
+            else:
+                self.r2_score = float(1.0 - sse / s_yy)
+
+    def to_params(self) -> dict:
+        """
+        Plain, BSON/pickle-friendly snapshot of the fitted model.
+        """
+        return {
+            "coef": self.coef_.tolist(),
+            "intercept": self.intercept_,
+            "r2": float(self.r2_score),
+            "feature_order": list(self.feature_order)
+        }
+
+    @classmethod
+    def from_params(cls, params: dict) -> "DemandLinearRegression":
+        """
+        Rebuilds a model from `to_params()` output without refitting.
+        Only the NumPy forecasting path is available on a restored model.
+        """
+        if list(params["feature_order"]) != cls().feature_order:
+            raise ValueError("Stored feature order does not match the current model")
+
+        regressor = cls()
+        regressor.coef_ = np.asarray(params["coef"], dtype=np.float64)
+        regressor.intercept_ = float(params["intercept"])
+        regressor.r2_score = float(params["r2"])
+        return regressor
+
+    def predict(self, X: "pd.DataFrame") -> np.ndarray:
         return self.model.predict(X[self.feature_order])
 
     def forecast_recursive(self, recent_history: List[float], start_date: datetime, horizon: int = 7) -> List[float]:
@@ -58,58 +136,105 @@ class DemandLinearRegression:
             start_date: The date of the FIRST prediction (t+1)
             horizon: How many days to predict
         """
-        # Create a working buffer to avoid mutating original data
-        history_buffer = list(recent_history)
-        predictions = []
-
         # Minimum required history (14 days for lag_14)
-        if len(history_buffer) < 14:
-            safe_mean = np.mean(history_buffer) if history_buffer else 0
+        if len(recent_history) < 14:
+            safe_mean = np.mean(recent_history) if len(recent_history) else 0
             return [safe_mean] * horizon
 
-        current_date = start_date
-
-        for _ in range(horizon):
-            # --- 1. Dynamic Feature Engineering ---
-            lag_1 = history_buffer[-1]
-            lag_7 = history_buffer[-7]
-            lag_14 = history_buffer[-14]
-
-            # Rolling Mean & Trend
-            rolling_mean_7 = np.mean(history_buffer[-7:])
-            trend_index = (lag_1 - lag_7) / 7.0
-
-            # --- 2. Dynamic Context Generation (The "Brain" Upgrade) ---
-            # is_weekend: 5=Sat, 6=Sun
-            is_weekend = 1 if current_date.weekday() >= 5 else 0
-            
-            # is_holiday
-            date_str = current_date.strftime("%Y-%m-%d")
-            is_holiday = 1 if date_str in self.static_holidays else 0
-
-            # Construct feature vector
-            features_vector = np.array([[
-                lag_1, lag_7, lag_14, 
-                rolling_mean_7, trend_index,
-                is_weekend, is_holiday
-            ]])
-            
-            features_df = pd.DataFrame(features_vector, columns=self.feature_order)
-            
-            # --- 3. Predict ---
-            predicted_demand = float(self.model.predict(features_df)[0])
-            
-            # --- 4. Safety Clamps (prevent runaway feedback loops) ---
+        # --- Calendar context for the whole horizon, computed once ---
+        calendar = self.calendar.range(start_date, horizon)
+
+        # --- Preallocated ring buffer of the last 14 values (oldest first) ---
+        ring = np.array(recent_history[-14:], dtype=np.float64)
+        pos = 0 # Next slot to overwrite (= oldest value)
+
+        coef = self.coef_
+        intercept = self.intercept_
+        features = np.empty(7)
+        predictions = []
+
+        for day in range(horizon):
+            # --- 1. Dynamic Feature Engineering (ring lookups, no list slicing) ---
+            lag_1 = ring[(pos - 1) % 14]
+            lag_7 = ring[(pos - 7) % 14]
+            lag_14 = ring[pos]
+            rolling_mean_7 = ring[_WINDOW_7[pos]].mean()
+
+            features[0] = lag_1
+            features[1] = lag_7
+            features[2] = lag_14
+            features[3] = rolling_mean_7
+            features[4] = (lag_1 - lag_7) / 7.0
+            features[5:] = calendar[day]
+
+            # --- 2. Predict (plain dot product with the fitted coefficients) ---
+            predicted_demand = float(features @ coef + intercept)
+
+            # --- 3. Safety Clamps (prevent runaway feedback loops) ---
             base_mean = rolling_mean_7 if rolling_mean_7 > 0.1 else 1.0
-            upper_limit = base_mean * 2.0 
-            lower_limit = base_mean * 0.2
-            
-            predicted_demand = max(lower_limit, min(predicted_demand, upper_limit))
+            predicted_demand = max(base_mean * 0.2, min(predicted_demand, base_mean * 2.0))
 
             predictions.append(predicted_demand)
 
-            # --- 5. Recursion Step ---
-            history_buffer.append(predicted_demand)
-            current_date += timedelta(days=1) # Move to next day
+            # --- 4. Recursion Step ---
+            ring[pos] = predicted_demand
+            pos = (pos + 1) % 14
+
+        return predictions
+
+# Relative eigenvalue cutoff for the sufficient-statistics solve
+STATS_RCOND = 1e-11
+
+def sufficient_statistics(X: np.ndarray, y: np.ndarray) -> dict:
+    """
+    OLS sufficient statistics for rows of `X` (columns in `DemandLinearRegression.feature_order`) and targets `y`.
+
+    `xtx`/`xty` include a leading column of ones for the intercept, so the
+    statistics of two row sets can simply be added together.
+    """
+    X = np.asarray(X, dtype=np.float64).reshape(-1, 7)
+    y = np.asarray(y, dtype=np.float64)
+    X_aug = np.column_stack([np.ones(len(X)), X])
+    return {
+        "xtx": X_aug.T @ X_aug,
+        "xty": X_aug.T @ y,
+        "sum_y": float(y.sum()),
+        "sum_y2": float(y @ y),
+        "n": int(len(y))
+    }
+
+def merge_statistics(a: dict, b: dict) -> dict:
+    return {
+        "xtx": np.asarray(a["xtx"]) + np.asarray(b["xtx"]),
+        "xty": np.asarray(a["xty"]) + np.asarray(b["xty"]),
+        "sum_y": a["sum_y"] + b["sum_y"],
+        "sum_y2": a["sum_y2"] + b["sum_y2"],
+        "n": a["n"] + b["n"]
+    }
+
+def subtract_statistics(a: dict, b: dict) -> dict:
+    """
+    Removes the rows of `b` (previously merged into `a`) from `a`.
+    """
+    return {
+        "xtx": np.asarray(a["xtx"]) - np.asarray(b["xtx"]),
+        "xty": np.asarray(a["xty"]) - np.asarray(b["xty"]),
+        "sum_y": a["sum_y"] - b["sum_y"],
+        "sum_y2": a["sum_y2"] - b["sum_y2"],
+        "n": a["n"] - b["n"]
+    }
+
+def feature_vector(history: Sequence[float], day: datetime, calendar: CalendarTable) -> np.ndarray:
+    """
+    Features for one day from the (at least 14) values preceding it, oldest first.
+    Same definitions as `InventoryFeatureEngineer` (row-based lags, shifted rolling mean).
+    """
+    lag_1 = history[-1]
+    lag_7 = history[-7]
+    return np.concatenate((
+        [lag_1, lag_7, history[-14], np.mean(history[-7:]), (lag_1 - lag_7) / 7.0],
+        calendar.range(day, 1)[0]
+    ))
 
-        return predictions
\ No newline at end of file
+# Ring-buffer indices of the last 7 values (oldest first) for each write position
+_WINDOW_7 = [np.array([(pos - 7 + i) % 14 for i in range(7)]) for pos in range(14)]
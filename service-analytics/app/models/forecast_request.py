@@ -0,0 +1,8 @@
+# app/models/forecast_request.py
+from pydantic import BaseModel, Field
+from typing import List
+from app.core.config import settings
+
+class BatchForecastRequest(BaseModel):
+    skus: List[str] = Field(..., min_length=1, max_length=settings.BATCH_FORECAST_MAX_SKUS)
+    days: int = Field(7, gt=0, le=30)
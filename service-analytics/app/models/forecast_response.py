@@ -13,4 +13,14 @@ class ForecastResponse(BaseModel):
     forecast_horizon_days: int
     confidence_score: float
     generated_at: datetime
-    forecast_data: List[DailyPrediction]
\ No newline at end of file
+    is_stale: bool = False  # Served while a refresh runs in the background
+    forecast_data: List[DailyPrediction]
+
+class BatchForecastError(BaseModel):
+    product_sku: str
+    status_code: int
+    detail: str
+
+class BatchForecastResponse(BaseModel):
+    forecasts: List[ForecastResponse]
+    errors: List[BatchForecastError]
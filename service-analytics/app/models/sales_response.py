@@ -0,0 +1,14 @@
+# app/models/sales_response.py
+from pydantic import BaseModel
+from typing import List, Optional
+
+class RollupPoint(BaseModel):
+    period: str  # "2024-W05", "2024-01" or "2024-01-29"
+    period_start: str
+    total_units_sold: float
+    total_revenue: float
+
+class RollupResponse(BaseModel):
+    granularity: str
+    product_sku: Optional[str] = None  # None for catalog-wide rollups
+    points: List[RollupPoint]
@@ -0,0 +1,74 @@
+# app/services/checkpoint_service.py
+from datetime import datetime
+from typing import Optional
+from pymongo.errors import DuplicateKeyError
+from app.core.db import db
+from app.core.config import settings
+
+async def load_checkpoint(name: str) -> Optional[dict]:
+    """
+    Returns the stored checkpoint document for a consumer/job, or None.
+    """
+    return await db.get_db()[settings.COLLECTION_CHECKPOINTS].find_one({"_id": name})
+
+async def save_checkpoint(name: str, **fields) -> None:
+    """
+    Upserts checkpoint fields (e.g. resume_token, last_id) for a consumer/job.
+    """
+    fields["updated_at"] = datetime.utcnow()
+    await db.get_db()[settings.COLLECTION_CHECKPOINTS].update_one(
+        {"_id": name},
+        {"$set": fields},
+        upsert=True
+    )
+
+async def advance_checkpoint(name: str, resume_token: dict, **fields) -> bool:
+    """
+    Saves a change stream resume token unless the stored one is already further
+    ahead, so a consumer that lost its partition cannot rewind the new owner.
+
+    Resume tokens (`_data`, hex-encoded and order-preserving) compare as strings.
+
+    Returns:
+        False if the checkpoint had moved past `resume_token`; nothing is written.
+    """
+    fields["resume_token"] = resume_token
+    fields["updated_at"] = datetime.utcnow()
+    try:
+        await db.get_db()[settings.COLLECTION_CHECKPOINTS].update_one(
+            {"_id": name, "$or": [
+                {"resume_token": None},
+                {"resume_token._data": {"$lte": resume_token["_data"]}}
+            ]},
+            {"$set": fields},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The filter missed an existing checkpoint: it holds a newer token
+        return False
+    return True
+
+async def claim_checkpoint(name: str, field: str, value, **fields) -> bool:
+    """
+    Compare-and-set: sets `field` to `value` unless the checkpoint already holds
+    it, so exactly one of several concurrent callers wins (e.g. a daily job
+    started by every replica).
+
+    Returns:
+        True for the caller that made the change; False if it was already set.
+    """
+    fields[field] = value
+    fields["updated_at"] = datetime.utcnow()
+    try:
+        result = await db.get_db()[settings.COLLECTION_CHECKPOINTS].update_one(
+            {"_id": name, field: {"$ne": value}},
+            {"$set": fields},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The filter missed an existing checkpoint: another caller set it first
+        return False
+    return result.modified_count == 1 or result.upserted_id is not None
+
+async def clear_checkpoint(name: str) -> None:
+    await db.get_db()[settings.COLLECTION_CHECKPOINTS].delete_one({"_id": name})
@@ -1,23 +1,48 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
 from app.core.db import db
 from app.core.config import settings
 from app.utils.logger import logger
+from app.services.product_cache import product_cache
+from app.services.training_stats_service import note_snapshot_days
+from app.services.forecast_cache import forecast_cache
+from app.workers.forecast_scheduler import forecast_scheduler
+from app.services.history_store import history_store
+from app.services.rollup_service import apply_rollups, refresh_rollups
+from app.utils.metrics import ETL_STAGE_SECONDS, ETL_ORDERS
 from bson import ObjectId
+from pymongo import UpdateOne
+
+def _parse_created_at(order_data: dict) -> datetime:
+    """
+    Parse timestamp safely (Node.js sends ISO strings, Change Streams send BSON dates).
+    """
+    created_at = order_data.get("createdAt")
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    return created_at
 
 async def process_new_order(order_data: dict):
     """
     Handles the ETL pipeline for a single order event.
+    Dispatches to the bulk-write path unless it is disabled in settings.
+    """
+    if settings.ETL_BULK_WRITES:
+        await process_orders_bulk([order_data])
+    else:
+        await _process_new_order_per_item(order_data)
+
+async def _process_new_order_per_item(order_data: dict):
+    """
+    Legacy ETL path: three sequential round trips per line item.
     """
     # --- EXTRACT (Read Data) ---
     order_id = order_data.get("order_id")
     items = order_data.get("items", [])
-    
-    # Parse timestamp safely (Node.js sends ISO strings)
-    created_at = order_data.get("createdAt")
-    if isinstance(created_at, str):
-        created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-    
+    created_at = _parse_created_at(order_data)
+
     db_instance = db.get_db()
+    touched = []
 
     # --- TRANSFORM & LOAD ---
     for item in items:
@@ -26,15 +51,14 @@ async def process_new_order(order_data: dict):
         price = item.get("price_at_sale")
 
         # 1. Lookup SKU (Required because Orders only have ID)
-        # We need the SKU for readable analytics
-        product = await db_instance[settings.COLLECTION_PRODUCTS].find_one({"_id": ObjectId(product_id)})
-        
-        if not product:
+        # We need the SKU for readable analytics (served from the catalog cache when enabled)
+        with ETL_STAGE_SECONDS.time("resolve_skus"):
+            sku = (await resolve_skus([product_id])).get(str(product_id))
+
+        if not sku:
             logger.error(f"❌ Product ID {product_id} not found for Order {order_id}")
             continue # Skip this item if product doesn't exist
 
-        sku = product.get("sku")
-
         # ---------------------------------------------------------
         # ✅ PHASE 1.2 COMPLETE: Write to Data Lake (Raw Events)
         # ---------------------------------------------------------
@@ -46,36 +70,355 @@ async def process_new_order(order_data: dict):
             "unit_price": price,
             "timestamp": created_at
         }
-        
+
         # 'upsert=True' ensures we don't crash if we process the same event twice
-        await db_instance[settings.COLLECTION_RAW_EVENTS].update_one(
-            {"event_id": raw_event["event_id"]},
-            {"$set": raw_event},
-            upsert=True
-        )
+        with ETL_STAGE_SECONDS.time("write_raw_events"):
+            result = await db_instance[settings.COLLECTION_RAW_EVENTS].update_one(
+                {"event_id": raw_event["event_id"]},
+                {"$set": raw_event},
+                upsert=True
+            )
 
         # ---------------------------------------------------------
         # ✅ PHASE 2.1 COMPLETE: Aggregate to Fact Table (Snapshots)
         # ---------------------------------------------------------
         date_key = created_at.strftime("%Y-%m-%d") # Group by Day
         snapshot_id = f"{date_key}_{sku}"
-        
-        await db_instance[settings.COLLECTION_DAILY_SNAPSHOTS].update_one(
-            {"_id": snapshot_id},
-            {
-                "$set": {
-                    "date_key": date_key,
+        snapshot = {"product_sku": sku, "date_key": date_key, "total_units_sold": qty, "total_revenue": price * qty}
+
+        if result.upserted_id is None:
+            # Replayed event: its $inc may already have landed, recompute the day instead
+            await _write_recomputed_snapshot_totals({snapshot_id: snapshot})
+        else:
+            with ETL_STAGE_SECONDS.time("write_snapshots"):
+                await db_instance[settings.COLLECTION_DAILY_SNAPSHOTS].update_one(
+                    {"_id": snapshot_id},
+                    {
+                        "$set": {
+                            "date_key": date_key,
+                            "product_sku": sku,
+                            "aggregation_version": "v1.0",
+                            "generated_at": datetime.utcnow()
+                        },
+                        "$inc": {
+                            # Atomic Increment: Add new numbers to existing totals
+                            "total_units_sold": qty,
+                            "total_revenue": (price * qty)
+                        }
+                    },
+                    upsert=True
+                )
+
+            if settings.ROLLUPS_ENABLED:
+                with ETL_STAGE_SECONDS.time("write_rollups"):
+                    await apply_rollups([snapshot])
+
+        touched.append({"product_sku": sku, "date_key": date_key, "total_units_sold": qty})
+
+    # Cached forecasts of these SKUs no longer reflect the latest snapshots
+    with ETL_STAGE_SECONDS.time("post_write"):
+        forecast_cache.invalidate_many(snapshot["product_sku"] for snapshot in touched)
+        if settings.FORECAST_SCHEDULER_ENABLED:
+            forecast_scheduler.mark_dirty(touched)
+        await history_store.append(f"{snapshot['date_key']}_{snapshot['product_sku']}" for snapshot in touched)
+
+        if settings.TRAINING_MODE == "incremental" and touched:
+            await note_snapshot_days(touched)
+
+    ETL_ORDERS.inc()
+    logger.info(f"✅ Processed Order {order_id} -> Saved to Data Lake & Aggregated Stats")
+
+async def resolve_skus(product_ids: Iterable) -> Dict[str, str]:
+    """
+    Resolves many product IDs to SKUs with a single `$in` query
+    (or none at all, when every ID is already in the product catalog cache).
+
+    Returns:
+        Dict mapping str(product_id) -> sku. Unknown IDs are absent.
+    """
+    if settings.PRODUCT_CACHE_ENABLED:
+        return await product_cache.get_many(product_ids)
+
+    unique_ids = {ObjectId(pid) for pid in product_ids if pid is not None}
+    if not unique_ids:
+        return {}
+
+    cursor = db.get_db()[settings.COLLECTION_PRODUCTS].find(
+        {"_id": {"$in": list(unique_ids)}},
+        {"sku": 1}
+    )
+    return {str(product["_id"]): product.get("sku") async for product in cursor}
+
+def transform_orders(orders: List[dict], sku_map: Dict[str, str]) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    """
+    Pure TRANSFORM step shared by every bulk ETL caller (stream, backfill).
+
+    Duplicate SKUs are merged before anything is written:
+    - Raw events are keyed by `{order_id}_{sku}` (quantities summed, unit price weighted).
+    - Snapshot increments are keyed by `{date_key}_{sku}`.
+
+    Returns:
+        (raw_events by event_id, snapshot increments by snapshot_id)
+    """
+    raw_events: Dict[str, dict] = {}
+    snapshots: Dict[str, dict] = {}
+
+    for order_data in orders:
+        order_id = order_data.get("order_id")
+        created_at = _parse_created_at(order_data)
+        date_key = created_at.strftime("%Y-%m-%d") # Group by Day
+
+        for item in order_data.get("items", []):
+            product_id = item.get("product_id")
+            qty = item.get("qty")
+            price = item.get("price_at_sale")
+
+            sku = sku_map.get(str(product_id))
+            if not sku:
+                logger.error(f"❌ Product ID {product_id} not found for Order {order_id}")
+                continue
+
+            # --- Data Lake (Raw Events) ---
+            event_id = f"{order_id}_{sku}" # Unique Composite Key
+            event = raw_events.get(event_id)
+            if event is None:
+                raw_events[event_id] = {
+                    "event_id": event_id,
+                    "order_id": order_id,
                     "product_sku": sku,
-                    "aggregation_version": "v1.0",
-                    "generated_at": datetime.utcnow()
-                },
-                "$inc": {
-                    # Atomic Increment: Add new numbers to existing totals
-                    "total_units_sold": qty,
-                    "total_revenue": (price * qty)
+                    "quantity": qty,
+                    "unit_price": price,
+                    "timestamp": created_at,
+                    "_revenue": price * qty
                 }
-            },
-            upsert=True
+            else:
+                event["quantity"] += qty
+                event["_revenue"] += price * qty
+                event["unit_price"] = event["_revenue"] / event["quantity"] if event["quantity"] else price
+
+            # --- Fact Table (Snapshots) ---
+            snapshot_id = f"{date_key}_{sku}"
+            snapshot = snapshots.setdefault(snapshot_id, {
+                "date_key": date_key,
+                "product_sku": sku,
+                "total_units_sold": 0,
+                "total_revenue": 0
+            })
+            snapshot["total_units_sold"] += qty
+            snapshot["total_revenue"] += price * qty
+
+    for event in raw_events.values():
+        event.pop("_revenue")
+
+    return raw_events, snapshots
+
+async def process_orders_bulk(orders: List[dict], replay_safe: bool = False) -> Dict[str, dict]:
+    """
+    Bulk ETL pipeline for one or more orders.
+
+    Round trips are constant per call instead of 3 per line item:
+    1. One `$in` query to resolve every product ID to its SKU.
+    2. One unordered `bulk_write` of raw-event upserts.
+    3. One unordered `bulk_write` of snapshot `$inc` upserts.
+    4. One concurrent `bulk_write` per rollup collection (ROLLUPS_ENABLED).
+
+    Replays are detected from the raw-event upserts: orders whose raw events
+    already existed (a batch re-delivered after a crash or reconnect before its
+    checkpoint) are not `$inc`-ed again; their days are recomputed instead.
+
+    With `replay_safe`, snapshots and rollups are instead recomputed from the
+    stored raw events / snapshots (`_write_recomputed_snapshots`,
+    `refresh_rollups`), so applying the same orders twice changes nothing.
+    This costs two extra queries on every call; the backfill uses it because
+    it rebuilds history whose snapshots may be missing or only partial.
+
+    Returns:
+        The merged snapshot increments that were applied, keyed by snapshot_id.
+    """
+    if not orders:
+        return {}
+
+    # --- EXTRACT ---
+    product_ids = [
+        item.get("product_id")
+        for order_data in orders
+        for item in order_data.get("items", [])
+    ]
+    with ETL_STAGE_SECONDS.time("resolve_skus"):
+        sku_map = await resolve_skus(product_ids)
+
+    # --- TRANSFORM ---
+    with ETL_STAGE_SECONDS.time("transform"):
+        raw_events, snapshots = transform_orders(orders, sku_map)
+
+    # --- LOAD ---
+    db_instance = db.get_db()
+
+    replayed = set()
+    if raw_events:
+        # 'upsert=True' keeps replays idempotent for the data lake; the client-side
+        # _id tells which events this call inserted (upserted_ids) and which existed
+        new_ids = {ObjectId(): event_id for event_id in raw_events}
+        with ETL_STAGE_SECONDS.time("write_raw_events"):
+            result = await db_instance[settings.COLLECTION_RAW_EVENTS].bulk_write(
+                [
+                    UpdateOne({"event_id": event_id}, {"$set": raw_events[event_id], "$setOnInsert": {"_id": _id}}, upsert=True)
+                    for _id, event_id in new_ids.items()
+                ],
+                ordered=False
+            )
+        inserted = {new_ids[_id] for _id in result.upserted_ids.values() if _id in new_ids}
+        replayed = set(raw_events) - inserted
+
+    if replayed and not replay_safe:
+        # A replayed event's snapshot $inc may or may not have landed: $inc only
+        # what is new and recompute the days the replayed events fall on
+        replayed_keys = {(raw_events[event_id]["order_id"], raw_events[event_id]["product_sku"]) for event_id in replayed}
+        fresh_orders = [
+            {**order_data, "items": [
+                item for item in order_data.get("items", [])
+                if (order_data.get("order_id"), sku_map.get(str(item.get("product_id")))) not in replayed_keys
+            ]}
+            for order_data in orders
+        ]
+        fresh_snapshots = transform_orders(fresh_orders, sku_map)[1]
+        replayed_snapshots = {
+            f"{raw_events[event_id]['timestamp']:%Y-%m-%d}_{raw_events[event_id]['product_sku']}" for event_id in replayed
+        }
+        logger.info(f"🔁 {len(replayed)} raw events already stored (replay): recomputing {len(replayed_snapshots)} snapshots")
+        await _write_snapshot_increments(
+            {snapshot_id: snapshot for snapshot_id, snapshot in fresh_snapshots.items() if snapshot_id not in replayed_snapshots}
         )
+        await _write_recomputed_snapshot_totals(
+            {snapshot_id: snapshots[snapshot_id] for snapshot_id in replayed_snapshots}
+        )
+    elif snapshots and replay_safe:
+        await _write_recomputed_snapshot_totals(snapshots)
+    elif snapshots:
+        await _write_snapshot_increments(snapshots)
+
+    # Cached forecasts of these SKUs no longer reflect the latest snapshots
+    with ETL_STAGE_SECONDS.time("post_write"):
+        forecast_cache.invalidate_many({snapshot["product_sku"] for snapshot in snapshots.values()})
+        if settings.FORECAST_SCHEDULER_ENABLED:
+            forecast_scheduler.mark_dirty(snapshots.values())
+        await history_store.append(snapshots.keys())
 
-    logger.info(f"✅ Processed Order {order_id} -> Saved to Data Lake & Aggregated Stats")
\ No newline at end of file
+        if settings.TRAINING_MODE == "incremental" and snapshots:
+            await note_snapshot_days(snapshots.values())
+
+    ETL_ORDERS.inc(amount=len(orders))
+    order_ids = [order_data.get("order_id") for order_data in orders]
+    if len(order_ids) == 1:
+        logger.info(f"✅ Processed Order {order_ids[0]} -> Saved to Data Lake & Aggregated Stats")
+    else:
+        logger.info(f"✅ Processed {len(order_ids)} Orders -> {len(raw_events)} raw events, {len(snapshots)} snapshots")
+
+    return snapshots
+
+async def _write_snapshot_increments(snapshots: Dict[str, dict]) -> None:
+    """
+    `$inc`s merged snapshot increments into the daily snapshots and rollups.
+    """
+    if not snapshots:
+        return
+    generated_at = datetime.utcnow()
+    with ETL_STAGE_SECONDS.time("write_snapshots"):
+        await db.get_db()[settings.COLLECTION_DAILY_SNAPSHOTS].bulk_write(
+            [
+                UpdateOne(
+                    {"_id": snapshot_id},
+                    {
+                        "$set": {
+                            "date_key": snapshot["date_key"],
+                            "product_sku": snapshot["product_sku"],
+                            "aggregation_version": "v1.0",
+                            "generated_at": generated_at
+                        },
+                        "$inc": {
+                            # Atomic Increment: Add merged totals to existing totals
+                            "total_units_sold": snapshot["total_units_sold"],
+                            "total_revenue": snapshot["total_revenue"]
+                        }
+                    },
+                    upsert=True
+                )
+                for snapshot_id, snapshot in snapshots.items()
+            ],
+            ordered=False
+        )
+
+    if settings.ROLLUPS_ENABLED:
+        # Weekly / monthly / catalog-daily totals, same $inc pattern as the snapshots
+        with ETL_STAGE_SECONDS.time("write_rollups"):
+            await apply_rollups(snapshots.values())
+
+async def _write_recomputed_snapshot_totals(snapshots: Dict[str, dict]) -> None:
+    """
+    Replay-safe counterpart of `_write_snapshot_increments`: snapshots and
+    rollups are raised to the totals recomputed from the stored raw events.
+    """
+    if not snapshots:
+        return
+    with ETL_STAGE_SECONDS.time("write_snapshots"):
+        await _write_recomputed_snapshots(snapshots)
+    if settings.ROLLUPS_ENABLED:
+        with ETL_STAGE_SECONDS.time("write_rollups"):
+            await refresh_rollups(snapshots.values())
+
+async def _write_recomputed_snapshots(snapshots: Dict[str, dict]) -> None:
+    """
+    Sets the given snapshots to their totals recomputed from `raw_sales_events`
+    (one grouped aggregate over the SKUs and days involved).
+
+    The raw events are upserted by event_id first, so a replay recomputes the
+    same totals. `$max` keeps concurrent writers correct: while a rebuild only
+    adds raw events a day's totals only grow, and the recompute that follows
+    the last raw write of a day sees all of them.
+    """
+    db_instance = db.get_db()
+    skus = sorted({snapshot["product_sku"] for snapshot in snapshots.values()})
+    days = sorted({snapshot["date_key"] for snapshot in snapshots.values()})
+
+    cursor = db_instance[settings.COLLECTION_RAW_EVENTS].aggregate([
+        {"$match": {
+            "product_sku": {"$in": skus},
+            "timestamp": {
+                "$gte": datetime.strptime(days[0], "%Y-%m-%d"),
+                "$lt": datetime.strptime(days[-1], "%Y-%m-%d") + timedelta(days=1)
+            }
+        }},
+        {"$group": {
+            "_id": {
+                "sku": "$product_sku",
+                "date_key": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}
+            },
+            "total_units_sold": {"$sum": "$quantity"},
+            "total_revenue": {"$sum": {"$multiply": ["$quantity", "$unit_price"]}}
+        }}
+    ])
+    totals = {f"{row['_id']['date_key']}_{row['_id']['sku']}": row async for row in cursor}
+
+    generated_at = datetime.utcnow()
+    await db_instance[settings.COLLECTION_DAILY_SNAPSHOTS].bulk_write(
+        [
+            UpdateOne(
+                {"_id": snapshot_id},
+                {
+                    "$set": {
+                        "date_key": snapshot["date_key"],
+                        "product_sku": snapshot["product_sku"],
+                        "aggregation_version": "v1.0",
+                        "generated_at": generated_at
+                    },
+                    "$max": {
+                        "total_units_sold": totals[snapshot_id]["total_units_sold"],
+                        "total_revenue": totals[snapshot_id]["total_revenue"]
+                    }
+                },
+                upsert=True
+            )
+            for snapshot_id, snapshot in snapshots.items() if snapshot_id in totals
+        ],
+        ordered=False
+    )
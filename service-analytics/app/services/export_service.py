@@ -0,0 +1,137 @@
+# app/services/export_service.py
+"""
+Bulk export of forecasts and daily snapshots as NDJSON.
+
+Documents are read through server-side cursors (EXPORT_CURSOR_BATCH_SIZE at a
+time) and encoded one line at a time, so memory stays flat however large the
+catalog is. Pages are keyset-paginated by SKU: a page always ends on a SKU
+boundary, and the next page starts with `after_sku` = the last line's
+`product_sku`.
+"""
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from bson import ObjectId
+from app.core.db import db
+from app.core.config import settings
+
+SNAPSHOT_EXPORT_PROJECTION = {"_id": 0, "product_sku": 1, "date_key": 1, "total_units_sold": 1, "total_revenue": 1, "generated_at": 1}
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+async def export_forecasts(after_sku: Optional[str] = None, limit: int = 0, model_version: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None) -> AsyncIterator[dict]:
+    """
+    Latest forecast per SKU in SKU order, predictions restricted to [start_date, end_date].
+
+    Args:
+        after_sku: Keyset cursor; only SKUs sorting after it are returned.
+        limit: Maximum SKUs (0 = no limit).
+    """
+    match = {}
+    if after_sku:
+        match["product_sku"] = {"$gt": after_sku}
+    if model_version:
+        match["model_version"] = model_version
+    if start_date or end_date:
+        # Skip forecasts without a prediction in range before they are sorted
+        date_range = {}
+        if start_date:
+            date_range["$gte"] = start_date
+        if end_date:
+            date_range["$lte"] = end_date
+        match["forecasts"] = {"$elemMatch": {"date": date_range}}
+
+    pipeline = [{"$match": match}, {"$sort": {"product_sku": 1}}]
+    if start_date or end_date:
+        # Trim the predictions server-side instead of shipping whole horizons
+        conditions = []
+        if start_date:
+            conditions.append({"$gte": ["$$entry.date", start_date]})
+        if end_date:
+            conditions.append({"$lte": ["$$entry.date", end_date]})
+        pipeline.append({"$set": {"forecasts": {
+            "$filter": {"input": "$forecasts", "as": "entry", "cond": {"$and": conditions}}
+        }}})
+    # Limit only once every remaining SKU has predictions in range, or a page
+    # could come back short while later SKUs still match
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": {"_id": 0}})
+
+    cursor = db.get_read_db()[settings.COLLECTION_FORECASTS].aggregate(
+        pipeline, batchSize=settings.EXPORT_CURSOR_BATCH_SIZE
+    )
+    try:
+        async for forecast in cursor:
+            yield forecast
+    finally:
+        await cursor.close()
+
+async def export_snapshots(after_sku: Optional[str] = None, limit: int = 0, start_date: Optional[str] = None, end_date: Optional[str] = None) -> AsyncIterator[dict]:
+    """
+    Daily snapshots ordered by (product_sku, date_key), via the (product_sku, date_key) index.
+
+    Args:
+        after_sku: Keyset cursor; only SKUs sorting after it are returned.
+        limit: Maximum SKUs (0 = no limit); a SKU's days are never split across pages.
+    """
+    query = {}
+    if after_sku:
+        query["product_sku"] = {"$gt": after_sku}
+    if start_date or end_date:
+        query["date_key"] = {}
+        if start_date:
+            query["date_key"]["$gte"] = start_date
+        if end_date:
+            query["date_key"]["$lte"] = end_date
+
+    cursor = db.get_read_db()[settings.COLLECTION_DAILY_SNAPSHOTS].find(
+        query, SNAPSHOT_EXPORT_PROJECTION
+    ).sort([("product_sku", 1), ("date_key", 1)]).batch_size(settings.EXPORT_CURSOR_BATCH_SIZE)
+
+    skus = 0
+    current_sku = None
+    try:
+        async for snapshot in cursor:
+            if snapshot["product_sku"] != current_sku:
+                if limit and skus >= limit:
+                    break
+                skus += 1
+                current_sku = snapshot["product_sku"]
+            yield snapshot
+    finally:
+        await cursor.close()
+
+async def ndjson_stream(records: AsyncIterator[dict], compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Encodes records as NDJSON, yielding chunks of about EXPORT_CHUNK_BYTES
+    (gzip-compressed on the fly when `compress`).
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None # 31 = gzip container
+    buffer = []
+    size = 0
+
+    def emit(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    async for record in records:
+        line = json.dumps(record, default=_json_default, separators=(",", ":")).encode() + b"\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= settings.EXPORT_CHUNK_BYTES:
+            chunk = emit(b"".join(buffer))
+            buffer, size = [], 0
+            if chunk:
+                yield chunk
+
+    tail = emit(b"".join(buffer))
+    if compressor:
+        tail += compressor.flush()
+    if tail:
+        yield tail
@@ -1,7 +1,8 @@
 # service-analytics/app/services/feature_engineering.py
 import pandas as pd
 import numpy as np
-from typing import List, Optional, Set
+from typing import List, Optional
+from app.ml.calendar import get_calendar
 
 class InventoryFeatureEngineer:
     """
@@ -89,12 +90,12 @@ class InventoryFeatureEngineer:
         # Calendar Features (contextual, non-lag):
         # - is_weekend
         
-        # Calculate day of week (0=Monday, 6=Sunday)
+        # Sliced from the shared calendar table (same values the forecaster uses)
         # Note: _preprocess guarantees self.date_col is datetime type
-        day_of_week = self.df[self.date_col].dt.dayofweek
+        calendar = get_calendar().for_dates(self.df[self.date_col].to_numpy())
         
         # Create binary feature: 1 for Sat/Sun, 0 otherwise
-        self.df['is_weekend'] = (day_of_week >= 5).astype(int)
+        self.df['is_weekend'] = calendar[:, 0].astype(int)
 
         # Sanity Check: Ensure strictly binary (0 or 1)
         # Guards against silent dtype corruption or logic errors
@@ -105,31 +106,17 @@ class InventoryFeatureEngineer:
         Adds static holiday context features.
         
         Feature: is_holiday (Binary)
-        Definition: 1 if date is in the static holiday list, else 0.
+        Definition: 1 if date is a holiday of the configured calendar region, else 0.
         
         Why: Allows the model to account for exogenous demand spikes 
              (e.g., Black Friday, Christmas) separately from organic trends.
              
-        Safety: Deterministic and leak-safe. Uses a pre-defined list of dates
-                so it can be generated for future forecast horizons.
-        """
-        # MVP: Static list of major retail holidays (Example years: 2023-2025)
-        # In a real production env, this might be injected via config or a library.
-        static_holidays: Set[str] = {
-            # 2023
-            "2023-01-01", "2023-05-29", "2023-07-04", "2023-11-23", "2023-11-24", "2023-12-25",
-            # 2024
-            "2024-01-01", "2024-05-27", "2024-07-04", "2024-11-28", "2024-11-29", "2024-12-25",
-            # 2025
-            "2025-01-01", "2025-05-26", "2025-07-04", "2025-11-27", "2025-11-28", "2025-12-25",
-        }
-
-        # Convert static strings to datetime for robust comparison
-        # (This handles timestamp matching correctly)
-        holiday_dates = pd.to_datetime(list(static_holidays))
-        
-        # Vectorized check: is the date in our list?
-        self.df['is_holiday'] = self.df[self.date_col].isin(holiday_dates).astype(int)
+        Safety: Deterministic and leak-safe. Holidays come from calendar rules
+                so they can be generated for future forecast horizons.
+        """
+        # Vectorized lookup in the precomputed calendar table
+        calendar = get_calendar().for_dates(self.df[self.date_col].to_numpy())
+        self.df['is_holiday'] = calendar[:, 1].astype(int)
 
     def transform(self) -> pd.DataFrame:
         """
@@ -157,4 +144,108 @@ class InventoryFeatureEngineer:
         numeric_df = ml_ready_df.select_dtypes(include=[np.number])
 
         # Reset index for clean usage
-        return numeric_df.reset_index(drop=True)
\ No newline at end of file
+        return numeric_df.reset_index(drop=True)
+
+class InventoryPanelFeatureEngineer:
+    """
+    Panel-mode variant of `InventoryFeatureEngineer` for many SKUs at once.
+
+    Takes a long-format frame of (sku, date, target) rows and computes the same
+    features in one vectorized pass over the whole catalog instead of one small
+    pandas pipeline per SKU. Every shifted value is masked where it would cross
+    a SKU boundary, so each SKU's rows match the per-SKU path exactly.
+    """
+
+    def __init__(self, raw_data: pd.DataFrame, sku_col: str = 'product_sku', target_col: str = 'total_units_sold', date_col: str = 'date_key'):
+        """
+        Initialize the engineer with raw panel data.
+
+        Args:
+            raw_data (pd.DataFrame): Long-format DataFrame containing history for many SKUs.
+            sku_col (str): The name of the column identifying the SKU.
+            target_col (str): The name of the column containing sales figures.
+            date_col (str): The name of the column containing dates.
+        """
+        self.df = raw_data.copy()
+        self.sku_col = sku_col
+        self.target_col = target_col
+        self.date_col = date_col
+
+        # Validation
+        required_cols = {self.sku_col, self.target_col, self.date_col}
+        if not required_cols.issubset(self.df.columns):
+            raise ValueError(f"Input DataFrame missing required columns: {required_cols - set(self.df.columns)}")
+
+    def _preprocess(self) -> None:
+        """
+        Ensures dates are datetime objects and sorts each SKU's series chronologically.
+        """
+        self.df[self.date_col] = pd.to_datetime(self.df[self.date_col])
+
+        # Integer group codes (in SKU order) make both the sort and the
+        # "same SKU N rows back?" masks cheap integer operations
+        codes, _ = pd.factorize(self.df[self.sku_col], sort=True)
+        order = np.lexsort((self.df[self.date_col].to_numpy(), codes))
+        self.df = self.df.take(order).reset_index(drop=True)
+        self._codes = codes[order]
+
+    def _shift_within_sku(self, values: np.ndarray, periods: int) -> np.ndarray:
+        """
+        Equivalent of a per-SKU `shift(periods)`: global shift, then NaN wherever
+        the source row belongs to a different SKU.
+        """
+        shifted = np.full(len(values), np.nan)
+        if periods < len(values):
+            shifted[periods:] = values[:-periods]
+            shifted[periods:][self._codes[periods:] != self._codes[:-periods]] = np.nan
+        return shifted
+
+    def _add_lags(self, lags: List[int] = [1, 7, 14]) -> None:
+        target = self.df[self.target_col].to_numpy(dtype=np.float64)
+        for lag in lags:
+            self.df[f'lag_{lag}'] = self._shift_within_sku(target, lag)
+
+    def _add_rolling_features(self, window: int = 7) -> None:
+        """
+        Rolling mean over the per-SKU shifted series.
+
+        A grouped rolling window is a single Cython pass whose running sum restarts
+        at each SKU boundary, so results are bit-identical to the per-SKU path
+        (a plain global rolling window would carry float error across SKUs).
+        """
+        target = self.df[self.target_col].to_numpy(dtype=np.float64)
+        shifted = pd.Series(self._shift_within_sku(target, 1), index=self.df.index)
+        rolling = shifted.groupby(self._codes, sort=False).rolling(window=window).mean()
+        # Rows are sorted by SKU, so the grouped result is already in row order
+        self.df[f'rolling_mean_{window}'] = rolling.to_numpy()
+
+    def _add_trend_index(self) -> None:
+        self.df['trend_index'] = (self.df['lag_1'] - self.df['lag_7']) / 7.0
+
+    def _add_calendar_context(self) -> None:
+        # One table lookup yields both is_weekend and is_holiday
+        calendar = get_calendar().for_dates(self.df[self.date_col].to_numpy())
+        self.df['is_weekend'] = calendar[:, 0].astype(int)
+        self.df['is_holiday'] = calendar[:, 1].astype(int)
+
+    def transform(self) -> pd.DataFrame:
+        """
+        Executes the full feature engineering pipeline for every SKU.
+
+        Returns:
+            pd.DataFrame: The SKU column followed by the same numeric features and
+            target as `InventoryFeatureEngineer.transform`, sorted by (sku, date).
+        """
+        self._preprocess()
+
+        self._add_lags(lags=[1, 7, 14])
+        self._add_rolling_features(window=7)
+        self._add_trend_index()
+        self._add_calendar_context()
+
+        ml_ready_df = self.df.dropna()
+
+        numeric_df = ml_ready_df.select_dtypes(include=[np.number])
+        numeric_df.insert(0, self.sku_col, ml_ready_df[self.sku_col])
+
+        return numeric_df.reset_index(drop=True)
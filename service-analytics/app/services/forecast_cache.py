@@ -0,0 +1,104 @@
+# app/services/forecast_cache.py
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+from app.core.config import settings
+
+class ForecastCache:
+    """
+    Bounded in-process LRU + TTL cache of forecast documents, keyed by SKU.
+
+    Invalidation is in-process only: this process's ETL invalidates a SKU as
+    soon as it writes one of its snapshots (see `etl_service`), but snapshots
+    written by another replica's ETL are not seen here. With several replicas a
+    hit can therefore be up to `ttl_seconds` stale; the TTL is the only bound.
+
+    Per-SKU generations guard against a regeneration that started before an
+    invalidation putting its (already outdated) result back into the cache.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, enabled: bool = True):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def generation(self, sku: str) -> int:
+        """
+        Token to take before reading from MongoDB and pass back to `put`.
+        """
+        return self._generations.get(sku, 0)
+
+    def get(self, sku: str, days: int) -> Optional[dict]:
+        """
+        Returns the cached forecast if it is unexpired and covers `days`.
+        """
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(sku)
+        if entry is not None:
+            forecast_doc, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[sku]
+                self.expirations += 1
+            elif forecast_doc.get("forecast_horizon", 0) >= days:
+                self._entries.move_to_end(sku)
+                self.hits += 1
+                return forecast_doc
+
+        self.misses += 1
+        return None
+
+    def put(self, forecast_doc: dict, generation: int) -> None:
+        """
+        Caches a fresh forecast unless the SKU was invalidated since `generation`.
+        """
+        sku = forecast_doc["product_sku"]
+        if not self.enabled or self.generation(sku) != generation:
+            return
+
+        self._entries[sku] = (forecast_doc, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(sku)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, sku: str) -> None:
+        self._generations[sku] = self._generations.get(sku, 0) + 1
+        if self._entries.pop(sku, None) is not None:
+            self.invalidations += 1
+
+    def invalidate_many(self, skus: Iterable[str]) -> None:
+        for sku in skus:
+            self.invalidate(sku)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+forecast_cache = ForecastCache(
+    max_size=settings.FORECAST_CACHE_MAX_SIZE,
+    ttl_seconds=settings.FORECAST_CACHE_TTL_SECONDS,
+    enabled=settings.FORECAST_CACHE_ENABLED
+)
@@ -1,89 +1,348 @@
 # app/services/forecasting_service.py
-import pandas as pd
+import time
+import numpy as np
 from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from app.core.db import db
 from app.core.config import settings
 from app.utils.logger import logger
-from app.services.feature_engineering import InventoryFeatureEngineer
+from app.utils.single_flight import SingleFlight
 from app.ml.regression_model import DemandLinearRegression
+from app.core.executor import compute_executor
+from app.services.model_registry import load_model, save_model, watermark_moved, compute_watermark
+from app.services.training_stats_service import training_statistics
+from app.services.history_store import history_store
+from app.utils.metrics import metrics, FORECAST_PHASE_SECONDS, FORECASTS_GENERATED
+from app.utils.profiler import current_profile, sampled_call
 
-async def generate_forecast_for_sku(sku: str, horizon: int = 7) -> dict:
+# Concurrent regenerations of the same (sku, horizon) share one computation
+regenerations = SingleFlight()
+
+metrics.counter(
+    "analytics_forecast_regenerations_total", "Forecast regenerations started vs. joined by a concurrent caller",
+    ["outcome"], fn=lambda: {("started",): regenerations.started, ("shared",): regenerations.shared}
+)
+metrics.gauge(
+    "analytics_forecast_regenerations_in_flight", "Forecast regenerations currently running",
+    fn=lambda: regenerations.stats()["in_flight"]
+)
+
+def _to_date_key(value) -> str:
+    return value if isinstance(value, str) else value.strftime("%Y-%m-%d")
+
+def train_and_forecast(date_keys: np.ndarray, units: np.ndarray, forecast_start_date: datetime, horizon: int) -> Tuple[List[float], dict, Dict[str, float]]:
     """
-    Full Orchestration Pipeline:
-    1. Fetch historical daily snapshots (OLAP).
-    2. Engineer ML features (Phase 3).
-    3. Train Linear Regression Model (Phase 4).
-    4. Generate Recursive Forecast (Phase 6 - Context Aware).
-    5. Save results to MongoDB.
+    CPU-bound stages of the pipeline (runs inside the compute executor).
+
+    Takes and returns only plain arrays/scalars so it can be shipped to a
+    worker process without pickling DataFrames or models.
+
+    Returns:
+        (predicted values, fitted model params incl. R² score, seconds per phase)
     """
-    db_instance = db.get_db()
-    
-    # --- Step 1: Extract Data (OLAP) ---
-    # Fetch all daily snapshots for this SKU, sorted by date
-    cursor = db_instance[settings.COLLECTION_DAILY_SNAPSHOTS].find(
-        {"product_sku": sku}
-    ).sort("date_key", 1) # Ascending order is critical for time-series
-    
-    snapshots = await cursor.to_list(length=None)
-    
-    if not snapshots:
-        logger.warning(f"No historical data found for SKU: {sku}")
-        return None
+    # The pandas/scikit-learn stack is only imported where it runs (see app.core.startup)
+    import pandas as pd
+    from app.services.feature_engineering import InventoryFeatureEngineer
 
-    # Convert to Pandas DataFrame
-    df = pd.DataFrame(snapshots)
-    
-    # Ensure we have the target column
-    if "total_units_sold" not in df.columns:
-        logger.error(f"Data for {sku} is missing 'total_units_sold'")
-        return None
+    started = time.perf_counter()
+    df = pd.DataFrame({"date_key": date_keys, "total_units_sold": units})
 
     # --- Step 2: Feature Engineering (Phase 3) ---
     # Transform raw data into ML-ready features (lags, rolling means, etc.)
     engineer = InventoryFeatureEngineer(df, target_col='total_units_sold', date_col='date_key')
     X = engineer.transform()
-    
+
     # The target variable 'y' corresponds to the transformed X
     # (Note: X will be shorter than df because of initial NaNs from lags)
     y = X['total_units_sold']
+    featurized = time.perf_counter()
 
     # --- Step 3: Train Model (Phase 4) ---
-    # We initialize a fresh model for every request (Stateless Architecture)
+    # We initialize a fresh model; its coefficients are kept in the model registry
     regressor = DemandLinearRegression()
     regressor.train(X, y)
-    
+    trained = time.perf_counter()
+
     # --- Step 4: Generate Recursive Forecast ---
     # We need the last 14 days of history to start the recursion loop.
-    # We take this from the ORIGINAL df (before NaNs were dropped) to get the most recent data.
-    recent_history = df['total_units_sold'].tail(14).tolist()
-    
+    # We take this from the ORIGINAL series (before NaNs were dropped) to get the most recent data.
+    recent_history = units[-14:].tolist()
+
+    predicted_values = regressor.forecast_recursive(
+        recent_history,
+        start_date=forecast_start_date,
+        horizon=horizon
+    )
+
+    timings = {
+        "featurize": featurized - started,
+        "train": trained - featurized,
+        "predict": time.perf_counter() - trained
+    }
+    return predicted_values, regressor.to_params(), timings
+
+# Only the fields the model needs cross the wire
+HISTORY_PROJECTION = {"_id": 0, "product_sku": 1, "date_key": 1, "total_units_sold": 1, "generated_at": 1}
+
+class SnapshotHistory(NamedTuple):
+    """
+    A SKU's training window as typed arrays, oldest first.
+    """
+    date_keys: np.ndarray  # "YYYY-MM-DD" strings
+    units: np.ndarray  # float64; NaN where a snapshot had no total_units_sold
+    watermark: Optional[dict]
+
+class _HistoryBuilder:
+    """
+    Fills NumPy arrays straight from a cursor sorted newest first.
+
+    Arrays start small and double up to the window size, so short histories
+    never allocate a full window.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        capacity = min(window, 64) if window else 64
+        self.date_keys = np.empty(capacity, dtype="U10")
+        self.units = np.empty(capacity, dtype=np.float64)
+        self.size = 0
+        self.last_generated_at = datetime.min
+
+    def full(self) -> bool:
+        return bool(self.window) and self.size >= self.window
+
+    def add(self, snapshot: dict) -> None:
+        if self.size == len(self.units):
+            capacity = len(self.units) * 2
+            if self.window:
+                capacity = min(capacity, self.window)
+            self.date_keys = np.resize(self.date_keys, capacity)
+            self.units = np.resize(self.units, capacity)
+
+        units = snapshot.get("total_units_sold")
+        self.date_keys[self.size] = _to_date_key(snapshot["date_key"])
+        self.units[self.size] = np.nan if units is None else units
+        self.last_generated_at = max(self.last_generated_at, snapshot.get("generated_at") or datetime.min)
+        self.size += 1
+
+    def build(self) -> SnapshotHistory:
+        # Reverse the newest-first cursor order into chronological order
+        date_keys = self.date_keys[:self.size][::-1].copy()
+        units = self.units[:self.size][::-1].copy()
+        watermark = compute_watermark(str(date_keys[-1]), self.size, self.last_generated_at) if self.size else None
+        return SnapshotHistory(date_keys, units, watermark)
+
+async def fetch_history(sku: str) -> SnapshotHistory:
+    """
+    Reads the SKU's newest FORECAST_TRAINING_WINDOW snapshots (0 = all) via
+    the (product_sku, date_key) index.
+    """
+    window = settings.FORECAST_TRAINING_WINDOW
+    # Primary, not the read pool: the forecast is stamped fresh against the newest snapshot
+    cursor = db.get_db()[settings.COLLECTION_DAILY_SNAPSHOTS].find(
+        {"product_sku": sku}, HISTORY_PROJECTION
+    ).sort("date_key", -1).batch_size(settings.MONGO_READ_BATCH_SIZE)
+    if window:
+        cursor = cursor.limit(window)
+
+    builder = _HistoryBuilder(window)
+    async for snapshot in cursor:
+        builder.add(snapshot)
+    return builder.build()
+
+async def fetch_history_from_store(sku: str) -> Optional[SnapshotHistory]:
+    """
+    The SKU's training window from the local columnar store, or None if the
+    store is disabled, does not have the SKU, or is behind MongoDB for it.
+    """
+    if not history_store.enabled:
+        return None
+    stored = await history_store.load_sku(sku)
+    if stored is None:
+        return None
+
+    date_keys, units, last_generated_at = stored
+    window = settings.FORECAST_TRAINING_WINDOW
+    if window:
+        date_keys, units = date_keys[-window:], units[-window:]
+    return SnapshotHistory(date_keys, units, compute_watermark(str(date_keys[-1]), len(units), last_generated_at))
+
+async def fetch_histories(skus: List[str]) -> Dict[str, SnapshotHistory]:
+    """
+    Fetches the training windows of many SKUs with a single `$in` query.
+
+    Rows beyond a SKU's window are skipped as they stream in, so memory stays
+    bounded by the window even for old SKUs.
+
+    Returns:
+        Dict mapping every requested sku -> history (empty if it has no data).
+    """
+    window = settings.FORECAST_TRAINING_WINDOW
+    builders = {sku: _HistoryBuilder(window) for sku in skus}
+    cursor = db.get_db()[settings.COLLECTION_DAILY_SNAPSHOTS].find(
+        {"product_sku": {"$in": list(builders)}}, HISTORY_PROJECTION
+    ).sort([("product_sku", 1), ("date_key", -1)]).batch_size(settings.MONGO_READ_BATCH_SIZE)
+
+    async for snapshot in cursor:
+        builder = builders[snapshot["product_sku"]]
+        if not builder.full():
+            builder.add(snapshot)
+    return {sku: builder.build() for sku, builder in builders.items()}
+
+async def generate_forecast_for_sku(sku: str, horizon: int = 7, history: Optional[SnapshotHistory] = None) -> dict:
+    """
+    Full Orchestration Pipeline:
+    1. Fetch historical daily snapshots (OLAP).
+    2. Engineer ML features (Phase 3).
+    3. Train Linear Regression Model (Phase 4).
+    4. Generate Recursive Forecast (Phase 6 - Context Aware).
+    5. Save results to MongoDB.
+
+    Args:
+        history: Pre-fetched training window (e.g. from `fetch_histories`); skips Step 1.
+    """
+    model_entry = await load_model(sku) if settings.MODEL_REGISTRY_ENABLED else None
+
+    # --- Step 0: Model Registry ---
+    # If no snapshot was written since the stored model was trained, skip the
+    # fetch and the training and only run the (cheap) recursive forecast.
+    if model_entry and history is None and not await watermark_moved(sku, model_entry):
+        return await _forecast_from_registry(sku, horizon, model_entry)
+
+    # --- Step 0b: Incremental Training ---
+    # Solve from the sufficient statistics the ETL keeps up to date (cost does
+    # not grow with the history); only the last 14 days are read to seed the recursion.
+    if settings.TRAINING_MODE == "incremental" and history is None:
+        forecast_doc = await _forecast_from_statistics(sku, horizon)
+        if forecast_doc:
+            return forecast_doc
+
+    # --- Step 1: Extract Data (OLAP) ---
+    if history is None:
+        with FORECAST_PHASE_SECONDS.time("full", "fetch"):
+            # Memory-mapped from the local columnar store when it is current for this SKU
+            history = await fetch_history_from_store(sku)
+            if history is None:
+                # Newest FORECAST_TRAINING_WINDOW days, projected, as typed arrays
+                history = await fetch_history(sku)
+
+    if history.watermark is None:
+        logger.warning(f"No historical data found for SKU: {sku}")
+        return None
+
+    # Ensure we have the target column
+    if np.isnan(history.units).any():
+        logger.error(f"Data for {sku} is missing 'total_units_sold'")
+        return None
+
+    # Pre-fetched history that the stored model was already trained on
+    if model_entry and model_entry["watermark"] == history.watermark:
+        return await _forecast_from_registry(sku, horizon, model_entry)
+
+    # Only plain arrays cross the executor boundary (cheap to pickle)
+    date_keys, units = history.date_keys, history.units
+
     # CRITICAL UPDATE for Phase 6: Calculate Start Date
     # We need to tell the model *when* the forecast starts so it can generate
     # calendar features (is_weekend, is_holiday) dynamically.
-    last_date_str = df.iloc[-1]['date_key']
-    
-    # Ensure it's a datetime object
-    if isinstance(last_date_str, str):
-        last_date = datetime.strptime(last_date_str, "%Y-%m-%d")
-    else:
-        last_date = last_date_str # Already datetime/timestamp
-        
+    last_date = datetime.strptime(date_keys[-1], "%Y-%m-%d")
+
     # The forecast starts the day AFTER the last known history
     forecast_start_date = last_date + timedelta(days=1)
-    
-    # Call the updated recursive method with the start_date
-    predicted_values = regressor.forecast_recursive(
-        recent_history, 
-        start_date=forecast_start_date, 
-        horizon=horizon
-    )
 
-# --- Step 5: Format with CONFIDENCE INTERVALS ---
+    # --- Steps 2-4: Feature Engineering, Training & Recursive Forecast ---
+    # CPU-bound pandas/sklearn work runs on the compute executor, not the event loop
+    submitted = time.perf_counter()
+    profile = current_profile()
+    if profile is None:
+        predicted_values, params, timings = await compute_executor.run(
+            train_and_forecast, date_keys, units, forecast_start_date, horizon
+        )
+    else:
+        # Profiled request: sample the worker too, so pandas/sklearn show up in the flamegraph
+        (predicted_values, params, timings), stacks = await compute_executor.run(
+            sampled_call, profile.interval, train_and_forecast, date_keys, units, forecast_start_date, horizon
+        )
+        profile.add_stacks(stacks, root="compute_executor")
+    # Time spent queued for (or shipping data to) a worker, not computing
+    FORECAST_PHASE_SECONDS.observe(time.perf_counter() - submitted - sum(timings.values()), "full", "executor_wait")
+    for phase, seconds in timings.items():
+        FORECAST_PHASE_SECONDS.observe(seconds, "full", phase)
+
+    with FORECAST_PHASE_SECONDS.time("full", "persist"):
+        if settings.MODEL_REGISTRY_ENABLED:
+            await save_model(sku, params, history.watermark, recent_history=units[-14:].tolist())
+
+        forecast_doc = await _save_forecast(sku, horizon, forecast_start_date, predicted_values, params["r2"])
+    FORECASTS_GENERATED.inc("full")
+    return forecast_doc
+
+async def _forecast_from_statistics(sku: str, horizon: int) -> Optional[dict]:
+    """
+    Trains from the SKU's sufficient statistics (the same rows as a full refit
+    of the training window) and forecasts.
+
+    Returns:
+        The forecast document, or None if there are too few days (the caller
+        then falls back to a full refit).
+    """
+    with FORECAST_PHASE_SECONDS.time("incremental", "fetch"):
+        loaded = await training_statistics(sku)
+        if loaded is None or loaded[0]["n"] < 2:
+            return None
+        stats, recent = loaded
+
+    with FORECAST_PHASE_SECONDS.time("incremental", "train"):
+        regressor = DemandLinearRegression()
+        regressor.train_from_stats(stats)
+
+    last_date = datetime.strptime(_to_date_key(recent[-1]["date_key"]), "%Y-%m-%d")
+    forecast_start_date = last_date + timedelta(days=1)
+
+    with FORECAST_PHASE_SECONDS.time("incremental", "predict"):
+        predicted_values = regressor.forecast_recursive(
+            [float(snapshot["total_units_sold"]) for snapshot in recent],
+            start_date=forecast_start_date,
+            horizon=horizon
+        )
+
+    with FORECAST_PHASE_SECONDS.time("incremental", "persist"):
+        forecast_doc = await _save_forecast(sku, horizon, forecast_start_date, predicted_values, regressor.r2_score)
+    FORECASTS_GENERATED.inc("incremental")
+    return forecast_doc
+
+async def _forecast_from_registry(sku: str, horizon: int, model_entry: dict) -> dict:
+    """
+    Forecasts with stored coefficients: no history fetch, no training.
+    """
+    regressor = DemandLinearRegression.from_params(model_entry)
+    last_date = datetime.strptime(_to_date_key(model_entry["watermark"]["last_date_key"]), "%Y-%m-%d")
+    forecast_start_date = last_date + timedelta(days=1)
+
+    with FORECAST_PHASE_SECONDS.time("registry", "predict"):
+        predicted_values = regressor.forecast_recursive(
+            model_entry["recent_history"],
+            start_date=forecast_start_date,
+            horizon=horizon
+        )
+
+    with FORECAST_PHASE_SECONDS.time("registry", "persist"):
+        forecast_doc = await _save_forecast(sku, horizon, forecast_start_date, predicted_values, regressor.r2_score)
+    FORECASTS_GENERATED.inc("registry")
+    return forecast_doc
+
+async def _save_forecast(sku: str, horizon: int, forecast_start_date: datetime, predicted_values: List[float], r2: float) -> dict:
+    """
+    Formats predictions with confidence intervals and upserts the forecast document.
+    """
+    db_instance = db.get_db()
+
+    # --- Step 5: Format with CONFIDENCE INTERVALS ---
     # Logic: The lower the R2, the wider the margin of error.
     # We use a base error margin of 10% (0.10) and scale it by (1 - R2).
     # If R2 is 1.0, margin is 0%. If R2 is 0.5, margin is 10% + 5% = 15%.
     
-    r2_score = max(0, regressor.r2_score) # Clamp negative R2 to 0
+    r2_score = max(0, r2) # Clamp negative R2 to 0
     uncertainty_factor = 0.10 + (0.20 * (1 - r2_score)) 
     
     forecast_entries = []
@@ -107,7 +366,7 @@ async def generate_forecast_for_sku(sku: str, horizon: int = 7) -> dict:
         "model_version": settings.MODEL_VERSION,
         "generated_at": datetime.utcnow(),
         "forecast_horizon": horizon,
-        "confidence_score_r2": round(regressor.r2_score, 4),
+        "confidence_score_r2": round(r2, 4),
         "forecasts": forecast_entries
     }
 
@@ -118,6 +377,6 @@ async def generate_forecast_for_sku(sku: str, horizon: int = 7) -> dict:
         upsert=True
     )
     
-    logger.info(f"Generated forecast for {sku} (R2: {regressor.r2_score:.2f})")
+    logger.info(f"Generated forecast for {sku} (R2: {r2:.2f})")
     
     return forecast_document
\ No newline at end of file
@@ -0,0 +1,447 @@
+# app/services/history_store.py
+"""
+Optional local columnar copy of `daily_sales_snapshots` (Parquet, via pyarrow).
+
+Layout under HISTORY_STORE_PATH:
+    deltas/delta-<ns>-<uuid>.parquet       rows written by the ETL, not visible yet
+    buckets/v<version>/bucket-<k>.parquet  compacted rows; SKUs are hashed into
+                                           k buckets, sorted by (sku, date_key)
+    manifest.json                          current version, folded deltas, watermark
+    gaps.json                              SKUs whose delta failed, and since when
+
+Rows are absolute snapshot values copied from MongoDB (including their
+`generated_at`), so compaction keeps the newest row per (sku, date_key) and
+re-applying a delta is harmless. The manifest is the commit point of a
+compaction: it is replaced atomically and readers only open the version it names.
+
+A newer row does not prove the older ones are there: when a delta fails, its
+SKUs are recorded as gaps and read from MongoDB until a later append has
+re-exported their whole history.
+"""
+import asyncio
+import fcntl
+import importlib.util
+import json
+import os
+import shutil
+import uuid
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.core.db import db
+from app.core.config import settings
+from app.utils.logger import logger
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+COLUMNS = ["product_sku", "date_key", "total_units_sold", "total_revenue", "generated_at"]
+PROJECTION = {"_id": 0, **{column: 1 for column in COLUMNS}}
+
+@lru_cache(maxsize=None)
+def parquet_schema() -> "pa.Schema":
+    import pyarrow as pa  # Optional dependency, only loaded when the store is enabled
+
+    return pa.schema([
+        ("product_sku", pa.string()),
+        ("date_key", pa.string()),
+        ("total_units_sold", pa.float64()),
+        ("total_revenue", pa.float64()),
+        ("generated_at", pa.timestamp("us"))
+    ])
+
+class HistoryStore:
+    """
+    Partitioned Parquet dataset of daily snapshots, fed by the ETL and compacted
+    in the background. Reads are memory-mapped and never touch MongoDB beyond
+    a one-document freshness probe.
+    """
+
+    def __init__(self, root: str, buckets: int, enabled: bool):
+        self.root = root
+        self.buckets = buckets
+        # Checked without importing it: a disabled store never loads pyarrow
+        has_pyarrow = importlib.util.find_spec("pyarrow") is not None
+        self.enabled = enabled and has_pyarrow
+        if enabled and not has_pyarrow:
+            logger.warning("⚠️ pyarrow is not installed: history store disabled")
+        self._manifest: Optional[dict] = None
+        self._manifest_mtime = None
+        self._gaps: Dict[str, dict] = {}
+        self._gaps_mtime = None
+        # Gaps this process could not persist either (e.g. the disk is full)
+        self._local_gaps: Dict[str, dict] = {}
+        self.reads = 0
+        self.misses = 0
+        self.stale = 0
+        self.gapped = 0
+        self.deltas_written = 0
+        self.compactions = 0
+
+    # --- Layout ---
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    def _bucket(self, sku: str) -> int:
+        return zlib.crc32(sku.encode()) % self.buckets
+
+    def _bucket_path(self, version: int, bucket: int) -> str:
+        return self._path("buckets", f"v{version}", f"bucket-{bucket:04d}.parquet")
+
+    def _pending_deltas(self) -> List[str]:
+        try:
+            names = os.listdir(self._path("deltas"))
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if name.endswith(".parquet"))
+
+    def load_manifest(self) -> dict:
+        """
+        Current manifest (re-read only when the file changed).
+        """
+        path = self._path("manifest.json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {"version": 0, "watermark": None, "folded_deltas": [], "rows": 0}
+        if mtime != self._manifest_mtime:
+            with open(path) as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def _write_atomic(self, path: str, write) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        write(tmp)
+        os.replace(tmp, path)
+
+    # --- Writes (ETL) ---
+
+    def write_delta(self, rows: List[dict]) -> str:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist(
+            [{column: row.get(column) for column in COLUMNS} for row in rows], schema=parquet_schema()
+        )
+        name = f"delta-{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}-{uuid.uuid4().hex[:8]}.parquet"
+        self._write_atomic(self._path("deltas", name), lambda tmp: pq.write_table(table, tmp))
+        self.deltas_written += 1
+        return name
+
+    async def append(self, snapshot_ids: Iterable[str]) -> None:
+        """
+        ETL hook: copies the just-written snapshot documents into a delta file.
+
+        Failures are logged, not raised: the affected SKUs are recorded as gaps
+        and read from MongoDB until a later append has re-exported their full
+        history and that delta is compacted (or a rebuild starts over).
+        """
+        ids = list(snapshot_ids)
+        if not self.enabled or not ids:
+            return
+        started = datetime.utcnow().isoformat(timespec="microseconds")
+        gaps = self.load_gaps()
+        try:
+            query = {"_id": {"$in": ids}}
+            if gaps:
+                query = {"$or": [query, {"product_sku": {"$in": sorted(gaps)}}]}
+            rows = await db.get_db()[settings.COLLECTION_DAILY_SNAPSHOTS].find(query, PROJECTION).to_list(length=None)
+            if rows:
+                name = await asyncio.to_thread(self.write_delta, rows)
+                if gaps:
+                    await asyncio.to_thread(self._update_gaps, lambda current: _heal(current, set(gaps), started, name))
+        except Exception as e:
+            # Snapshot ids are "{YYYY-MM-DD}_{sku}"
+            failed = {snapshot_id[11:] for snapshot_id in ids}
+            logger.warning(f"⚠️ History store delta write failed, {len(failed)} SKUs read from MongoDB until re-exported: {e}")
+            mark = lambda current: current.update({sku: {"since": started, "healed_by": None} for sku in failed})
+            mark(self._local_gaps)
+            try:
+                await asyncio.to_thread(self._update_gaps, mark)
+            except Exception as gap_error:
+                logger.warning(f"⚠️ History store gaps kept in memory only: {gap_error}")
+
+    # --- Gaps ---
+
+    def load_gaps(self) -> Dict[str, dict]:
+        """
+        SKUs whose rows in the store may be incomplete -> {"since", "healed_by"}
+        (the delta re-exporting them, once written).
+        """
+        path = self._path("gaps.json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self._gaps, self._gaps_mtime = {}, None
+        else:
+            if mtime != self._gaps_mtime:
+                with open(path) as f:
+                    self._gaps = json.load(f)
+                self._gaps_mtime = mtime
+        return {**self._gaps, **self._local_gaps}
+
+    def _update_gaps(self, change) -> None:
+        """
+        Applies `change(gaps)` in place to the persisted and in-memory gaps.
+        Locked, as several processes append.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._path("gaps.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._gaps_mtime = None  # Re-read under the lock
+            self.load_gaps()
+            gaps = dict(self._gaps)
+            change(gaps)
+            change(self._local_gaps)
+            self._write_atomic(self._path("gaps.json"), lambda tmp: self._dump(gaps, tmp))
+
+    # --- Compaction ---
+
+    def compact(self) -> dict:
+        """
+        Folds pending deltas into a new version of the bucket files.
+
+        Only buckets that received rows are rewritten; the rest are hard-linked
+        from the previous version. Safe to run from several processes (a file
+        lock makes all but one skip).
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._path("compaction.lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return self.load_manifest()
+            return self._compact_locked()
+
+    def _compact_locked(self) -> dict:
+        import pandas as pd  # Compaction runs off the ETL path; keep pandas out of its imports
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        manifest = self.load_manifest()
+        folded = set(manifest["folded_deltas"])
+        deltas = self._pending_deltas()
+
+        # Deltas the last compaction committed but did not get to delete
+        for name in deltas:
+            if name in folded:
+                os.remove(self._path("deltas", name))
+        pending = [name for name in deltas if name not in folded]
+        if not pending:
+            return manifest
+
+        delta_frame = pd.concat(
+            [pq.read_table(self._path("deltas", name)).to_pandas() for name in pending],
+            ignore_index=True
+        )
+        bucket_ids = np.fromiter((self._bucket(sku) for sku in delta_frame["product_sku"]), dtype=np.int64, count=len(delta_frame))
+
+        old_version, version = manifest["version"], manifest["version"] + 1
+        rows = 0
+        for bucket in range(self.buckets):
+            old_path = self._bucket_path(old_version, bucket)
+            new_path = self._bucket_path(version, bucket)
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            updates = delta_frame[bucket_ids == bucket]
+            has_old = old_version > 0 and os.path.exists(old_path)
+
+            if updates.empty:
+                if has_old:
+                    os.link(old_path, new_path)
+                    rows += pq.read_metadata(new_path).num_rows
+                continue
+
+            merged = pd.concat([pq.read_table(old_path).to_pandas(), updates], ignore_index=True) if has_old else updates
+            # Newest generated_at wins; stable sort keeps later deltas ahead of ties
+            merged = merged.sort_values(["product_sku", "date_key", "generated_at"], kind="mergesort")
+            merged = merged.drop_duplicates(["product_sku", "date_key"], keep="last")
+            table = pa.Table.from_pandas(merged, schema=parquet_schema(), preserve_index=False)
+            self._write_atomic(new_path, lambda tmp: pq.write_table(table, tmp, row_group_size=64_000))
+            rows += table.num_rows
+
+        previous = manifest["watermark"]
+        newest = delta_frame["generated_at"].max().to_pydatetime().isoformat()
+        manifest = {
+            "version": version,
+            "folded_deltas": pending,
+            "watermark": max(previous, newest) if previous else newest,
+            "compacted_at": datetime.utcnow().isoformat(),
+            "rows": rows
+        }
+        self._write_atomic(self._path("manifest.json"), lambda tmp: self._dump(manifest, tmp))
+
+        for name in pending:
+            os.remove(self._path("deltas", name))
+        # SKUs whose re-export is now visible read from the store again
+        folded_deltas = set(pending)
+        if any(gap["healed_by"] in folded_deltas for gap in self.load_gaps().values()):
+            self._update_gaps(lambda gaps: _drop_healed(gaps, folded_deltas))
+        if old_version > 0:
+            shutil.rmtree(self._path("buckets", f"v{old_version}"), ignore_errors=True)
+
+        self.compactions += 1
+        logger.info(f"🗜️ History store compacted {len(pending)} deltas -> v{version} ({rows} rows, watermark {manifest['watermark']})")
+        return manifest
+
+    @staticmethod
+    def _dump(manifest: dict, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(manifest, f)
+
+    async def run_compactor(self, interval: float) -> None:
+        """
+        Background task: compacts pending deltas every `interval` seconds.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.compact)
+            except Exception as e:
+                logger.error(f"❌ History store compaction failed: {e}")
+
+    def reset(self) -> None:
+        """
+        Drops the whole dataset (used before a rebuild).
+        """
+        shutil.rmtree(self.root, ignore_errors=True)
+        self._manifest, self._manifest_mtime = None, None
+        self._gaps, self._gaps_mtime, self._local_gaps = {}, None, {}
+
+    async def rebuild(self, chunk_size: int = 50_000) -> dict:
+        """
+        Re-exports every snapshot from MongoDB and compacts it into a fresh dataset.
+        """
+        self.reset()
+        cursor = db.get_read_db()[settings.COLLECTION_DAILY_SNAPSHOTS].find({}, PROJECTION).batch_size(chunk_size)
+        chunk: List[dict] = []
+        async for snapshot in cursor:
+            chunk.append(snapshot)
+            if len(chunk) >= chunk_size:
+                await asyncio.to_thread(self.write_delta, chunk)
+                chunk = []
+        if chunk:
+            await asyncio.to_thread(self.write_delta, chunk)
+        return await asyncio.to_thread(self.compact)
+
+    # --- Reads ---
+
+    def read_sku(self, sku: str) -> Optional[Tuple[np.ndarray, np.ndarray, datetime]]:
+        """
+        Memory-mapped read of one SKU from its bucket file.
+
+        Returns:
+            (date_keys, units, newest generated_at) oldest first, or None if the
+            store has no rows for the SKU.
+        """
+        import pyarrow.parquet as pq
+
+        manifest = self.load_manifest()
+        if not manifest["version"]:
+            return None
+        try:
+            table = pq.read_table(
+                self._bucket_path(manifest["version"], self._bucket(sku)),
+                columns=["date_key", "total_units_sold", "generated_at"],
+                filters=[("product_sku", "=", sku)],
+                memory_map=True
+            )
+        except FileNotFoundError:
+            return None # Superseded by a concurrent compaction; caller falls back
+        if table.num_rows == 0:
+            return None
+
+        date_keys = table.column("date_key").to_numpy(zero_copy_only=False).astype("U10")
+        units = table.column("total_units_sold").to_numpy(zero_copy_only=False).astype(np.float64)
+        newest = table.column("generated_at").to_pandas().max().to_pydatetime()
+        return date_keys, units, newest
+
+    async def load_sku(self, sku: str) -> Optional[Tuple[np.ndarray, np.ndarray, datetime]]:
+        """
+        `read_sku`, but only if no snapshot of the SKU was written to MongoDB after
+        the newest row the store holds (checked with one indexed probe) and no
+        delta of the SKU failed (which a newer row would not reveal).
+        """
+        self.reads += 1
+        if sku in self.load_gaps():
+            self.gapped += 1
+            return None
+        result = await asyncio.to_thread(self.read_sku, sku)
+        if result is None:
+            self.misses += 1
+            return None
+
+        newer = await db.get_db()[settings.COLLECTION_DAILY_SNAPSHOTS].find_one(
+            {"product_sku": sku, "generated_at": {"$gt": result[2]}}, {"_id": 1}
+        )
+        if newer is not None:
+            self.stale += 1
+            return None
+        return result
+
+    def read_frame(self, skus: Optional[Iterable[str]] = None) -> "pd.DataFrame":
+        """
+        Snapshot rows as a DataFrame (e.g. for `InventoryPanelFeatureEngineer`),
+        optionally limited to some SKUs. Only the buckets holding them are opened.
+        """
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        manifest = self.load_manifest()
+        if not manifest["version"]:
+            return pd.DataFrame(columns=COLUMNS)
+
+        wanted = list(skus) if skus is not None else None
+        buckets = sorted({self._bucket(sku) for sku in wanted}) if wanted is not None else range(self.buckets)
+        filters = [("product_sku", "in", wanted)] if wanted is not None else None
+
+        tables = []
+        for bucket in buckets:
+            path = self._bucket_path(manifest["version"], bucket)
+            if os.path.exists(path):
+                tables.append(pq.read_table(path, filters=filters, memory_map=True))
+        if not tables:
+            return pd.DataFrame(columns=COLUMNS)
+        return pa.concat_tables(tables).to_pandas()
+
+    def stats(self) -> dict:
+        manifest = self.load_manifest() if self.enabled else {}
+        return {
+            "enabled": self.enabled,
+            "version": manifest.get("version"),
+            "watermark": manifest.get("watermark"),
+            "rows": manifest.get("rows"),
+            "pending_deltas": len(self._pending_deltas()) if self.enabled else 0,
+            "reads": self.reads,
+            "misses": self.misses,
+            "stale": self.stale,
+            "gaps": len(self.load_gaps()) if self.enabled else 0,
+            "gapped_reads": self.gapped,
+            "deltas_written": self.deltas_written,
+            "compactions": self.compactions
+        }
+
+def _heal(gaps: Dict[str, dict], exported: set, before: str, delta: str) -> None:
+    """
+    Gaps of the `exported` SKUs noticed before `before` are re-exported by
+    `delta` (their history was read after that).
+    """
+    for sku, gap in gaps.items():
+        if sku in exported and gap["since"] < before:
+            gap["healed_by"] = delta
+
+def _drop_healed(gaps: Dict[str, dict], folded_deltas: set) -> None:
+    for sku in [sku for sku, gap in gaps.items() if gap["healed_by"] in folded_deltas]:
+        del gaps[sku]
+
+history_store = HistoryStore(
+    root=settings.HISTORY_STORE_PATH,
+    buckets=settings.HISTORY_STORE_BUCKETS,
+    enabled=settings.HISTORY_STORE_ENABLED
+)
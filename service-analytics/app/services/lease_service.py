@@ -0,0 +1,61 @@
+# app/services/lease_service.py
+"""
+Time-limited leases in MongoDB, used to coordinate work between replicas.
+
+Expiry is computed with the server clock ($$NOW), so replicas with skewed
+clocks still agree on whether a lease has expired.
+"""
+from typing import List
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.core.db import db
+from app.core.config import settings
+
+def _leases():
+    return db.get_db()[settings.COLLECTION_LEASES]
+
+async def acquire_lease(name: str, owner: str, ttl_seconds: float, kind: str = "partition") -> bool:
+    """
+    Takes (or renews) the lease `name` for `owner` if it is free, expired or
+    already ours.
+
+    Returns:
+        True if `owner` holds the lease for the next `ttl_seconds`.
+    """
+    try:
+        lease = await _leases().find_one_and_update(
+            {
+                "_id": name,
+                "$expr": {"$or": [{"$eq": ["$owner", owner]}, {"$lt": ["$expires_at", "$$NOW"]}]}
+            },
+            [{"$set": {
+                "kind": kind,
+                "owner": owner,
+                "expires_at": {"$add": ["$$NOW", int(ttl_seconds * 1000)]}
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Held by someone else: the filter missed and the upsert collided with it
+        return False
+    return lease is not None and lease.get("owner") == owner
+
+async def release_lease(name: str, owner: str) -> None:
+    """
+    Expires our lease immediately so another replica can take it without waiting.
+    """
+    await _leases().update_one(
+        {"_id": name, "owner": owner},
+        [{"$set": {"expires_at": "$$NOW"}}]
+    )
+
+async def live_owners(kind: str) -> List[str]:
+    """
+    Owners of the unexpired leases of a kind (e.g. the replicas' heartbeats).
+    """
+    cursor = _leases().find(
+        {"kind": kind, "$expr": {"$gt": ["$expires_at", "$$NOW"]}},
+        {"owner": 1}
+    )
+    return sorted({lease["owner"] async for lease in cursor})
@@ -0,0 +1,54 @@
+# app/services/model_registry.py
+from datetime import datetime
+from typing import List, Optional
+from app.core.db import db
+from app.core.config import settings
+
+def compute_watermark(last_date_key: str, snapshot_count: int, last_generated_at: datetime) -> dict:
+    """
+    Identifies the exact snapshot data a model was trained on.
+
+    `last_generated_at` moves on every ETL write (including `$inc` into an
+    existing day), so comparing it is enough to detect new data.
+    """
+    return {
+        "last_date_key": last_date_key,
+        "snapshot_count": snapshot_count,
+        "last_generated_at": last_generated_at
+    }
+
+async def load_model(sku: str) -> Optional[dict]:
+    """
+    Returns the registry entry for a SKU if it was trained by the current model version.
+    """
+    entry = await db.get_db()[settings.COLLECTION_MODEL_REGISTRY].find_one({"_id": sku})
+    if not entry or entry.get("model_version") != settings.MODEL_VERSION:
+        return None
+    return entry
+
+async def watermark_moved(sku: str, entry: dict) -> bool:
+    """
+    Cheap probe: has any snapshot for this SKU been written since the model was trained?
+    """
+    newer = await db.get_db()[settings.COLLECTION_DAILY_SNAPSHOTS].find_one(
+        {"product_sku": sku, "generated_at": {"$gt": entry["watermark"]["last_generated_at"]}},
+        {"_id": 1}
+    )
+    return newer is not None
+
+async def save_model(sku: str, params: dict, watermark: dict, recent_history: List[float]) -> None:
+    """
+    Stores fitted coefficients plus everything needed to forecast without refetching.
+    """
+    await db.get_db()[settings.COLLECTION_MODEL_REGISTRY].update_one(
+        {"_id": sku},
+        {"$set": {
+            "product_sku": sku,
+            "model_version": settings.MODEL_VERSION,
+            **params,
+            "recent_history": recent_history,
+            "watermark": watermark,
+            "trained_at": datetime.utcnow()
+        }},
+        upsert=True
+    )
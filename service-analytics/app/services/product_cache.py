@@ -0,0 +1,172 @@
+# app/services/product_cache.py
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from bson import ObjectId
+from app.core.db import db
+from app.core.config import settings
+from app.utils.logger import logger
+
+class ProductCatalogCache:
+    """
+    Bounded in-process LRU cache of product_id -> SKU.
+
+    SKUs almost never change, so the ETL only needs to touch `products` for
+    IDs it has not seen yet. Entries are dropped by the products change stream
+    (see `watch_products`) whenever a product is updated, replaced or deleted.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.enabled = True
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # One set per in-flight MongoDB read (get_many misses, warm_up), collecting
+        # the IDs invalidated meanwhile so the read does not re-add stale SKUs
+        self._reads_in_flight: List[set] = []
+        # Bumped by clear()/enable(): reads started before it must not fill the cache
+        self._generation = 0
+
+    def _put(self, product_id: str, sku: str) -> None:
+        self._entries[product_id] = sku
+        self._entries.move_to_end(product_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, product_id) -> Optional[str]:
+        key = str(product_id)
+        sku = self._entries.get(key)
+        if sku is not None:
+            self._entries.move_to_end(key)
+        return sku
+
+    async def get_many(self, product_ids: Iterable) -> Dict[str, str]:
+        """
+        Resolves product IDs to SKUs, querying MongoDB (one `$in`) only for misses.
+
+        Returns:
+            Dict mapping str(product_id) -> sku. Unknown IDs are absent.
+        """
+        resolved: Dict[str, str] = {}
+        missing = set()
+
+        for product_id in product_ids:
+            if product_id is None:
+                continue
+            key = str(product_id)
+            if key in resolved or key in missing:
+                continue
+            sku = self.get(key) if self.enabled else None
+            if sku is not None:
+                self.hits += 1
+                resolved[key] = sku
+            else:
+                self.misses += 1
+                missing.add(key)
+
+        if missing:
+            cursor = db.get_db()[settings.COLLECTION_PRODUCTS].find(
+                {"_id": {"$in": [ObjectId(key) for key in missing]}},
+                {"sku": 1}
+            )
+            generation, invalidated = self._begin_read()
+            try:
+                async for product in cursor:
+                    key = str(product["_id"])
+                    sku = product.get("sku")
+                    if sku:
+                        if self._may_fill(key, generation, invalidated):
+                            self._put(key, sku)
+                        resolved[key] = sku
+            finally:
+                self._end_read(invalidated)
+
+        return resolved
+
+    def _begin_read(self) -> Tuple[int, set]:
+        invalidated = set()
+        self._reads_in_flight.append(invalidated)
+        return self._generation, invalidated
+
+    def _end_read(self, invalidated: set) -> None:
+        self._reads_in_flight.remove(invalidated)
+
+    def _may_fill(self, key: str, generation: int, invalidated: set) -> bool:
+        """
+        Whether a SKU read since `_begin_read` may be cached: not if the product
+        was invalidated, or the cache cleared, while the read was in flight.
+        """
+        return self.enabled and generation == self._generation and key not in invalidated
+
+    def invalidate(self, product_id) -> None:
+        key = str(product_id)
+        for invalidated in self._reads_in_flight:
+            invalidated.add(key)
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+    def disable(self) -> None:
+        """
+        Stops serving cached SKUs (used while invalidation cannot be guaranteed).
+        """
+        self.enabled = False
+        self.clear()
+
+    def enable(self) -> None:
+        """
+        Serves cached SKUs again once invalidations are flowing. Reads that
+        started while disabled may predate the stream, so they are not cached.
+        """
+        self._generation += 1
+        self.enabled = True
+
+    async def warm_up(self) -> int:
+        """
+        Pre-loads up to `max_size` products so the first orders after startup hit the cache.
+
+        Runs in the background while the ETL is already resolving SKUs; products
+        invalidated in the meantime are skipped, as their read may be stale.
+        """
+        cursor = db.get_db()[settings.COLLECTION_PRODUCTS].find(
+            {}, {"sku": 1}
+        ).limit(self.max_size)
+
+        loaded = 0
+        generation, invalidated = self._begin_read()
+        try:
+            async for product in cursor:
+                key = str(product["_id"])
+                sku = product.get("sku")
+                if sku and key not in self._entries and self._may_fill(key, generation, invalidated):
+                    self._put(key, sku)
+                    loaded += 1
+        except Exception as e:
+            # A cold cache is only slower, never wrong, so startup must not fail here
+            logger.warning(f"⚠️ Product cache warm-up failed: {e}")
+        finally:
+            self._end_read(invalidated)
+
+        logger.info(f"🔥 Product cache warmed with {loaded} SKUs")
+        return loaded
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+product_cache = ProductCatalogCache(max_size=settings.PRODUCT_CACHE_MAX_SIZE)
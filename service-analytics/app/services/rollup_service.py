@@ -0,0 +1,262 @@
+# app/services/rollup_service.py
+"""
+Weekly and monthly per-SKU rollups and a catalog-wide daily total.
+
+The ETL keeps them current with the same `$inc` upserts as the daily
+snapshots, derived from the merged snapshot increments of each batch, so
+dashboards read a handful of pre-aggregated rows instead of grouping the
+daily history. `repair_rollups` recomputes any date range from
+`raw_sales_events` with absolute values.
+
+Documents:
+    weekly:        _id "{YYYY-Www}_{sku}"  (ISO week, period_start = Monday)
+    monthly:       _id "{YYYY-MM}_{sku}"   (period_start = 1st of the month)
+    catalog daily: _id "{YYYY-MM-DD}"
+"""
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from pymongo import UpdateOne, ReplaceOne
+from app.core.db import db
+from app.core.config import settings
+from app.utils.logger import logger
+
+GRANULARITIES = ("weekly", "monthly", "catalog_daily")
+
+def _collection_name(granularity: str) -> str:
+    return {
+        "weekly": settings.COLLECTION_WEEKLY_ROLLUPS,
+        "monthly": settings.COLLECTION_MONTHLY_ROLLUPS,
+        "catalog_daily": settings.COLLECTION_CATALOG_DAILY_ROLLUPS
+    }[granularity]
+
+def week_period(day: date) -> Tuple[str, date]:
+    """
+    ISO week key ("2024-W05") and its Monday.
+    """
+    year, week, weekday = day.isocalendar()
+    return f"{year}-W{week:02d}", day - timedelta(days=weekday - 1)
+
+def month_period(day: date) -> Tuple[str, date]:
+    return day.strftime("%Y-%m"), day.replace(day=1)
+
+def rollup_increments(snapshots: Iterable[dict]) -> Dict[str, Dict[str, dict]]:
+    """
+    Merges daily snapshot increments into rollup increments, keyed by
+    granularity, then by rollup `_id`.
+    """
+    increments: Dict[str, Dict[str, dict]] = {granularity: {} for granularity in GRANULARITIES}
+
+    for snapshot in snapshots:
+        sku = snapshot["product_sku"]
+        day = datetime.strptime(snapshot["date_key"], "%Y-%m-%d").date()
+
+        targets = []
+        for granularity, (period, period_start) in (("weekly", week_period(day)), ("monthly", month_period(day))):
+            targets.append((granularity, f"{period}_{sku}", {
+                "period": period,
+                "period_start": period_start.isoformat(),
+                "product_sku": sku
+            }))
+        targets.append(("catalog_daily", snapshot["date_key"], {
+            "period": snapshot["date_key"],
+            "period_start": snapshot["date_key"]
+        }))
+
+        for granularity, rollup_id, keys in targets:
+            rollup = increments[granularity].setdefault(rollup_id, {**keys, "total_units_sold": 0, "total_revenue": 0})
+            rollup["total_units_sold"] += snapshot["total_units_sold"]
+            rollup["total_revenue"] += snapshot.get("total_revenue", 0)
+
+    return increments
+
+def _rollup_update(rollup_id: str, rollup: dict, generated_at: datetime, operator: str) -> UpdateOne:
+    return UpdateOne(
+        {"_id": rollup_id},
+        {
+            "$set": {
+                **{key: rollup[key] for key in ("period", "period_start", "product_sku") if key in rollup},
+                "aggregation_version": "v1.0",
+                "generated_at": generated_at
+            },
+            operator: {
+                "total_units_sold": rollup["total_units_sold"],
+                "total_revenue": rollup["total_revenue"]
+            }
+        },
+        upsert=True
+    )
+
+async def _write_rollups(rollups_by_granularity: Dict[str, Dict[str, dict]], operator: str) -> None:
+    """
+    One unordered `bulk_write` per rollup collection, issued concurrently.
+    """
+    generated_at = datetime.utcnow()
+    db_instance = db.get_db()
+    await asyncio.gather(*(
+        db_instance[_collection_name(granularity)].bulk_write(
+            [_rollup_update(rollup_id, rollup, generated_at, operator) for rollup_id, rollup in rollups.items()],
+            ordered=False
+        )
+        for granularity, rollups in rollups_by_granularity.items() if rollups
+    ))
+
+async def apply_rollups(snapshots: Iterable[dict]) -> None:
+    """
+    Adds a batch of snapshot increments to every rollup.
+    """
+    await _write_rollups(rollup_increments(snapshots), "$inc")
+
+async def refresh_rollups(snapshots: Iterable[dict]) -> None:
+    """
+    Replay-safe counterpart of `apply_rollups` (used by the backfill).
+
+    Recomputes every rollup the given snapshots fall into from the stored
+    daily snapshots and raises it to that total with `$max`. While a rebuild
+    only adds data, totals only grow, so concurrent refreshes of the same
+    period converge on the complete one and a replay changes nothing.
+    """
+    touched = rollup_increments(snapshots)
+    days = sorted({rollup["period"] for rollup in touched["catalog_daily"].values()})
+    if not days:
+        return
+    skus = sorted({rollup["product_sku"] for rollup in touched["weekly"].values()})
+
+    # Every week and month touched lies within [first, last]
+    first_day = datetime.strptime(days[0], "%Y-%m-%d").date()
+    last_day = datetime.strptime(days[-1], "%Y-%m-%d").date()
+    first = min(week_period(first_day)[1], month_period(first_day)[1])
+    last = max(week_period(last_day)[1] + timedelta(days=6), (last_day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1))
+
+    projection = {"_id": 0, "product_sku": 1, "date_key": 1, "total_units_sold": 1, "total_revenue": 1}
+    snapshots_collection = db.get_db()[settings.COLLECTION_DAILY_SNAPSHOTS]
+    per_sku = await snapshots_collection.find(
+        {"product_sku": {"$in": skus}, "date_key": {"$gte": first.isoformat(), "$lte": last.isoformat()}}, projection
+    ).to_list(length=None)
+    catalog = await snapshots_collection.find({"date_key": {"$in": days}}, projection).to_list(length=None)
+
+    totals = rollup_increments(per_sku)
+    totals["catalog_daily"] = rollup_increments(catalog)["catalog_daily"]
+    await _write_rollups(
+        {granularity: {rollup_id: totals[granularity][rollup_id] for rollup_id in rollups if rollup_id in totals[granularity]} for granularity, rollups in touched.items()},
+        "$max"
+    )
+
+async def query_rollups(granularity: str, sku: Optional[str], start: Optional[str], end: Optional[str]) -> List[dict]:
+    """
+    Rollup rows whose period starts within [start, end], oldest first.
+    """
+    query = {}
+    if granularity != "catalog_daily":
+        query["product_sku"] = sku
+    if start or end:
+        query["period_start"] = {}
+        if start:
+            query["period_start"]["$gte"] = start
+        if end:
+            query["period_start"]["$lte"] = end
+
+    cursor = db.get_read_db()[_collection_name(granularity)].find(
+        query, {"_id": 0, "period": 1, "period_start": 1, "total_units_sold": 1, "total_revenue": 1}
+    ).sort("period_start", 1).batch_size(settings.MONGO_READ_BATCH_SIZE)
+    return [row async for row in cursor]
+
+def _periods(granularity: str, start: date, end: date) -> List[Tuple[str, date, date]]:
+    """
+    (period key, first day, day after the last) of every period touching [start, end].
+    """
+    periods = []
+    if granularity == "weekly":
+        period, day = week_period(start)
+        while day <= end:
+            periods.append((period, day, day + timedelta(days=7)))
+            day += timedelta(days=7)
+            period = week_period(day)[0]
+    elif granularity == "monthly":
+        day = start.replace(day=1)
+        while day <= end:
+            following = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+            periods.append((day.strftime("%Y-%m"), day, following))
+            day = following
+    else:
+        day = start
+        while day <= end:
+            periods.append((day.isoformat(), day, day + timedelta(days=1)))
+            day += timedelta(days=1)
+    return periods
+
+# Server-side period key of a raw event, formatted like week_period / month_period
+PERIOD_FORMATS = {"weekly": "%G-W%V", "monthly": "%Y-%m", "catalog_daily": "%Y-%m-%d"}
+
+async def _repair_periods(granularity: str, periods: List[Tuple[str, date, date]]) -> int:
+    """
+    Recomputes consecutive periods from raw events (absolute values, not
+    increments) and removes rollups of SKUs that have no events left in them.
+
+    One aggregation scans the whole range on the `timestamp` index and groups
+    by the computed period key (and SKU), instead of one query per period.
+    """
+    if not periods:
+        return 0
+    db_instance = db.get_db()
+    collection = db_instance[_collection_name(granularity)]
+    repaired_at = datetime.utcnow()
+    period_starts = {period: first_day for period, first_day, _ in periods}
+
+    group_key = {"period": {"$dateToString": {"format": PERIOD_FORMATS[granularity], "date": "$timestamp"}}}
+    if granularity != "catalog_daily":
+        group_key["sku"] = "$product_sku"
+
+    cursor = db_instance[settings.COLLECTION_RAW_EVENTS].aggregate([
+        {"$match": {"timestamp": {
+            "$gte": datetime.combine(periods[0][1], datetime.min.time()),
+            "$lt": datetime.combine(periods[-1][2], datetime.min.time())
+        }}},
+        {"$group": {
+            "_id": group_key,
+            "total_units_sold": {"$sum": "$quantity"},
+            "total_revenue": {"$sum": {"$multiply": ["$quantity", "$unit_price"]}}
+        }}
+    ], allowDiskUse=True)
+
+    replaced = 0
+    batch = []
+    async for row in cursor:
+        period = row["_id"]["period"]
+        rollup = {
+            "period": period,
+            "period_start": period_starts[period].isoformat(),
+            "total_units_sold": row["total_units_sold"],
+            "total_revenue": row["total_revenue"],
+            "aggregation_version": "v1.0",
+            "generated_at": repaired_at
+        }
+        rollup_id = period
+        if "sku" in group_key:
+            rollup["product_sku"] = row["_id"]["sku"]
+            rollup_id = f"{period}_{row['_id']['sku']}"
+        batch.append(ReplaceOne({"_id": rollup_id}, rollup, upsert=True))
+        if len(batch) >= settings.BACKFILL_CHUNK_SIZE:
+            await collection.bulk_write(batch, ordered=False)
+            replaced += len(batch)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        replaced += len(batch)
+
+    # Rows not rewritten above have no raw events in their period anymore
+    await collection.delete_many({"period": {"$in": list(period_starts)}, "generated_at": {"$lt": repaired_at}})
+    return replaced
+
+async def repair_rollups(start: date, end: date, granularities: Iterable[str] = GRANULARITIES) -> Dict[str, int]:
+    """
+    Rebuilds every rollup period touching [start, end] from `raw_sales_events`.
+
+    Returns:
+        Rows written per granularity.
+    """
+    written = {}
+    for granularity in granularities:
+        written[granularity] = await _repair_periods(granularity, _periods(granularity, start, end))
+        logger.info(f"🔧 Repaired {granularity} rollups {start} → {end} ({written[granularity]} rows)")
+    return written
@@ -0,0 +1,290 @@
+# app/services/training_stats_service.py
+"""
+Per-SKU OLS sufficient statistics (XᵀX, Xᵀy, Σy, Σy², n) maintained by the ETL.
+
+Invariant: a SKU's statistics cover the feature rows of its closed days within
+the training window, i.e. every snapshot row except its most recent day, which
+is still "open" (orders keep `$inc`-ing it). When the ETL first writes a newer
+day for a SKU, the previous days are closed: their feature rows are added to
+the statistics, and rows that slid out of FORECAST_TRAINING_WINDOW are
+subtracted. Training adds the open day's row (`training_statistics`), so it
+solves exactly the rows a full refit of the window would fit, in constant time.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from pymongo.errors import DuplicateKeyError
+from app.core.db import db
+from app.core.config import settings
+from app.utils.logger import logger
+from app.core.executor import compute_executor
+from app.ml.regression_model import DemandLinearRegression, feature_vector, merge_statistics, subtract_statistics, sufficient_statistics
+from app.ml.calendar import get_calendar
+
+# sku -> newest date_key this process has already closed the days before
+_closed_through: Dict[str, str] = {}
+
+
+SNAPSHOT_PROJECTION = {"_id": 0, "date_key": 1, "total_units_sold": 1}
+
+def _empty_statistics() -> dict:
+    return sufficient_statistics(np.empty((0, 7)), np.empty(0))
+
+def _max_closed_rows() -> Optional[int]:
+    """
+    Closed-day rows kept in the statistics: a full refit of the newest
+    FORECAST_TRAINING_WINDOW snapshots fits window - 14 rows (the first 14
+    only seed the lags), one of which is the open day. None = whole history.
+    """
+    window = settings.FORECAST_TRAINING_WINDOW
+    return max(window - 15, 0) if window else None
+
+def _feature_rows(tail: List[float], snapshots: List[dict]) -> Tuple[List[np.ndarray], List[float], List[float]]:
+    """
+    Feature rows and targets of consecutive snapshots following `tail`.
+
+    Returns:
+        (rows, targets, updated tail); days without 14 preceding values get no row.
+    """
+    rows, targets = [], []
+    for snapshot in snapshots:
+        value = float(snapshot["total_units_sold"])
+        if len(tail) >= 14:
+            day = datetime.strptime(snapshot["date_key"], "%Y-%m-%d")
+            rows.append(feature_vector(tail, day, get_calendar()))
+            targets.append(value)
+        tail = (tail + [value])[-14:]
+    return rows, targets, tail
+
+def statistics_from_history(date_keys: np.ndarray, units: np.ndarray) -> dict:
+    """
+    Sufficient statistics of a full history (CPU-bound, runs in the compute executor).
+    """
+    import pandas as pd
+    from app.services.feature_engineering import InventoryFeatureEngineer
+
+    df = pd.DataFrame({"date_key": date_keys, "total_units_sold": units})
+    X = InventoryFeatureEngineer(df, target_col='total_units_sold', date_col='date_key').transform()
+    return sufficient_statistics(
+        X[DemandLinearRegression().feature_order].to_numpy(),
+        X['total_units_sold'].to_numpy()
+    )
+
+def _to_document(stats: dict) -> dict:
+    return {
+        "xtx": np.asarray(stats["xtx"]).tolist(),
+        "xty": np.asarray(stats["xty"]).tolist(),
+        "sum_y": float(stats["sum_y"]),
+        "sum_y2": float(stats["sum_y2"]),
+        "n": int(stats["n"])
+    }
+
+async def note_snapshot_days(snapshots: Iterable[dict]) -> None:
+    """
+    ETL hook: called with the snapshot increments just written.
+
+    Closes earlier days the first time a SKU gets a newer day, and flags the
+    statistics for a rebuild when a day that was already closed changes.
+    """
+    newest: Dict[str, str] = {}
+    oldest: Dict[str, str] = {}
+    for snapshot in snapshots:
+        sku, date_key = snapshot["product_sku"], snapshot["date_key"]
+        newest[sku] = max(newest.get(sku, date_key), date_key)
+        oldest[sku] = min(oldest.get(sku, date_key), date_key)
+
+    for sku, date_key in newest.items():
+        closed_through = _closed_through.get(sku)
+        if closed_through is not None and oldest[sku] < closed_through:
+            await mark_stale(sku)
+        if closed_through is None or date_key > closed_through:
+            await close_days(sku, date_key)
+            _closed_through[sku] = date_key
+
+async def mark_stale(sku: str) -> None:
+    """
+    A closed day received late data: the next training rebuilds from snapshots.
+    """
+    await db.get_db()[settings.COLLECTION_TRAINING_STATS].update_one(
+        {"_id": sku}, {"$set": {"stale": True}}
+    )
+
+async def close_days(sku: str, open_date_key: str) -> None:
+    """
+    Adds every not-yet-closed day before `open_date_key` to the SKU's statistics
+    and removes the rows that fell out of the training window.
+    Uses optimistic concurrency (`version`) so concurrent closers never double count.
+    """
+    db_instance = db.get_db()
+    doc = await db_instance[settings.COLLECTION_TRAINING_STATS].find_one({"_id": sku})
+    if doc is None or doc.get("stale"):
+        # Nothing to extend: the training path rebuilds from snapshots on demand
+        return
+    if doc.get("window") != settings.FORECAST_TRAINING_WINDOW:
+        # Built for another window (or before windowing): rebuild
+        await mark_stale(sku)
+        return
+
+    last_closed = doc.get("last_closed_date")
+    if last_closed and open_date_key <= last_closed:
+        await mark_stale(sku)
+        return
+
+    date_filter = {"$lt": open_date_key}
+    if last_closed:
+        date_filter["$gt"] = last_closed
+    cursor = db_instance[settings.COLLECTION_DAILY_SNAPSHOTS].find(
+        {"product_sku": sku, "date_key": date_filter}, SNAPSHOT_PROJECTION
+    ).sort("date_key", 1)
+    closing = await cursor.to_list(length=None)
+    if not closing:
+        return
+
+    tail = list(doc.get("tail", []))
+    stats = {key: doc[key] for key in ("xtx", "xty", "sum_y", "sum_y2", "n")}
+    first_row_date = doc.get("first_row_date")
+    if first_row_date is None and len(tail) + len(closing) > 14:
+        first_row_date = closing[max(14 - len(tail), 0)]["date_key"]
+
+    rows, targets, tail = _feature_rows(tail, closing)
+    if rows:
+        stats = merge_statistics(stats, sufficient_statistics(np.array(rows), np.array(targets)))
+
+    max_rows = _max_closed_rows()
+    if max_rows is not None and stats["n"] > max_rows:
+        evicted = await _evict_rows(sku, stats, first_row_date, stats["n"] - max_rows)
+        if evicted is None:
+            await mark_stale(sku)
+            return
+        stats, first_row_date = evicted
+
+    result = await db_instance[settings.COLLECTION_TRAINING_STATS].update_one(
+        {"_id": sku, "version": doc.get("version", 0), "stale": {"$ne": True}},
+        {"$set": {
+            **_to_document(stats),
+            "tail": tail,
+            "last_closed_date": closing[-1]["date_key"],
+            "first_row_date": first_row_date,
+            "updated_at": datetime.utcnow()
+        }, "$inc": {"version": 1}}
+    )
+    if result.modified_count == 0:
+        logger.info(f"Training stats for {sku} changed concurrently; close skipped")
+
+async def _evict_rows(sku: str, stats: dict, first_row_date: str, count: int) -> Optional[Tuple[dict, Optional[str]]]:
+    """
+    Subtracts the rows of the `count` oldest days in the statistics (from
+    `first_row_date` on), re-deriving them from the snapshots.
+
+    Returns:
+        (statistics, new first_row_date), or None if the snapshots no longer
+        match the statistics (the caller marks them for a rebuild).
+    """
+    collection = db.get_db()[settings.COLLECTION_DAILY_SNAPSHOTS]
+    before = await collection.find(
+        {"product_sku": sku, "date_key": {"$lt": first_row_date}}, SNAPSHOT_PROJECTION
+    ).sort("date_key", -1).limit(14).to_list(length=14)
+    leaving = await collection.find(
+        {"product_sku": sku, "date_key": {"$gte": first_row_date}}, SNAPSHOT_PROJECTION
+    ).sort("date_key", 1).limit(count + 1).to_list(length=count + 1)
+    if len(before) < 14 or len(leaving) < count:
+        return None
+
+    tail = [float(snapshot["total_units_sold"]) for snapshot in reversed(before)]
+    rows, targets, _ = _feature_rows(tail, leaving[:count])
+    stats = subtract_statistics(stats, sufficient_statistics(np.array(rows), np.array(targets)))
+    return stats, leaving[count]["date_key"] if len(leaving) > count else None
+
+async def rebuild_statistics(sku: str) -> Optional[dict]:
+    """
+    Recomputes a SKU's statistics from its snapshots in the training window
+    (O(window), used once per SKU and after late data). The newest day stays open.
+    """
+    db_instance = db.get_db()
+    window = settings.FORECAST_TRAINING_WINDOW
+    cursor = db_instance[settings.COLLECTION_DAILY_SNAPSHOTS].find(
+        {"product_sku": sku}, SNAPSHOT_PROJECTION
+    ).sort("date_key", -1)
+    if window:
+        cursor = cursor.limit(window)
+    snapshots = await cursor.to_list(length=None)
+    snapshots.reverse()
+    closed = snapshots[:-1]
+
+    stats = _empty_statistics()
+    if len(closed) > 14:
+        # Same feature pipeline as a full refit, run on the compute executor
+        stats = await compute_executor.run(
+            statistics_from_history,
+            np.array([s["date_key"] for s in closed]),
+            np.array([s["total_units_sold"] for s in closed], dtype=np.float64)
+        )
+
+    doc = {
+        **_to_document(stats),
+        "tail": [float(s["total_units_sold"]) for s in closed[-14:]],
+        "last_closed_date": closed[-1]["date_key"] if closed else None,
+        "first_row_date": closed[14]["date_key"] if len(closed) > 14 else None,
+        "window": window,
+        "stale": False,
+        "updated_at": datetime.utcnow()
+    }
+    try:
+        await db_instance[settings.COLLECTION_TRAINING_STATS].update_one(
+            {"_id": sku},
+            {"$set": doc, "$inc": {"version": 1}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass # Concurrent first-time rebuild; either result is equivalent
+    logger.info(f"Rebuilt training stats for {sku} ({doc['n']} rows)")
+
+    if snapshots:
+        _closed_through[sku] = snapshots[-1]["date_key"]
+    return doc
+
+async def load_statistics(sku: str) -> Optional[dict]:
+    """
+    Returns up-to-date statistics for training, rebuilding them when missing or stale.
+    """
+    doc = await db.get_db()[settings.COLLECTION_TRAINING_STATS].find_one({"_id": sku})
+    if doc is None or doc.get("stale") or doc.get("window") != settings.FORECAST_TRAINING_WINDOW:
+        doc = await rebuild_statistics(sku)
+    return doc
+
+async def training_statistics(sku: str) -> Optional[Tuple[dict, List[dict]]]:
+    """
+    Statistics of exactly the rows a full refit of the training window fits
+    (the closed days plus the open one), and the newest 14 snapshots that seed
+    the recursive forecast.
+
+    Returns:
+        (statistics, recent snapshots oldest first), or None without snapshots.
+    """
+    recent = await fetch_recent_history(sku, days=15)
+    if not recent:
+        return None
+    doc = await load_statistics(sku)
+
+    newest_closed = recent[-2]["date_key"] if len(recent) > 1 else None
+    if doc.get("last_closed_date") != newest_closed:
+        # A close was skipped (concurrent writer) or the stream is behind: catch up
+        doc = await rebuild_statistics(sku)
+
+    stats = {key: doc[key] for key in ("xtx", "xty", "sum_y", "sum_y2", "n")}
+    rows, targets, _ = _feature_rows(list(doc.get("tail", [])), recent[-1:])
+    if rows:
+        stats = merge_statistics(stats, sufficient_statistics(np.array(rows), np.array(targets)))
+    return stats, recent[-14:]
+
+async def fetch_recent_history(sku: str, days: int = 14) -> List[dict]:
+    """
+    The newest `days` snapshots (oldest first) to seed the recursive forecast.
+    """
+    cursor = db.get_db()[settings.COLLECTION_DAILY_SNAPSHOTS].find(
+        {"product_sku": sku},
+        {"_id": 0, "date_key": 1, "total_units_sold": 1}
+    ).sort("date_key", -1).limit(days)
+    recent = await cursor.to_list(length=days)
+    recent.reverse()
+    return recent
@@ -0,0 +1,229 @@
+# app/utils/metrics.py
+"""
+Minimal in-process metrics, exposed in the Prometheus text format on /metrics.
+
+Hand-rolled instead of a client library and kept cheap enough for the hot
+paths: an update is a dict lookup plus an addition (histograms add a bisect
+over ~15 bucket bounds). There are no locks because every update happens on
+the event loop; work inside the compute executor is timed there and reported
+back with its result.
+"""
+import bisect
+import math
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+from app.core.config import settings
+
+# Seconds; covers a cached lookup (~1ms) up to a slow full refit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Seconds; change stream lag has 1s resolution (clusterTime)
+LAG_BUCKETS = (1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+# A callback returns one value, or {label values: value} for labelled metrics
+MetricCallback = Callable[[], Union[float, Dict[Tuple[str, ...], float]]]
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str] = (), fn: Optional[MetricCallback] = None):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        # Unlabelled metrics report 0 before their first update
+        self.values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0.0}
+
+    def set_function(self, fn: Optional[MetricCallback]) -> None:
+        """
+        Reads the value(s) from `fn` at scrape time instead of from updates.
+        """
+        self.fn = fn
+
+    def samples(self) -> List[str]:
+        values = self.values
+        if self.fn is not None:
+            current = self.fn()
+            values = current if isinstance(current, dict) else {(): current}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values.items()
+        ]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if self.registry.enabled:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        if self.registry.enabled:
+            self.values[labels] = value
+
+class RateGauge(_Metric):
+    """
+    Events per second over a sliding window of `window` one-second slots.
+    """
+    kind = "gauge"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, window: int = 60):
+        super().__init__(registry, name, help, fn=self.rate)
+        self.window = window
+        self._seconds = [0] * window
+        self._counts = [0] * window
+
+    def mark(self, count: int = 1) -> None:
+        if not self.registry.enabled:
+            return
+        second = int(time.monotonic())
+        slot = second % self.window
+        if self._seconds[slot] != second:
+            self._seconds[slot] = second
+            self._counts[slot] = 0
+        self._counts[slot] += count
+
+    def rate(self) -> float:
+        now = int(time.monotonic())
+        total = sum(count for second, count in zip(self._seconds, self._counts) if now - second < self.window)
+        return total / self.window
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: "Histogram", labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf)..., sum, count]
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 3)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def time(self, *labels: str) -> _Timer:
+        """
+        Context manager that observes the duration of its block in seconds.
+        """
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{label_text} {int(series[-1])}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Owns every metric of the process and renders them for a scrape.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = (), fn: Optional[MetricCallback] = None) -> Counter:
+        return self._register(Counter(self, name, help, labelnames, fn))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (), fn: Optional[MetricCallback] = None) -> Gauge:
+        return self._register(Gauge(self, name, help, labelnames, fn))
+
+    def rate(self, name: str, help: str, window: int = 60) -> RateGauge:
+        return self._register(RateGauge(self, name, help, window))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry(enabled=settings.METRICS_ENABLED)
+
+# --- ETL ---
+ETL_STAGE_SECONDS = metrics.histogram(
+    "analytics_etl_stage_seconds", "Duration of each ETL stage per call", ["stage"]
+)
+ETL_ORDERS = metrics.counter("analytics_etl_orders_total", "Orders processed by the ETL")
+ETL_QUEUE_DEPTH = metrics.gauge(
+    "analytics_etl_queue_depth", "Order events waiting in the ETL worker queues", fn=lambda: 0
+)
+
+# --- Change stream ---
+CHANGE_STREAM_LAG_SECONDS = metrics.histogram(
+    "analytics_change_stream_lag_seconds", "Wall clock minus the event's clusterTime when it is received", buckets=LAG_BUCKETS
+)
+CHANGE_STREAM_LAST_LAG_SECONDS = metrics.gauge(
+    "analytics_change_stream_last_lag_seconds", "Lag of the most recently received order event"
+)
+CHANGE_STREAM_BUFFERED = metrics.gauge(
+    "analytics_change_stream_buffered_events", "Order events received but not flushed to the ETL yet"
+)
+CHANGE_STREAM_EVENTS = metrics.counter(
+    "analytics_change_stream_events_total", "Order events processed and checkpointed"
+)
+CHANGE_STREAM_EVENTS_RATE = metrics.rate(
+    "analytics_change_stream_events_per_second", "Order events processed per second (last 60s)"
+)
+
+# --- Forecasting ---
+FORECAST_PHASE_SECONDS = metrics.histogram(
+    "analytics_forecast_phase_seconds", "Duration of each generate_forecast_for_sku phase", ["path", "phase"]
+)
+FORECASTS_GENERATED = metrics.counter(
+    "analytics_forecasts_generated_total", "Forecasts generated, by pipeline path", ["path"]
+)
@@ -0,0 +1,169 @@
+# app/utils/profiler.py
+"""
+On-demand sampling profiler for individual API requests.
+
+While a request is profiled, a daemon thread samples the event loop thread's
+Python stack every PROFILE_INTERVAL_MS. CPU-bound work sent to the compute
+executor is sampled inside the worker the same way and merged under a
+`compute_executor` root frame. Profiles are stored as collapsed stacks
+("frame;frame;frame count" per line), which speedscope, flamegraph.pl and
+inferno render as a flamegraph.
+
+The event loop is shared, so event-loop samples also include whatever other
+requests were running at the same time; worker samples belong to the request.
+"""
+import asyncio
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+def collapse_stack(frame) -> str:
+    """
+    Root-first "name (file:line);..." string for a frame and its callers.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename.rsplit("/", 1)[-1]
+        names.append(f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":"))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class StackSampler:
+    """
+    Samples one thread's stack from a background thread until stopped.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+    def stop(self) -> Dict[str, int]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return dict(self.stacks)
+
+def sampled_call(interval: float, fn: Callable[..., Any], *args: Any) -> Tuple[Any, Dict[str, int]]:
+    """
+    Runs fn(*args) while sampling the calling thread (used inside executor workers).
+
+    Returns:
+        (fn's result, collapsed stacks)
+    """
+    sampler = StackSampler(threading.get_ident(), interval)
+    sampler.start()
+    try:
+        result = fn(*args)
+    finally:
+        stacks = sampler.stop()
+    return result, stacks
+
+class RequestProfile:
+    """
+    One profiled request: metadata plus merged collapsed stacks.
+    """
+
+    def __init__(self, endpoint: str, trigger: str, interval: float, **details: Any):
+        self.id = uuid.uuid4().hex[:12]
+        self.endpoint = endpoint
+        self.trigger = trigger
+        self.interval = interval
+        self.details = details
+        self.created_at = datetime.utcnow()
+        self.duration_ms: Optional[float] = None
+        self.stacks: Counter = Counter()
+
+    def add_stacks(self, stacks: Dict[str, int], root: Optional[str] = None) -> None:
+        for stack, count in stacks.items():
+            self.stacks[f"{root};{stack}" if root else stack] += count
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "endpoint": self.endpoint,
+            "trigger": self.trigger,
+            "created_at": self.created_at,
+            "duration_ms": self.duration_ms,
+            "samples": sum(self.stacks.values()),
+            "interval_ms": self.interval * 1000,
+            **self.details
+        }
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class ProfileStore:
+    """
+    The most recent `max_profiles` profiles of this process, newest first.
+    """
+
+    def __init__(self, max_profiles: int):
+        self._profiles: Deque[RequestProfile] = deque(maxlen=max_profiles)
+        self.captured = 0
+
+    def add(self, profile: RequestProfile) -> None:
+        self._profiles.appendleft(profile)
+        self.captured += 1
+
+    def list(self) -> List[dict]:
+        return [profile.summary() for profile in self._profiles]
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        return next((profile for profile in self._profiles if profile.id == profile_id), None)
+
+    def stats(self) -> dict:
+        return {
+            "stored": len(self._profiles),
+            "max_profiles": self._profiles.maxlen,
+            "captured": self.captured
+        }
+
+profile_store = ProfileStore(max_profiles=settings.PROFILE_MAX_STORED)
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+def current_profile() -> Optional[RequestProfile]:
+    """
+    The profile of the request being handled, if it is profiled.
+    """
+    return _current_profile.get()
+
+@asynccontextmanager
+async def profile_request(endpoint: str, trigger: str, **details: Any) -> AsyncIterator[RequestProfile]:
+    """
+    Samples the event loop for the duration of the block and stores the profile.
+    """
+    profile = RequestProfile(endpoint, trigger, settings.PROFILE_INTERVAL_MS / 1000.0, **details)
+    token = _current_profile.set(profile)
+    sampler = StackSampler(threading.get_ident(), profile.interval)
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        yield profile
+    finally:
+        # Joining the sampler takes at most one interval
+        profile.add_stacks(await asyncio.to_thread(sampler.stop), root="event_loop")
+        profile.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        _current_profile.reset(token)
+        profile_store.add(profile)
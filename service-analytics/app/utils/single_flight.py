@@ -0,0 +1,52 @@
+# app/utils/single_flight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one shared computation.
+
+    The first caller for a key starts the work; callers arriving while it is in
+    flight await the same result (or exception). The work is shielded, so a
+    caller that is cancelled (e.g. a client disconnect) does not cancel it for
+    the others.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.shared = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """
+        Returns the in-flight future for `key`, starting `fn()` if there is none.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.shared += 1
+            return flight
+
+        flight = asyncio.ensure_future(fn())
+        self._flights[key] = flight
+        self.started += 1
+        flight.add_done_callback(lambda done: self._finish(key, done))
+        return flight
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        return await asyncio.shield(self.start(key, fn))
+
+    def _finish(self, key: Hashable, flight: asyncio.Future) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            flight.exception() # Mark retrieved; callers still receive it via await
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "shared": self.shared
+        }
@@ -0,0 +1,213 @@
+# app/workers/backfill.py
+"""
+Historical backfill: rebuilds `raw_sales_events`, `daily_sales_snapshots` and the sales rollups
+from the existing `orders` collection.
+
+Usage:
+    python -m app.workers.backfill --workers 8 --partitions 64 --reset
+
+The `orders` `_id` range is split into partitions that are processed by a pool
+of concurrent workers with the same bulk ETL transform as the change stream.
+Progress is checkpointed per partition, so re-running the same command after
+an interruption only processes what is left. Chunks are applied replay-safe
+(snapshots and rollups are recomputed, not incremented), so the chunk that was
+being written when the run stopped is simply applied again.
+"""
+import argparse
+import asyncio
+import re
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+from bson import ObjectId
+from app.core.db import db
+from app.core.config import settings
+from app.utils.logger import logger
+from app.services.etl_service import process_orders_bulk
+from app.services.checkpoint_service import load_checkpoint, save_checkpoint
+from app.services.history_store import history_store
+
+class BackfillProgress:
+    """
+    Shared counters for the progress reporter.
+    """
+
+    def __init__(self, total_partitions: int):
+        self.total_partitions = total_partitions
+        self.partitions_done = 0
+        self.orders = 0
+        self.started_at = time.monotonic()
+
+    def report(self) -> None:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        logger.info(
+            f"📊 Backfill: {self.partitions_done}/{self.total_partitions} partitions, "
+            f"{self.orders} orders, {self.orders / elapsed:.0f} orders/s"
+        )
+
+def _plan_key(run_id: str) -> str:
+    return f"backfill:{run_id}"
+
+def _partition_key(run_id: str, index: int) -> str:
+    return f"backfill:{run_id}:p{index}"
+
+async def _plan_partitions(run_id: str, partitions: int) -> Optional[List[ObjectId]]:
+    """
+    Splits the orders `_id` range into `partitions` ranges by ObjectId timestamp.
+
+    The plan is stored with the run so a resumed run uses identical boundaries.
+
+    Returns:
+        partitions + 1 boundaries; partition i covers [bounds[i], bounds[i + 1]).
+        The last partition also includes the upper bound.
+    """
+    plan = await load_checkpoint(_plan_key(run_id))
+    if plan:
+        logger.info(f"⏩ Resuming backfill run '{run_id}' ({len(plan['bounds']) - 1} partitions)")
+        return plan["bounds"]
+
+    orders = db.get_db()[settings.COLLECTION_ORDERS]
+    first = await orders.find_one({}, {"_id": 1}, sort=[("_id", 1)])
+    last = await orders.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    if not first:
+        return None
+
+    start = first["_id"].generation_time.timestamp()
+    end = last["_id"].generation_time.timestamp()
+    step = (end - start) / partitions
+
+    bounds = [first["_id"]]
+    for i in range(1, partitions):
+        bound = ObjectId.from_datetime(datetime.fromtimestamp(start + step * i, tz=timezone.utc))
+        if bounds[-1] < bound < last["_id"]:
+            bounds.append(bound)
+    if len(bounds) == 1 or last["_id"] > bounds[-1]:
+        bounds.append(last["_id"])
+
+    await save_checkpoint(_plan_key(run_id), bounds=bounds)
+    return bounds
+
+async def _run_partition(run_id: str, index: int, lower: ObjectId, upper: ObjectId, is_last: bool, chunk_size: int, progress: BackfillProgress) -> None:
+    """
+    Streams one `_id` range through the bulk ETL, checkpointing after every chunk.
+    """
+    key = _partition_key(run_id, index)
+    checkpoint = await load_checkpoint(key) or {}
+    if checkpoint.get("done"):
+        progress.partitions_done += 1
+        return
+
+    last_id = checkpoint.get("last_id")
+    id_filter = {"$gt": last_id} if last_id else {"$gte": lower}
+    id_filter["$lte" if is_last else "$lt"] = upper
+
+    cursor = db.get_db()[settings.COLLECTION_ORDERS].find(
+        {"_id": id_filter},
+        {"order_id": 1, "items": 1, "createdAt": 1}
+    ).sort("_id", 1).batch_size(chunk_size)
+
+    processed = checkpoint.get("orders", 0)
+    chunk: List[dict] = []
+
+    async def flush() -> None:
+        nonlocal processed
+        await process_orders_bulk(chunk, replay_safe=True)
+        processed += len(chunk)
+        progress.orders += len(chunk)
+        await save_checkpoint(key, last_id=chunk[-1]["_id"], orders=processed)
+        chunk.clear()
+
+    async for order in cursor:
+        chunk.append(order)
+        if len(chunk) >= chunk_size:
+            await flush()
+
+    if chunk:
+        await flush()
+
+    await save_checkpoint(key, done=True, orders=processed)
+    progress.partitions_done += 1
+
+async def run_backfill(workers: int, partitions: int, chunk_size: int, run_id: str, reset: bool, progress_interval: float) -> None:
+    """
+    Rebuilds the data lake and snapshots from `orders` with a pool of concurrent workers.
+    """
+    if db.client is None:
+        db.connect()
+    db_instance = db.get_db()
+
+    if reset:
+        # Start from empty targets: totals are only ever raised, so stale values would survive
+        logger.warning("🧹 Reset requested: clearing raw events, snapshots, rollups, training stats and backfill checkpoints")
+        await db_instance[settings.COLLECTION_RAW_EVENTS].delete_many({})
+        await db_instance[settings.COLLECTION_DAILY_SNAPSHOTS].delete_many({})
+        await db_instance[settings.COLLECTION_TRAINING_STATS].delete_many({})
+        for name in (settings.COLLECTION_WEEKLY_ROLLUPS, settings.COLLECTION_MONTHLY_ROLLUPS, settings.COLLECTION_CATALOG_DAILY_ROLLUPS):
+            await db_instance[name].delete_many({})
+        if history_store.enabled:
+            history_store.reset()
+        await db_instance[settings.COLLECTION_CHECKPOINTS].delete_many(
+            {"_id": {"$regex": f"^{re.escape(_plan_key(run_id))}(:|$)"}}
+        )
+
+    bounds = await _plan_partitions(run_id, partitions)
+    if not bounds:
+        logger.info("Nothing to backfill: the orders collection is empty")
+        return
+
+    total = len(bounds) - 1
+    progress = BackfillProgress(total)
+    queue: asyncio.Queue = asyncio.Queue()
+    for index in range(total):
+        queue.put_nowait(index)
+
+    async def worker() -> None:
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await _run_partition(
+                run_id, index, bounds[index], bounds[index + 1],
+                index == total - 1, chunk_size, progress
+            )
+
+    async def reporter() -> None:
+        while True:
+            await asyncio.sleep(progress_interval)
+            progress.report()
+
+    logger.info(f"🚚 Backfill '{run_id}' started: {total} partitions, {workers} workers")
+    reporter_task = asyncio.create_task(reporter())
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(workers, total))))
+    finally:
+        reporter_task.cancel()
+        progress.report()
+
+    logger.info(f"✅ Backfill '{run_id}' complete")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild raw sales events and daily snapshots from orders.")
+    parser.add_argument("--workers", type=int, default=settings.BACKFILL_WORKERS, help="Concurrent partition workers")
+    parser.add_argument("--partitions", type=int, default=None, help="Number of _id range partitions (default: workers x 4)")
+    parser.add_argument("--chunk-size", type=int, default=settings.BACKFILL_CHUNK_SIZE, help="Orders per bulk write")
+    parser.add_argument("--run-id", default="default", help="Checkpoint namespace; reuse it to resume")
+    parser.add_argument("--reset", action="store_true", help="Clear targets and checkpoints before rebuilding")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress reports")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run_backfill(
+            workers=args.workers,
+            partitions=args.partitions or args.workers * 4,
+            chunk_size=args.chunk_size,
+            run_id=args.run_id,
+            reset=args.reset,
+            progress_interval=args.progress_interval
+        ))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,42 @@
 import asyncio
+import time
+from typing import Callable, List, Optional, Set
+from pymongo.errors import OperationFailure, PyMongoError
 from app.core.db import db
 from app.core.config import settings
 from app.utils.logger import logger
-from app.services.etl_service import process_new_order 
+from app.services.etl_service import process_new_order, process_orders_bulk
+from app.services.checkpoint_service import load_checkpoint, advance_checkpoint, clear_checkpoint
+from app.services.product_cache import product_cache
+from app.workers.etl_worker_pool import EtlBatchError, EtlWorkerPool, partition_order
+from app.workers.partition_coordinator import partition_coordinator
+from app.utils.metrics import (
+    CHANGE_STREAM_LAG_SECONDS, CHANGE_STREAM_LAST_LAG_SECONDS, CHANGE_STREAM_BUFFERED,
+    CHANGE_STREAM_EVENTS, CHANGE_STREAM_EVENTS_RATE, ETL_QUEUE_DEPTH
+)
+
+# Server error code for a resume token that is no longer in the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+class LeaseLostError(Exception):
+    """Raised when a partition consumer can no longer trust its lease."""
+
+# ETL worker pools of the partitions this replica consumes
+_pools: Set[EtlWorkerPool] = set()
+ETL_QUEUE_DEPTH.set_function(lambda: sum(pool.queue_depth() for pool in _pools))
 
 async def watch_orders():
     """
     Continously watches the 'orders' collection for new inserts.
+
+    Events are micro-batched (ETL_BATCH_SIZE / ETL_BATCH_MAX_LATENCY_MS) and the
+    resume token is checkpointed after every committed batch, so a restart
+    continues where the last batch ended instead of at "now". Each batch is
+    fanned out to a pool of ETL workers partitioned by ETL_PARTITION_KEY.
+
+    With ETL_COORDINATION_ENABLED, the stream is split into ETL_PARTITIONS
+    disjoint slices (hash of order_id) and this replica only consumes the
+    slices it holds a lease on, each with its own resume token.
     """
     logger.info(f"👀 Change Stream Listener started. Watching: {settings.COLLECTION_ORDERS}")
     
@@ -16,27 +46,297 @@ async def watch_orders():
 
     collection = db.get_db()[settings.COLLECTION_ORDERS]
 
+    if not settings.ETL_COORDINATION_ENABLED:
+        await _consume_partition(collection, 0, 1)
+        return
+
+    await partition_coordinator.run(
+        lambda partition, owns: _consume_partition(collection, partition, settings.ETL_PARTITIONS, owns)
+    )
+
+def checkpoint_name(partition: int, partitions: int) -> str:
+    """
+    Resume token checkpoint of a partition (the unpartitioned name for a single one).
+    """
+    if partitions == 1:
+        return settings.ETL_CHECKPOINT_NAME
+    return f"{settings.ETL_CHECKPOINT_NAME}:{partition}/{partitions}"
+
+def partition_pipeline(partition: int, partitions: int) -> List[dict]:
+    """
+    Change stream pipeline for one slice of the order inserts.
+    Hashing order_id server-side needs `$toHashedIndexKey` (MongoDB 7.0+).
+    """
+    match = {"operationType": "insert"}
+    if partitions > 1:
+        match["$expr"] = {"$eq": [
+            {"$abs": {"$mod": [{"$toHashedIndexKey": "$fullDocument.order_id"}, partitions]}},
+            partition
+        ]}
+    return [{"$match": match}]
+
+async def _consume_partition(collection, partition: int, partitions: int, owns: Optional[Callable[[], bool]] = None):
+    """
+    Consumes one partition of the stream with its own ETL worker pool.
+    """
+    # Concurrent SKU-partitioned ETL (a single worker keeps the serial behaviour)
+    pool = None
+    if settings.ETL_WORKER_CONCURRENCY > 1:
+        pool = EtlWorkerPool(
+            handler=_run_etl,
+            concurrency=settings.ETL_WORKER_CONCURRENCY,
+            queue_size=settings.ETL_WORKER_QUEUE_SIZE,
+            max_batch=settings.ETL_BATCH_SIZE
+        )
+        pool.start()
+        _pools.add(pool)
+
     try:
-        # Watch the collection for changes
-        # pipeline=[{'$match': ...}] filters only for 'insert' operations
-        pipeline = [{"$match": {"operationType": "insert"}}]
-        
-        async with collection.watch(pipeline) as stream:
-            async for change in stream:
-                order_data = change["fullDocument"]
-                order_id = order_data.get("order_id", "UNKNOWN")
-                
-                logger.info(f"⚡ Event Detected: New Order {order_id}")
-
-                # --- THIS IS THE MISSING PIECE ---
-                await process_new_order(order_data)
-                # --------------------------------
-                
-                # TODO: In Phase 2, we will call 'process_new_order(order_data)' here
-                # await etl_service.process_new_order(order_data)
+        await _watch_orders_with_retry(collection, pool, partition, partitions, owns)
+    finally:
+        if pool:
+            await pool.drain(timeout=settings.ETL_DRAIN_TIMEOUT_SECONDS)
+            _pools.discard(pool)
+
+async def _watch_orders_with_retry(collection, pool: Optional[EtlWorkerPool], partition: int = 0, partitions: int = 1, owns: Optional[Callable[[], bool]] = None):
+    retry_delay = 1.0
+    name = checkpoint_name(partition, partitions)
+    # A partition without a token of its own starts from the unpartitioned one
+    # (e.g. right after ETL_PARTITIONS was raised from 1)
+    fallback = settings.ETL_CHECKPOINT_NAME if partitions > 1 else None
+    pipeline = partition_pipeline(partition, partitions)
+
+    while True:
+        try:
+            await _consume_order_stream(collection, name, pool, pipeline, fallback, owns)
+            retry_delay = 1.0
+        except asyncio.CancelledError:
+            logger.warning("Change Stream stopped manually.")
+            return
+        except LeaseLostError:
+            logger.warning(f"⚠️ Lease on partition {partition} expired; stopping its consumer")
+            return
+        except OperationFailure as e:
+            if e.code == CHANGE_STREAM_HISTORY_LOST:
+                # The checkpointed token fell off the oplog: nothing left to resume from.
+                logger.error("❌ Resume token expired (oplog rolled over). Restarting from 'now'; run the backfill to repair the gap.")
+                await clear_checkpoint(name)
+                fallback = None
+                continue
+            logger.error(f"❌ Change Stream Error: {e}")
+        except Exception as e:
+            logger.error(f"❌ Change Stream Error: {e}")
+
+        # Reconnect with exponential backoff; the checkpoint makes this lossless
+        logger.info(f"🔁 Reconnecting change stream in {retry_delay:.0f}s")
+        try:
+            await asyncio.sleep(retry_delay)
+        except asyncio.CancelledError:
+            logger.warning("Change Stream stopped manually.")
+            return
+        retry_delay = min(retry_delay * 2, settings.ETL_RETRY_MAX_DELAY_SECONDS)
+
+async def _consume_order_stream(collection, checkpoint_name: str, pool: Optional[EtlWorkerPool] = None, pipeline: Optional[List[dict]] = None, fallback_checkpoint: Optional[str] = None, owns: Optional[Callable[[], bool]] = None):
+    """
+    Reads one change stream session, flushing a batch whenever it reaches
+    ETL_BATCH_SIZE events or its oldest event is ETL_BATCH_MAX_LATENCY_MS old.
+
+    Raises:
+        LeaseLostError: `owns()` turned False; nothing more is processed or checkpointed.
+    """
+    checkpoint = await load_checkpoint(checkpoint_name)
+    if checkpoint is None and fallback_checkpoint:
+        checkpoint = await load_checkpoint(fallback_checkpoint)
+    resume_token = checkpoint.get("resume_token") if checkpoint else None
+    if resume_token:
+        logger.info(f"⏩ Resuming change stream from checkpoint '{checkpoint_name}'")
+
+    loop = asyncio.get_event_loop()
+    max_latency = settings.ETL_BATCH_MAX_LATENCY_MS / 1000.0
+    batch: List[dict] = []
+    batch_started = 0.0
+    last_token = None
+    flush = None
+
+    # pipeline=[{'$match': ...}] filters only for 'insert' operations (of this partition)
+    pipeline = pipeline or partition_pipeline(0, 1)
+
+    async with collection.watch(
+        pipeline,
+        resume_after=resume_token,
+        max_await_time_ms=settings.ETL_BATCH_MAX_LATENCY_MS
+    ) as stream:
+        try:
+            while stream.alive:
+                # Returns None once the server has nothing new within max_await_time_ms
+                change = await stream.try_next()
 
-    except asyncio.CancelledError:
-        logger.warning("Change Stream stopped manually.")
+                if change is not None:
+                    if not batch:
+                        batch_started = loop.time()
+                    batch.append(change["fullDocument"])
+                    last_token = change["_id"]
+                    _observe_lag(change)
+                    CHANGE_STREAM_BUFFERED.set(len(batch))
+
+                if batch and (
+                    change is None
+                    or len(batch) >= settings.ETL_BATCH_SIZE
+                    or loop.time() - batch_started >= max_latency
+                ):
+                    if owns is not None and not owns():
+                        raise LeaseLostError(checkpoint_name)
+                    # Shielded so a shutdown mid-flush lets the batch finish and checkpoint
+                    flush = asyncio.ensure_future(_flush_batch(batch, last_token, checkpoint_name, pool, owns))
+                    batch = []
+                    CHANGE_STREAM_BUFFERED.set(0)
+                    await asyncio.shield(flush)
+        except asyncio.CancelledError:
+            # Commit whatever is in flight or buffered so the next start does not replay it
+            # (bounded: a flush retrying through an outage is abandoned and replayed)
+            try:
+                if flush is not None and not flush.done():
+                    await asyncio.wait_for(flush, settings.ETL_DRAIN_TIMEOUT_SECONDS)
+                # ...unless the partition has moved on to another replica, which replays it
+                if batch and (owns is None or owns()):
+                    await asyncio.wait_for(
+                        _flush_batch(batch, last_token, checkpoint_name, pool, owns),
+                        settings.ETL_DRAIN_TIMEOUT_SECONDS
+                    )
+            except asyncio.TimeoutError:
+                logger.warning("⚠️ Final flush timed out; the uncommitted batch replays on the next start")
+            raise
+
+def _observe_lag(change: dict) -> None:
+    """
+    Records wall clock minus the event's clusterTime (a BSON Timestamp with
+    one-second resolution, so small lags read as 0-1s).
+    """
+    cluster_time = change.get("clusterTime")
+    if cluster_time is None:
+        return
+    # Clamped: a replica's clock may be slightly ahead of ours
+    lag = max(0.0, time.time() - cluster_time.time)
+    CHANGE_STREAM_LAG_SECONDS.observe(lag)
+    CHANGE_STREAM_LAST_LAG_SECONDS.set(lag)
+
+async def _flush_batch(orders: List[dict], resume_token: dict, checkpoint_name: str, pool: Optional[EtlWorkerPool] = None, owns: Optional[Callable[[], bool]] = None):
+    """
+    Runs the ETL for a batch of orders, then persists the resume token.
+
+    With a worker pool the batch is fanned out by partition key and the token
+    is only saved once every partition has finished its share. Parts that fail
+    are retried on their own (with backoff): replaying the whole batch from the
+    checkpoint would `$inc` the parts other workers already committed again.
+
+    Raises:
+        LeaseLostError: `owns()` turned False while retrying or before the
+            checkpoint, or another consumer already checkpointed past the batch;
+            the token is not saved and the new owner replays the batch.
+    """
+    logger.info(f"⚡ Flushing batch of {len(orders)} order events")
+
+    if pool is None:
+        await _run_etl(orders)
+    else:
+        pending = [
+            (key, part)
+            for order_data in orders
+            for key, part in partition_order(order_data, settings.ETL_PARTITION_KEY)
+        ]
+        retry_delay = 1.0
+        while pending:
+            for key, part in pending:
+                await pool.submit(key, part)
+            try:
+                await pool.join()
+                pending = []
+            except EtlBatchError as e:
+                pending = e.unprocessed
+                logger.error(f"❌ {e}; retrying them in {retry_delay:.0f}s")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, settings.ETL_RETRY_MAX_DELAY_SECONDS)
+                if owns is not None and not owns():
+                    raise LeaseLostError(checkpoint_name)
+
+    # Fenced: a consumer that lost its lease mid-flush leaves the checkpoint to
+    # the new owner, which replays the batch (idempotently, see process_orders_bulk)
+    if owns is not None and not owns():
+        raise LeaseLostError(checkpoint_name)
+    if not await advance_checkpoint(checkpoint_name, resume_token):
+        if owns is not None:
+            raise LeaseLostError(checkpoint_name)
+        logger.warning(f"⚠️ Checkpoint '{checkpoint_name}' is already past this batch; left unchanged")
+    CHANGE_STREAM_EVENTS.inc(amount=len(orders))
+    CHANGE_STREAM_EVENTS_RATE.mark(len(orders))
+
+async def _run_etl(orders: List[dict]):
+    """
+    Applies the ETL to a list of orders (bulk path, or per order when disabled).
+    """
+    try:
+        if settings.ETL_BULK_WRITES:
+            await process_orders_bulk(orders)
+        else:
+            for order_data in orders:
+                await process_new_order(order_data)
+    except PyMongoError:
+        # Infrastructure failure: let the stream reconnect and replay from the last checkpoint
+        # (replays are idempotent, see process_orders_bulk)
+        raise
     except Exception as e:
-        logger.error(f"❌ Change Stream Error: {e}")
-        # In production, we would add retry logic here (backoff strategy)
\ No newline at end of file
+        # Data failure: isolate the offending order(s) instead of blocking the stream forever.
+        # Orders the batch already wrote are recognised by their raw events and not counted again.
+        logger.error(f"❌ Batch ETL failed ({e}); retrying orders individually")
+        for order_data in orders:
+            try:
+                await process_new_order(order_data)
+            except PyMongoError:
+                raise
+            except Exception as order_error:
+                logger.error(f"❌ Skipping Order {order_data.get('order_id', 'UNKNOWN')}: {order_error}")
+
+async def watch_products():
+    """
+    Watches the 'products' collection and invalidates the product catalog cache
+    whenever a product is updated, replaced or deleted. While the stream is
+    down the cache is disabled; it reconnects with backoff and re-enables it.
+    """
+    logger.info(f"👀 Product Cache Invalidator started. Watching: {settings.COLLECTION_PRODUCTS}")
+
+    if db.client is None:
+        db.connect()
+
+    collection = db.get_db()[settings.COLLECTION_PRODUCTS]
+    # Inserts never invalidate (the cache only holds IDs it has already resolved)
+    pipeline = [{"$match": {"operationType": {"$in": ["update", "replace", "delete"]}}}]
+    retry_delay = 1.0
+
+    while True:
+        try:
+            async with collection.watch(pipeline) as stream:
+                if not product_cache.enabled:
+                    # Changes missed while disconnected were dropped with the cache
+                    product_cache.enable()
+                    logger.info("✅ Product Change Stream reconnected -> cache re-enabled")
+                retry_delay = 1.0
+                async for change in stream:
+                    product_id = change["documentKey"]["_id"]
+                    product_cache.invalidate(product_id)
+                    logger.info(f"♻️ Product {product_id} changed -> cache entry invalidated")
+
+        except asyncio.CancelledError:
+            logger.warning("Product Change Stream stopped manually.")
+            return
+        except Exception as e:
+            logger.error(f"❌ Product Change Stream Error: {e}")
+            # No invalidations arrive until the stream is back, so stop trusting the cache
+            product_cache.disable()
+
+        logger.info(f"🔁 Reconnecting product change stream in {retry_delay:.0f}s")
+        try:
+            await asyncio.sleep(retry_delay)
+        except asyncio.CancelledError:
+            logger.warning("Product Change Stream stopped manually.")
+            return
+        retry_delay = min(retry_delay * 2, settings.ETL_RETRY_MAX_DELAY_SECONDS)
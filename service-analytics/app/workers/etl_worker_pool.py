@@ -0,0 +1,138 @@
+# app/workers/etl_worker_pool.py
+import asyncio
+import zlib
+from typing import Awaitable, Callable, Iterator, List, Optional, Set, Tuple
+from app.utils.logger import logger
+
+class EtlBatchError(Exception):
+    """
+    Raised by `EtlWorkerPool.join` when a handler failed.
+
+    `unprocessed` holds the (key, order) pairs that were not applied: the failed
+    sub-batch and whatever its worker had queued behind it, in submission order.
+    Everything else was committed and must not be submitted again.
+    """
+
+    def __init__(self, error: BaseException, unprocessed: List[Tuple[str, dict]]):
+        super().__init__(f"{len(unprocessed)} order parts not applied: {error}")
+        self.error = error
+        self.unprocessed = unprocessed
+
+def partition_order(order_data: dict, partition_key: str) -> Iterator[Tuple[str, dict]]:
+    """
+    Splits an order into (key, order) pairs for hash partitioning.
+
+    - "sku": one sub-order per product. The product_id is used as the key because
+      it maps 1:1 to a SKU and is known before the SKU lookup.
+    - "order_id": the whole order under its order_id.
+    """
+    if partition_key != "sku":
+        yield str(order_data.get("order_id")), order_data
+        return
+
+    items_by_product = {}
+    for item in order_data.get("items", []):
+        items_by_product.setdefault(str(item.get("product_id")), []).append(item)
+
+    for product_id, items in items_by_product.items():
+        yield product_id, {**order_data, "items": items}
+
+class EtlWorkerPool:
+    """
+    Bounded pool of asyncio ETL workers with hash-partitioned queues.
+
+    Every key always lands on the same worker, so events for one SKU (or order)
+    are applied in arrival order while different keys run concurrently.
+    Queues are bounded: `submit` blocks when a worker falls behind, which pushes
+    back on the change stream instead of buffering without limit.
+
+    When a handler fails, only its worker stops applying (so a key's later
+    events never overtake the failed ones) and `join` reports what it skipped.
+    """
+
+    def __init__(self, handler: Callable[[List[dict]], Awaitable[None]], concurrency: int, queue_size: int, max_batch: int):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_batch = max_batch
+        self._queues = [asyncio.Queue(maxsize=queue_size) for _ in range(concurrency)]
+        self._workers: List[asyncio.Task] = []
+        self._error: Optional[BaseException] = None
+        self._failed_workers: Set[int] = set()
+        self._unprocessed: List[Tuple[str, dict]] = []
+
+    def start(self) -> None:
+        self._workers = [
+            asyncio.create_task(self._worker(index)) for index in range(self.concurrency)
+        ]
+        logger.info(f"🧵 ETL worker pool started ({self.concurrency} workers)")
+
+    def _queue_for(self, key: str) -> asyncio.Queue:
+        # crc32 is stable across processes, unlike the salted built-in hash()
+        return self._queues[zlib.crc32(key.encode()) % self.concurrency]
+
+    async def submit(self, key: str, order_data: dict) -> None:
+        """
+        Enqueues an order for its key's worker (waits while that queue is full).
+        """
+        await self._queue_for(key).put((key, order_data))
+
+    async def join(self) -> None:
+        """
+        Waits until everything submitted so far has been processed.
+
+        Raises:
+            EtlBatchError: a handler failed since the last join; it carries the
+                parts that were not applied, so the caller retries only those and
+                does not commit a checkpoint past them.
+        """
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+        if self._error is not None:
+            error = EtlBatchError(self._error, self._unprocessed)
+            self._error = None
+            self._failed_workers = set()
+            self._unprocessed = []
+            raise error
+
+    def queue_depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    async def _worker(self, index: int) -> None:
+        queue = self._queues[index]
+        while True:
+            batch = [await queue.get()]
+            # Drain whatever else is already waiting so it shares one bulk write
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            try:
+                if index in self._failed_workers:
+                    # Skipped until join() hands them back, to keep per-key order
+                    self._unprocessed.extend(batch)
+                else:
+                    await self.handler([order_data for _, order_data in batch])
+            except Exception as e:
+                self._failed_workers.add(index)
+                self._unprocessed.extend(batch)
+                if self._error is None:
+                    self._error = e
+                logger.error(f"❌ ETL worker {index} failed: {e}")
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def drain(self, timeout: float) -> None:
+        """
+        Gracefully stops the pool: finish queued work (up to `timeout`), then cancel workers.
+        """
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ ETL pool drain timed out with {self.queue_depth()} events queued")
+        finally:
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            logger.info("✅ ETL worker pool drained")
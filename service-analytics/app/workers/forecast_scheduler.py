@@ -0,0 +1,184 @@
+# app/workers/forecast_scheduler.py
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+from app.core.db import db
+from app.core.config import settings
+from app.core.executor import compute_executor, ComputeQueueFullError
+from app.utils.logger import logger
+from app.services.forecasting_service import generate_forecast_for_sku, regenerations
+from app.services.checkpoint_service import claim_checkpoint, load_checkpoint, save_checkpoint
+from app.utils.metrics import metrics
+
+SWEEP_CHECKPOINT = "forecast_sweep"
+
+class ForecastScheduler:
+    """
+    Precomputes forecasts in the background so the API serves stored documents.
+
+    The ETL marks SKUs dirty (with the units it just added, used as their
+    sales velocity). The scheduler regenerates dirty SKUs in batches, hottest
+    first, with bounded concurrency. It only submits work while the compute
+    executor is below its share of the queue, so API requests keep priority.
+    Once a day a sweep marks the whole catalog dirty, which also covers SKUs
+    nobody has requested yet; replicas claim it through a compare-and-set on
+    its checkpoint, so exactly one of them runs it.
+    """
+
+    def __init__(self, interval: float, batch_size: int, concurrency: int, executor_share: float, horizon: int, sweep_hour: int, sweep_velocity_days: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.executor_share = executor_share
+        self.horizon = horizon
+        self.sweep_hour = sweep_hour
+        self.sweep_velocity_days = sweep_velocity_days
+        self._dirty: Dict[str, float] = {}
+        self.regenerated = 0
+        self.skipped = 0
+        self.failed = 0
+        self.sweeps = 0
+
+    def mark_dirty(self, snapshots: Iterable[dict]) -> None:
+        """
+        ETL hook: SKUs with new snapshot data, weighted by the units just added.
+        """
+        for snapshot in snapshots:
+            sku = snapshot["product_sku"]
+            self._dirty[sku] = self._dirty.get(sku, 0.0) + float(snapshot.get("total_units_sold") or 0)
+
+    def _next_batch(self) -> List[Tuple[str, float]]:
+        hottest = heapq.nlargest(self.batch_size, self._dirty.items(), key=lambda item: item[1])
+        for sku, _ in hottest:
+            del self._dirty[sku]
+        return hottest
+
+    async def _wait_for_capacity(self) -> None:
+        limit = max(1, int(compute_executor.max_pending * self.executor_share))
+        while compute_executor.stats()["pending"] >= limit:
+            await asyncio.sleep(0.1)
+
+    async def _regenerate(self, sku: str, velocity: float, semaphore: asyncio.Semaphore) -> None:
+        async with semaphore:
+            await self._wait_for_capacity()
+            try:
+                forecast_doc = await regenerations.run(
+                    (sku, self.horizon),
+                    lambda: generate_forecast_for_sku(sku, horizon=self.horizon)
+                )
+            except (ComputeQueueFullError, asyncio.TimeoutError):
+                # Capacity problem, not a data problem: try again in a later batch
+                self._dirty[sku] = max(self._dirty.get(sku, 0.0), velocity)
+                return
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"❌ Scheduled forecast for {sku} failed: {e}")
+                return
+
+            if forecast_doc:
+                self.regenerated += 1
+            else:
+                self.skipped += 1 # Not enough history yet
+
+    async def _sweep_if_due(self) -> None:
+        if self.sweep_hour < 0:
+            return
+        now = datetime.utcnow()
+        today = now.strftime("%Y-%m-%d")
+        if now.hour < self.sweep_hour:
+            return
+        # Persisted so a restart does not trigger a second sweep the same day
+        checkpoint = await load_checkpoint(SWEEP_CHECKPOINT)
+        if checkpoint and checkpoint.get("date_key") == today:
+            return
+        # Another replica may be past the check above: only the claim's winner sweeps
+        if not await claim_checkpoint(SWEEP_CHECKPOINT, "date_key", today, status="running"):
+            return
+
+        try:
+            skus = await self._queue_catalog(now)
+        except Exception:
+            # Release today's claim so the next cycle (on any replica) retries
+            await save_checkpoint(SWEEP_CHECKPOINT, date_key=None, status="failed")
+            raise
+
+        await save_checkpoint(SWEEP_CHECKPOINT, date_key=today, skus=skus, status="done")
+        self.sweeps += 1
+        logger.info(f"🌙 Nightly forecast sweep queued {skus} SKUs")
+
+    async def _queue_catalog(self, now: datetime) -> int:
+        """
+        Marks every SKU with snapshots dirty, weighted by its recent sales velocity.
+        """
+        cutoff = (now - timedelta(days=self.sweep_velocity_days)).strftime("%Y-%m-%d")
+        cursor = db.get_read_db()[settings.COLLECTION_DAILY_SNAPSHOTS].aggregate([
+            {"$group": {
+                "_id": "$product_sku",
+                "velocity": {"$sum": {"$cond": [{"$gte": ["$date_key", cutoff]}, "$total_units_sold", 0]}}
+            }}
+        ], allowDiskUse=True, batchSize=settings.MONGO_READ_BATCH_SIZE)
+
+        skus = 0
+        async for row in cursor:
+            self._dirty[row["_id"]] = max(self._dirty.get(row["_id"], 0.0), float(row["velocity"]))
+            skus += 1
+        return skus
+
+    async def run(self) -> None:
+        logger.info(f"🗓️ Forecast scheduler started ({self.concurrency} workers, horizon {self.horizon}d)")
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        while True:
+            idle = True
+            try:
+                await self._sweep_if_due()
+
+                batch = self._next_batch()
+                if batch:
+                    await asyncio.gather(*(
+                        self._regenerate(sku, velocity, semaphore) for sku, velocity in batch
+                    ))
+                    logger.info(f"🗓️ Precomputed forecasts for {len(batch)} SKUs ({len(self._dirty)} still dirty)")
+                idle = not self._dirty
+            except asyncio.CancelledError:
+                logger.info("✅ Forecast scheduler stopped")
+                raise
+            except Exception as e:
+                logger.error(f"❌ Forecast scheduler cycle failed: {e}")
+
+            # Keep going while there is a backlog; poll when idle or after an error
+            if idle:
+                await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "dirty": len(self._dirty),
+            "regenerated": self.regenerated,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "sweeps": self.sweeps
+        }
+
+forecast_scheduler = ForecastScheduler(
+    interval=settings.FORECAST_SCHEDULER_INTERVAL_SECONDS,
+    batch_size=settings.FORECAST_SCHEDULER_BATCH_SIZE,
+    concurrency=settings.FORECAST_SCHEDULER_CONCURRENCY,
+    executor_share=settings.FORECAST_SCHEDULER_EXECUTOR_SHARE,
+    horizon=settings.FORECAST_SCHEDULER_HORIZON,
+    sweep_hour=settings.FORECAST_SWEEP_HOUR_UTC,
+    sweep_velocity_days=settings.FORECAST_SWEEP_VELOCITY_DAYS
+)
+
+metrics.gauge(
+    "analytics_forecast_scheduler_dirty_skus", "SKUs waiting for the scheduler to regenerate their forecast",
+    fn=lambda: forecast_scheduler.stats()["dirty"]
+)
+metrics.counter(
+    "analytics_forecast_scheduler_regenerations_total", "Scheduler regenerations by outcome", ["outcome"],
+    fn=lambda: {
+        ("regenerated",): forecast_scheduler.regenerated,
+        ("skipped",): forecast_scheduler.skipped,
+        ("failed",): forecast_scheduler.failed
+    }
+)
@@ -0,0 +1,44 @@
+# app/workers/history_compaction.py
+"""
+Maintenance for the local columnar history store (HISTORY_STORE_ENABLED).
+
+Usage:
+    python -m app.workers.history_compaction            # fold pending ETL deltas
+    python -m app.workers.history_compaction --rebuild  # re-export everything from MongoDB
+
+The service already compacts in the background; this is for the initial load,
+after a backfill, or when the store is suspected to be out of sync.
+"""
+import argparse
+import asyncio
+from app.core.db import db
+from app.utils.logger import logger
+from app.services.history_store import history_store
+
+async def run(rebuild: bool) -> None:
+    if not history_store.enabled:
+        logger.error("History store is disabled (set HISTORY_STORE_ENABLED=true and install pyarrow)")
+        return
+
+    if rebuild:
+        if db.client is None:
+            db.connect()
+        logger.info("🚚 Rebuilding history store from MongoDB")
+        manifest = await history_store.rebuild()
+    else:
+        manifest = await asyncio.to_thread(history_store.compact)
+
+    logger.info(f"✅ History store at v{manifest['version']} ({manifest['rows']} rows, watermark {manifest['watermark']})")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compact or rebuild the local columnar history store.")
+    parser.add_argument("--rebuild", action="store_true", help="Drop the store and re-export all snapshots from MongoDB")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args.rebuild))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
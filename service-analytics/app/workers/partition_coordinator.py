@@ -0,0 +1,156 @@
+# app/workers/partition_coordinator.py
+import asyncio
+import math
+import os
+import socket
+from typing import Awaitable, Callable, Dict, Optional
+from pymongo.errors import PyMongoError
+from app.core.config import settings
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.services.lease_service import acquire_lease, release_lease, live_owners
+
+# consume(partition, owns) runs one partition's consumer until cancelled;
+# owns() turns False as soon as the lease can no longer be trusted
+PartitionConsumer = Callable[[int, Callable[[], bool]], Awaitable[None]]
+
+class PartitionCoordinator:
+    """
+    Spreads the partitions of the order stream over the live replicas.
+
+    Every replica heartbeats a lease of its own and, every `renew_interval`:
+    1. Renews the partition leases it holds (a lost lease stops its consumer).
+    2. Releases partitions above its fair share (ceil(partitions / replicas)),
+       so a replica that just joined can pick them up.
+    3. Acquires free or expired partitions up to its fair share, so the
+       partitions of a dead replica fail over once its leases expire.
+
+    A consumer only trusts its lease until `ttl` after the last successful
+    renewal started, which is never later than the expiry stored in MongoDB.
+    """
+
+    def __init__(self, replica_id: str, partitions: int, ttl: float, renew_interval: float):
+        self.replica_id = replica_id
+        self.partitions = partitions
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self._deadlines: Dict[int, float] = {}  # partition -> loop time until which the lease is trusted
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._consume: Optional[PartitionConsumer] = None
+        self.replicas = 0
+        self.acquired = 0
+        self.lost = 0
+        self.released = 0
+
+    def lease_name(self, partition: int) -> str:
+        return f"orders_stream:{partition}/{self.partitions}"
+
+    def owns(self, partition: int) -> bool:
+        deadline = self._deadlines.get(partition)
+        return deadline is not None and asyncio.get_running_loop().time() < deadline
+
+    async def run(self, consume: PartitionConsumer) -> None:
+        """
+        Coordinates until cancelled, then stops the consumers and releases the leases.
+        """
+        self._consume = consume
+        logger.info(f"🤝 Partition coordinator started (replica {self.replica_id}, {self.partitions} partitions)")
+        try:
+            while True:
+                try:
+                    await self._rebalance()
+                except PyMongoError as e:
+                    # Leases lapse on their own if this keeps failing (owns() turns False)
+                    logger.error(f"❌ Lease renewal failed: {e}")
+                await asyncio.sleep(self.renew_interval)
+        finally:
+            for partition in list(self._tasks):
+                await self._stop(partition)
+            await asyncio.gather(
+                *(release_lease(self.lease_name(p), self.replica_id) for p in list(self._deadlines)),
+                release_lease(f"replica:{self.replica_id}", self.replica_id),
+                return_exceptions=True
+            )
+            self._deadlines.clear()
+
+    async def _rebalance(self) -> None:
+        loop = asyncio.get_running_loop()
+        await acquire_lease(f"replica:{self.replica_id}", self.replica_id, self.ttl, kind="replica")
+
+        # 1. Renew what we hold
+        for partition in list(self._deadlines):
+            started = loop.time()
+            if await acquire_lease(self.lease_name(partition), self.replica_id, self.ttl):
+                self._deadlines[partition] = started + self.ttl
+            else:
+                logger.warning(f"⚠️ Lost lease on partition {partition}")
+                self.lost += 1
+                await self._stop(partition)
+                del self._deadlines[partition]
+
+        # Restart consumers that died while we still hold their partition
+        for partition, task in list(self._tasks.items()):
+            if task.done() and self.owns(partition):
+                if not task.cancelled() and task.exception():
+                    logger.error(f"❌ Consumer of partition {partition} crashed: {task.exception()}")
+                self._start(partition)
+
+        # 2. Give back partitions above our fair share
+        self.replicas = max(1, len(await live_owners("replica")))
+        share = math.ceil(self.partitions / self.replicas)
+        for partition in sorted(self._deadlines, reverse=True)[:max(0, len(self._deadlines) - share)]:
+            await self._stop(partition)
+            del self._deadlines[partition]
+            await release_lease(self.lease_name(partition), self.replica_id)
+            self.released += 1
+            logger.info(f"↪️ Released partition {partition} for rebalancing ({self.replicas} replicas)")
+
+        # 3. Take free or expired partitions up to our share (starting at a
+        # replica-specific offset so replicas do not all race for partition 0)
+        offset = sum(self.replica_id.encode()) % self.partitions
+        for step in range(self.partitions):
+            if len(self._deadlines) >= share:
+                break
+            partition = (offset + step) % self.partitions
+            if partition in self._deadlines:
+                continue
+            started = loop.time()
+            if await acquire_lease(self.lease_name(partition), self.replica_id, self.ttl):
+                self._deadlines[partition] = started + self.ttl
+                self.acquired += 1
+                logger.info(f"📥 Acquired partition {partition}/{self.partitions}")
+                self._start(partition)
+
+    def _start(self, partition: int) -> None:
+        self._tasks[partition] = asyncio.create_task(
+            self._consume(partition, lambda: self.owns(partition))
+        )
+
+    async def _stop(self, partition: int) -> None:
+        task = self._tasks.pop(partition, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "replica_id": self.replica_id,
+            "partitions": self.partitions,
+            "owned": sorted(self._deadlines),
+            "live_replicas": self.replicas,
+            "acquired": self.acquired,
+            "lost": self.lost,
+            "released": self.released
+        }
+
+partition_coordinator = PartitionCoordinator(
+    replica_id=settings.REPLICA_ID or f"{socket.gethostname()}-{os.getpid()}",
+    partitions=settings.ETL_PARTITIONS,
+    ttl=settings.ETL_LEASE_TTL_SECONDS,
+    renew_interval=settings.ETL_LEASE_RENEW_SECONDS
+)
+
+metrics.gauge(
+    "analytics_etl_partitions_owned", "Order stream partitions leased by this replica",
+    fn=lambda: len(partition_coordinator.stats()["owned"])
+)
@@ -0,0 +1,40 @@
+# app/workers/rollup_repair.py
+"""
+Recomputes the sales rollups from `raw_sales_events`.
+
+Usage:
+    python -m app.workers.rollup_repair --start 2024-01-01 --end 2024-03-31
+    python -m app.workers.rollup_repair --start 2024-01-01 --end 2024-03-31 --granularity weekly
+
+Every week / month / day touching the range is rewritten with absolute totals,
+so this also fixes rollups that drifted (e.g. double-counted replays) or that
+predate ROLLUPS_ENABLED. Increments the ETL applies to a period while it is
+being repaired can be overwritten; repair ranges the ETL is not writing to, or
+re-run the latest period afterwards.
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from app.core.db import db
+from app.utils.logger import logger
+from app.services.rollup_service import GRANULARITIES, repair_rollups
+
+def _parse_date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild sales rollups from raw sales events.")
+    parser.add_argument("--start", type=_parse_date, required=True, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--end", type=_parse_date, required=True, help="Last day (YYYY-MM-DD)")
+    parser.add_argument("--granularity", choices=GRANULARITIES, action="append", help="Repeatable (default: all)")
+    args = parser.parse_args()
+
+    db.connect()
+    try:
+        written = asyncio.run(repair_rollups(args.start, args.end, args.granularity or GRANULARITIES))
+        logger.info(f"✅ Rollups repaired: {written}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
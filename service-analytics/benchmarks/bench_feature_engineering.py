@@ -0,0 +1,62 @@
+# benchmarks/bench_feature_engineering.py
+"""
+Per-SKU vs panel-mode feature engineering.
+
+Usage (from service-analytics/):
+    python -m benchmarks.bench_feature_engineering --skus 10000 --days 730
+
+The per-SKU path can be timed on a sample of SKUs (--per-sku-sample) and
+extrapolated, since running it over the full catalog takes minutes.
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from app.services.feature_engineering import InventoryFeatureEngineer, InventoryPanelFeatureEngineer
+
+def make_panel(skus: int, days: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2023-01-01", periods=days).strftime("%Y-%m-%d")
+    return pd.DataFrame({
+        "product_sku": np.repeat([f"SKU-{i:05d}" for i in range(skus)], days),
+        "date_key": np.tile(dates, skus),
+        "total_units_sold": rng.poisson(20, skus * days)
+    })
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skus", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--per-sku-sample", type=int, default=0, help="Time the per-SKU path on N SKUs and extrapolate (0 = all)")
+    args = parser.parse_args()
+
+    panel = make_panel(args.skus, args.days)
+    print(f"Panel: {args.skus} SKUs x {args.days} days = {len(panel):,} rows")
+
+    start = time.perf_counter()
+    panel_features = InventoryPanelFeatureEngineer(panel).transform()
+    panel_seconds = time.perf_counter() - start
+    print(f"Panel mode:   {panel_seconds:8.2f}s")
+
+    sample = args.per_sku_sample or args.skus
+    histories = [
+        (sku, history.drop(columns="product_sku"))
+        for _, (sku, history) in zip(range(sample), panel.groupby("product_sku", sort=True))
+    ]
+    start = time.perf_counter()
+    per_sku_features = [InventoryFeatureEngineer(history).transform() for _, history in histories]
+    per_sku_seconds = (time.perf_counter() - start) * args.skus / sample
+    label = "Per-SKU:" if sample == args.skus else f"Per-SKU (x{args.skus / sample:.0f} extrapolated):"
+    print(f"{label} {per_sku_seconds:8.2f}s")
+
+    panel_by_sku = dict(tuple(panel_features.groupby("product_sku", sort=False)))
+    mismatches = sum(
+        not expected.equals(panel_by_sku[sku].drop(columns="product_sku").reset_index(drop=True))
+        for (sku, _), expected in zip(histories, per_sku_features)
+    )
+
+    print(f"Speedup:      {per_sku_seconds / panel_seconds:8.1f}x")
+    print(f"Output check: {'identical' if mismatches == 0 else f'{mismatches} SKU(s) differ'} ({sample} SKUs compared)")
+
+if __name__ == "__main__":
+    main()
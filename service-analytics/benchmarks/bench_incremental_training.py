@@ -0,0 +1,81 @@
+# benchmarks/bench_incremental_training.py
+"""
+Incremental (sufficient statistics) vs full-refit training.
+
+Usage (from service-analytics/):
+    python -m benchmarks.bench_incremental_training --days 365 730 1460
+
+For each history length, the statistics are built the way the ETL builds
+them (one closed day at a time from the 14-value tail) and the solved model is
+compared with a full refit on the same closed days. The solve time should stay
+flat while the full refit grows with the history.
+"""
+import argparse
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from app.ml.regression_model import DemandLinearRegression, feature_vector, merge_statistics, sufficient_statistics
+from app.services.feature_engineering import InventoryFeatureEngineer
+from app.ml.calendar import get_calendar
+from app.services.training_stats_service import statistics_from_history
+
+def make_history(days: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2023-01-01", periods=days)
+    weekly = 5 * (dates.dayofweek >= 5)
+    return pd.DataFrame({
+        "date_key": dates.strftime("%Y-%m-%d"),
+        "total_units_sold": (rng.poisson(20, days) + weekly).astype(np.float64)
+    })
+
+def incremental_statistics(history: pd.DataFrame) -> dict:
+    """
+    Replays the ETL: every day is closed on its own, like `close_days`.
+    """
+    calendar = get_calendar()
+    stats = sufficient_statistics(np.empty((0, 7)), np.empty(0))
+    tail = []
+    for date_key, value in zip(history["date_key"], history["total_units_sold"]):
+        if len(tail) >= 14:
+            row = feature_vector(tail, datetime.strptime(date_key, "%Y-%m-%d"), calendar)
+            stats = merge_statistics(stats, sufficient_statistics(np.array([row]), np.array([value])))
+        tail = (tail + [float(value)])[-14:]
+    return stats
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[365, 730, 1460])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'days':>6} {'full refit':>12} {'from stats':>12} {'max |Δcoef|':>12} {'|Δr2|':>10}")
+    for days in args.days:
+        history = make_history(days)
+
+        full = DemandLinearRegression()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            X = InventoryFeatureEngineer(history, target_col='total_units_sold', date_col='date_key').transform()
+            full.train(X, X['total_units_sold'])
+        full_ms = (time.perf_counter() - start) * 1000 / args.repeat
+
+        stats = incremental_statistics(history)
+        bulk = statistics_from_history(history["date_key"].to_numpy(), history["total_units_sold"].to_numpy())
+        assert stats["n"] == bulk["n"], "ETL replay and rebuild cover different rows"
+
+        incremental = DemandLinearRegression()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            incremental.train_from_stats(stats)
+        stats_ms = (time.perf_counter() - start) * 1000 / args.repeat
+
+        coef_diff = max(
+            np.max(np.abs(incremental.coef_ - full.coef_)),
+            abs(incremental.intercept_ - full.intercept_)
+        )
+        r2_diff = abs(incremental.r2_score - full.r2_score)
+        print(f"{days:>6} {full_ms:>10.2f}ms {stats_ms:>10.3f}ms {coef_diff:>12.2e} {r2_diff:>10.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/bench_startup.py
+"""
+Cold start report: per-package import cost and time to first healthy response.
+
+Usage (from service-analytics/):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --module app.workers.change_stream_listener
+    python -m benchmarks.bench_startup --serve --target 5.0
+
+Imports are measured in a fresh interpreter with `python -X importtime` and
+summed per top-level package (self time, so nothing is counted twice). The
+run fails if the module pulls in the ML stack (pandas / scikit-learn), which
+must only load lazily or through the background warm-up (app.core.startup).
+
+With --serve, uvicorn is started in a subprocess (MONGO_URI must point at a
+reachable MongoDB) and /health is polled until it first answers 200; the run
+fails if that takes longer than --target seconds.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+ML_PACKAGES = ("pandas", "sklearn", "scipy")
+
+def import_costs(module: str) -> Tuple[Dict[str, float], float]:
+    """
+    Seconds of import time per top-level package, and the module's total.
+    """
+    env = {**os.environ, "PYTHONPATH": os.getcwd()}
+    env.setdefault("MONGO_URI", "mongodb://localhost:27017")  # Settings need it; importing never connects
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, check=True
+    )
+
+    per_package: Dict[str, float] = defaultdict(float)
+    total = 0.0
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        per_package[name.strip().split(".")[0]] += int(self_us) / 1e6
+        if name.strip() == module:
+            total = int(cumulative_us) / 1e6
+    return dict(per_package), total
+
+def time_to_healthy(port: int, timeout: float) -> Optional[float]:
+    """
+    Seconds from spawning uvicorn to the first 200 from /health (None on timeout).
+    """
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, "PYTHONPATH": os.getcwd()}
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                pass
+            if server.poll() is not None:
+                return None
+            time.sleep(0.02)
+        return None
+    finally:
+        server.terminate()
+        server.wait()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=15, help="Packages to list, most expensive first")
+    parser.add_argument("--serve", action="store_true", help="Also measure the time to the first healthy response")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--target", type=float, default=5.0, help="Seconds allowed until /health first answers")
+    args = parser.parse_args()
+
+    failed = False
+    per_package, total = import_costs(args.module)
+    print(f"import {args.module}: {total:.3f}s")
+    print(f"{'package':<28} {'seconds':>8}")
+    for package, seconds in sorted(per_package.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{package:<28} {seconds:>8.3f}")
+
+    loaded_ml = [package for package in ML_PACKAGES if package in per_package]
+    if loaded_ml:
+        print(f"❌ {args.module} imports the ML stack at startup: {', '.join(loaded_ml)}")
+        failed = True
+
+    if args.serve:
+        healthy = time_to_healthy(args.port, timeout=max(args.target * 4, 30.0))
+        if healthy is None:
+            print("❌ /health never answered")
+            failed = True
+        else:
+            print(f"first healthy response: {healthy:.3f}s (target {args.target:.1f}s)")
+            failed = failed or healthy > args.target
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
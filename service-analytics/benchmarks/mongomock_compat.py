@@ -0,0 +1,29 @@
+# benchmarks/mongomock_compat.py
+"""
+Lets the in-memory mongomock stand-in accept bulk writes from pymongo 4.9+.
+
+Newer pymongo passes a `sort` argument when it adds update/replace/delete
+operations to a bulk (`UpdateOne(..., sort=...)`); mongomock 4.x predates it
+and rejects the keyword. The service never sets a sort on bulk operations,
+so an unset one is dropped and a set one is refused loudly.
+"""
+import inspect
+
+def patch_bulk_api() -> None:
+    """
+    Adapts mongomock's BulkOperationBuilder in place (idempotent, no-op when not needed).
+    """
+    from mongomock.collection import BulkOperationBuilder
+
+    for name in ("add_update", "add_replace", "add_delete"):
+        method = getattr(BulkOperationBuilder, name)
+        if "sort" in inspect.signature(method).parameters or getattr(method, "_drops_sort", False):
+            continue
+
+        def adapted(self, *args, _method=method, sort=None, **kwargs):
+            if sort is not None:
+                raise NotImplementedError("mongomock does not support sorted bulk operations")
+            return _method(self, *args, **kwargs)
+
+        adapted._drops_sort = True
+        setattr(BulkOperationBuilder, name, adapted)
@@ -0,0 +1,273 @@
+# benchmarks/run_suite.py
+"""
+Benchmark suite for the analytics hot paths.
+
+Usage (from service-analytics/):
+    python -m benchmarks.run_suite --output results.json
+    python -m benchmarks.run_suite --mongo-uri mongodb://localhost:27017 --output results.json
+    python -m benchmarks.run_suite --baseline results-main.json
+
+CPU benchmarks (feature engineering, training, recursive forecast) need nothing
+else. Database benchmarks (generate_forecast_for_sku, the ETL) run against
+--mongo-uri in a throwaway database that is dropped afterwards, or without it
+against an in-memory mongomock stand-in (`pip install mongomock-motor`). If
+neither is available they are skipped. In-memory numbers measure the Python
+side of the pipeline, not MongoDB.
+
+Results are written as JSON (medians, p95, ...) together with the git commit,
+so two runs can be compared with --baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+def summarize(samples: List[float]) -> dict:
+    ms = np.array(samples) * 1000
+    return {
+        "runs": len(ms),
+        "min_ms": round(float(ms.min()), 4),
+        "median_ms": round(float(np.median(ms)), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4)
+    }
+
+def bench(fn: Callable[[int], object], repeat: int, warmup: int = 1) -> dict:
+    """
+    Times fn(run_index) `repeat` times after `warmup` untimed calls.
+    """
+    for i in range(warmup):
+        fn(i)
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+async def record(results: Dict[str, dict], name: str, run: Awaitable[dict]) -> None:
+    """
+    Stores a benchmark's stats, or its error so one unsupported path does not
+    abort the suite (e.g. an operation the in-memory stand-in lacks).
+    """
+    try:
+        results[name] = await run
+    except Exception as e:
+        results[name] = {"error": f"{type(e).__name__}: {e}"}
+        print(f"{name} failed: {results[name]['error']}", file=sys.stderr)
+
+async def abench(fn: Callable[[int], Awaitable[object]], repeat: int, warmup: int = 1) -> dict:
+    for i in range(warmup):
+        await fn(i)
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        await fn(i)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def run_cpu_benchmarks(args, results: Dict[str, dict]) -> None:
+    from benchmarks.synthetic import make_snapshots
+    from app.services.feature_engineering import InventoryFeatureEngineer, InventoryPanelFeatureEngineer
+    from app.ml.regression_model import DemandLinearRegression
+
+    panel = make_snapshots(args.skus, args.days, seed=args.seed)
+    series = [history.drop(columns="product_sku").reset_index(drop=True) for _, history in panel.groupby("product_sku", sort=True)]
+    features = [InventoryFeatureEngineer(history).transform() for history in series[:args.repeat]]
+
+    results["feature_engineering.transform"] = bench(
+        lambda i: InventoryFeatureEngineer(series[i % len(series)]).transform(), args.repeat
+    )
+    results["feature_engineering.panel_transform"] = bench(
+        lambda i: InventoryPanelFeatureEngineer(panel).transform(), max(1, args.repeat // 10)
+    )
+
+    model = DemandLinearRegression()
+    results["model.train"] = bench(
+        lambda i: model.train(features[i % len(features)], features[i % len(features)]["total_units_sold"]), args.repeat
+    )
+
+    start_date = datetime.strptime(series[0]["date_key"].iloc[-1], "%Y-%m-%d")
+    history = series[0]["total_units_sold"].tolist()
+    results["model.forecast_recursive"] = bench(
+        lambda i: model.forecast_recursive(history, start_date=start_date, horizon=args.horizon), args.repeat
+    )
+
+def connect_database(args) -> Optional[str]:
+    """
+    Points `db` at a real mongod or the in-memory stand-in. Returns the backend name.
+    """
+    from app.core.db import db
+    if args.mongo_uri:
+        db.connect()
+        return "mongod"
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        return None
+    from benchmarks.mongomock_compat import patch_bulk_api
+    patch_bulk_api()
+    db.client = AsyncMongoMockClient()
+    return "mongomock"
+
+async def run_db_benchmarks(args, results: Dict[str, dict]) -> None:
+    from benchmarks.synthetic import make_products, make_snapshots, snapshot_documents, make_orders
+    from app.core.db import db
+    from app.core.config import settings
+    from app.core.executor import compute_executor
+    from app.services.forecasting_service import generate_forecast_for_sku
+    from app.services.etl_service import process_new_order, process_orders_bulk
+
+    database = db.get_db()
+    if args.mongo_uri:
+        await db.ensure_indexes()
+
+    products = make_products(args.skus, seed=args.seed)
+    await database[settings.COLLECTION_PRODUCTS].insert_many(products)
+    snapshots = snapshot_documents(make_snapshots(args.skus, args.days, seed=args.seed), datetime.utcnow())
+    for i in range(0, len(snapshots), 10_000):
+        await database[settings.COLLECTION_DAILY_SNAPSHOTS].insert_many(snapshots[i:i + 10_000])
+
+    skus = [product["sku"] for product in products]
+    compute_executor.start()
+    try:
+        # Cold: full fetch + feature engineering + training + forecast + persist
+        settings.MODEL_REGISTRY_ENABLED = False
+        await record(results, "forecast.generate_cold", abench(
+            lambda i: generate_forecast_for_sku(skus[i % len(skus)], horizon=args.horizon), args.repeat
+        ))
+
+        # Registry hit: the stored model is reused (no history fetch, no training)
+        settings.MODEL_REGISTRY_ENABLED = True
+        trained = skus[:args.repeat]
+        for sku in trained:
+            await generate_forecast_for_sku(sku, horizon=args.horizon)
+        await record(results, "forecast.generate_registry_hit", abench(
+            lambda i: generate_forecast_for_sku(trained[i % len(trained)], horizon=args.horizon), args.repeat
+        ))
+    finally:
+        compute_executor.shutdown()
+
+    # ETL end to end (SKU lookup, raw events, snapshot aggregation and hooks)
+    orders = make_orders(products, args.orders + args.batch_size * 3, seed=args.seed)
+    single, bulk = orders[:args.orders], orders[args.orders:]
+    await record(results, "etl.process_new_order", abench(
+        lambda i: process_new_order(single[i]), args.orders - 1
+    ))
+    batches = [bulk[i:i + args.batch_size] for i in range(0, len(bulk), args.batch_size)]
+    await record(results, "etl.process_orders_bulk", abench(
+        lambda i: process_orders_bulk(batches[i]), len(batches) - 1
+    ))
+    if "median_ms" in results["etl.process_orders_bulk"]:
+        results["etl.process_orders_bulk"]["orders_per_second"] = round(
+            args.batch_size / (results["etl.process_orders_bulk"]["median_ms"] / 1000), 1
+        )
+
+def print_comparison(results: Dict[str, dict], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('commit')})")
+    print(f"{'benchmark':40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, current in results.items():
+        before = baseline["results"].get(name)
+        if not before or "median_ms" not in before or "median_ms" not in current:
+            continue
+        ratio = current["median_ms"] / before["median_ms"] if before["median_ms"] else float("nan")
+        print(f"{name:40} {before['median_ms']:>10.3f}ms {current['median_ms']:>10.3f}ms {ratio:>7.2f}x")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skus", type=int, default=100)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--horizon", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per benchmark")
+    parser.add_argument("--orders", type=int, default=200, help="Orders for the per-order ETL benchmark")
+    parser.add_argument("--batch-size", type=int, default=500, help="Orders per bulk ETL batch")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongo-uri", default=None, help="Run database benchmarks against this mongod")
+    parser.add_argument("--skip-db", action="store_true")
+    parser.add_argument("--output", default=None, help="Write JSON results here (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="Previous JSON results to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Keep the service's INFO logs (part of the ETL cost in production)")
+    return parser
+
+def run_suite(args) -> dict:
+    """
+    Runs every benchmark and returns the report (meta + results).
+    """
+    results: Dict[str, dict] = {}
+    run_cpu_benchmarks(args, results)
+
+    backend = None
+    if not args.skip_db:
+        backend = connect_database(args)
+        if backend:
+            from app.core.db import db
+            from app.core.config import settings
+            async def run_db() -> None:
+                try:
+                    await run_db_benchmarks(args, results)
+                finally:
+                    if backend == "mongod":
+                        await db.client.drop_database(settings.DB_NAME)
+            asyncio.run(run_db())
+        else:
+            print("Database benchmarks skipped: pass --mongo-uri or install mongomock-motor", file=sys.stderr)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "database": backend,
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "mongo_uri")}
+        },
+        "results": results
+    }
+
+def main() -> None:
+    args = build_parser().parse_args()
+
+    # Settings are read at import time, so configure them before importing the app
+    os.environ["MONGO_URI"] = args.mongo_uri or os.environ.get("MONGO_URI", "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = f"bench_analytics_{os.getpid()}"
+    os.environ.setdefault("FORECAST_SCHEDULER_ENABLED", "false")
+
+    import logging
+    from app.utils.logger import logger
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+
+    report = run_suite(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        print_comparison(report["results"], args.baseline)
+
+if __name__ == "__main__":
+    main()
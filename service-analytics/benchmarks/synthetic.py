@@ -0,0 +1,98 @@
+# benchmarks/synthetic.py
+"""
+Reproducible synthetic data for the benchmarks: products, orders and daily snapshots.
+
+Demand per SKU = base level x (1 + trend) x weekly seasonality x holiday uplift,
+with Poisson noise. Every generator takes a seed, so the same arguments always
+produce the same data.
+"""
+from datetime import datetime, timedelta
+from typing import List
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from app.ml.calendar import get_calendar
+
+def make_products(skus: int, seed: int = 42) -> List[dict]:
+    rng = np.random.default_rng(seed)
+    prices = rng.uniform(5, 200, skus).round(2)
+    # Deterministic ObjectIds so orders generated separately refer to the same products
+    return [
+        {"_id": ObjectId(f"{i + 1:024x}"), "sku": f"SKU-{i:05d}", "name": f"Product {i}", "price": float(prices[i])}
+        for i in range(skus)
+    ]
+
+def demand_matrix(skus: int, days: int, start: str = "2023-01-01", seed: int = 42, weekly_amplitude: float = 0.3, holiday_uplift: float = 0.5, trend: float = 0.2, base: float = 20.0) -> np.ndarray:
+    """
+    (skus, days) expected-demand-with-noise matrix.
+
+    Args:
+        weekly_amplitude: Weekend demand is (1 + weekly_amplitude) x weekday demand.
+        holiday_uplift: Relative demand increase on holidays.
+        trend: Relative growth over the whole period (can be negative).
+        base: Mean daily units of an average SKU.
+    """
+    rng = np.random.default_rng(seed)
+    calendar = get_calendar().range(datetime.strptime(start, "%Y-%m-%d"), days)
+    levels = rng.lognormal(np.log(base), 0.5, skus)[:, None]
+    shape = (
+        (1 + trend * np.linspace(0, 1, days))
+        * (1 + weekly_amplitude * calendar[:, 0])
+        * (1 + holiday_uplift * calendar[:, 1])
+    )
+    return rng.poisson(levels * shape).astype(np.float64)
+
+def make_snapshots(skus: int, days: int, start: str = "2023-01-01", seed: int = 42, **seasonality) -> pd.DataFrame:
+    """
+    Long-format daily snapshots (product_sku, date_key, total_units_sold, total_revenue).
+    """
+    units = demand_matrix(skus, days, start, seed, **seasonality)
+    prices = np.array([product["price"] for product in make_products(skus, seed)])
+    dates = pd.date_range(start, periods=days).strftime("%Y-%m-%d")
+    return pd.DataFrame({
+        "product_sku": np.repeat([f"SKU-{i:05d}" for i in range(skus)], days),
+        "date_key": np.tile(dates, skus),
+        "total_units_sold": units.ravel(),
+        "total_revenue": (units * prices[:, None]).ravel().round(2)
+    })
+
+def snapshot_documents(snapshots: pd.DataFrame, generated_at: datetime) -> List[dict]:
+    """
+    `daily_sales_snapshots` documents as the ETL writes them.
+    """
+    return [
+        {
+            "_id": f"{row.date_key}_{row.product_sku}",
+            "date_key": row.date_key,
+            "product_sku": row.product_sku,
+            "total_units_sold": row.total_units_sold,
+            "total_revenue": row.total_revenue,
+            "aggregation_version": "v1.0",
+            "generated_at": generated_at
+        }
+        for row in snapshots.itertuples(index=False)
+    ]
+
+def make_orders(products: List[dict], count: int, start: str = "2024-01-01", days: int = 30, max_items: int = 4, seed: int = 42) -> List[dict]:
+    """
+    Order documents shaped like the `orders` collection written by the core service.
+    Popular products (low index) are ordered more often (Zipf-like).
+    """
+    rng = np.random.default_rng(seed)
+    origin = datetime.strptime(start, "%Y-%m-%d") # Naive UTC, as pymongo returns BSON dates
+    weights = 1.0 / np.arange(1, len(products) + 1)
+    weights /= weights.sum()
+
+    orders = []
+    for n in range(count):
+        picked = rng.choice(len(products), size=rng.integers(1, min(max_items, len(products)) + 1), replace=False, p=weights)
+        orders.append({
+            "_id": ObjectId(),
+            "order_id": f"ORD-{seed}-{n:07d}",
+            "items": [
+                {"product_id": str(products[i]["_id"]), "qty": int(rng.integers(1, 6)), "price_at_sale": products[i]["price"]}
+                for i in picked
+            ],
+            "createdAt": origin + timedelta(seconds=float(rng.uniform(0, days * 86400)))
+        })
+    return orders
@@ -0,0 +1,23 @@
+# tests/conftest.py
+import os
+import sys
+
+# Settings require a URI; tests never connect to it
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from app.core.db import db
+
+@pytest.fixture
+def mock_db():
+    """
+    Points `db` at a fresh in-memory mongomock database for one test.
+    """
+    import mongomock_motor
+    from benchmarks.mongomock_compat import patch_bulk_api
+    patch_bulk_api()
+    previous = db.client, db.read_client
+    db.client, db.read_client = mongomock_motor.AsyncMongoMockClient(), None
+    yield db.get_db()
+    db.client, db.read_client = previous
@@ -0,0 +1,24 @@
+# tests/test_benchmark_suite.py
+import pytest
+from app.core.config import settings
+from app.core.db import db
+from benchmarks import run_suite
+
+def test_every_benchmark_runs_at_tiny_sizes(monkeypatch):
+    pytest.importorskip("mongomock_motor")
+    # The suite flips these while it runs; monkeypatch restores them afterwards
+    monkeypatch.setattr(settings, "MODEL_REGISTRY_ENABLED", settings.MODEL_REGISTRY_ENABLED)
+    monkeypatch.setattr(db, "client", db.client)
+    monkeypatch.setattr(db, "read_client", None)
+
+    args = run_suite.build_parser().parse_args([
+        "--skus", "3", "--days", "60", "--horizon", "7", "--repeat", "2", "--orders", "3", "--batch-size", "2"
+    ])
+    report = run_suite.run_suite(args)
+
+    assert report["meta"]["database"] == "mongomock"
+    results = report["results"]
+    assert {"forecast.generate_cold", "forecast.generate_registry_hit", "etl.process_new_order", "etl.process_orders_bulk"} <= set(results)
+    failed = {name: entry["error"] for name, entry in results.items() if "error" in entry}
+    assert not failed
+    assert all(entry["runs"] > 0 for entry in results.values())
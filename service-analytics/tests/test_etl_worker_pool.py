@@ -0,0 +1,47 @@
+# tests/test_etl_worker_pool.py
+import asyncio
+from collections import Counter
+from app.core.config import settings
+from app.workers import change_stream_listener
+from app.workers.etl_worker_pool import EtlWorkerPool
+
+def _orders(count: int, products: int):
+    return [
+        {"order_id": f"o{n}", "items": [{"product_id": f"p{(n + offset) % products}", "qty": 1} for offset in range(2)]}
+        for n in range(count)
+    ]
+
+def test_a_failed_partition_is_retried_without_reapplying_the_others(monkeypatch):
+    monkeypatch.setattr(settings, "ETL_PARTITION_KEY", "sku")
+    checkpoints = []
+
+    async def advance_checkpoint(name, resume_token):
+        checkpoints.append(resume_token)
+        return True
+
+    monkeypatch.setattr(change_stream_listener, "advance_checkpoint", advance_checkpoint)
+    orders = _orders(20, products=6)
+    applied = Counter()
+    failures = {"p3": 1}
+
+    async def handler(parts):
+        product_id = parts[0]["items"][0]["product_id"]
+        if failures.get(product_id):
+            failures[product_id] -= 1
+            raise RuntimeError("primary stepped down")
+        for part in parts:
+            for item in part["items"]:
+                applied[(part["order_id"], item["product_id"])] += item["qty"]
+
+    async def scenario():
+        pool = EtlWorkerPool(handler, concurrency=3, queue_size=100, max_batch=1)
+        pool.start()
+        try:
+            await change_stream_listener._flush_batch(orders, {"_data": "t"}, "test", pool)
+        finally:
+            await pool.drain(timeout=1)
+
+    asyncio.run(scenario())
+    expected = Counter({(order["order_id"], item["product_id"]): 1 for order in orders for item in order["items"]})
+    assert applied == expected
+    assert checkpoints == [{"_data": "t"}]
@@ -0,0 +1,26 @@
+# tests/test_executor.py
+import asyncio
+import time
+import pytest
+from app.core.executor import ComputeExecutor, ComputeQueueFullError
+
+def test_timed_out_jobs_keep_their_slot_until_they_finish():
+    executor = ComputeExecutor("thread", max_workers=1, max_pending=1, timeout=0.05)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.run(time.sleep, 0.3)
+        # Still running in the pool, so it still counts against max_pending
+        assert executor.stats()["pending"] == 1
+        with pytest.raises(ComputeQueueFullError):
+            await executor.run(time.sleep, 0)
+
+        await asyncio.sleep(0.4)
+        assert executor.stats()["pending"] == 0
+        assert await executor.run(sum, [1, 2]) == 3
+        assert executor.stats()["pending"] == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
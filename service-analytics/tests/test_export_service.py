@@ -0,0 +1,39 @@
+# tests/test_export_service.py
+import asyncio
+from app.core.config import settings
+from app.services.export_service import export_forecasts
+
+def _forecast(sku: str, dates):
+    return {
+        "product_sku": sku,
+        "model_version": "v1",
+        "forecasts": [{"date": date, "predicted_units": 1.0} for date in dates]
+    }
+
+async def _collect(records):
+    return [record async for record in records]
+
+def test_forecast_pages_are_full_when_leading_skus_have_no_predictions_in_range(mock_db):
+    async def scenario():
+        await mock_db[settings.COLLECTION_FORECASTS].insert_many(
+            [_forecast(f"SKU-{i:02d}", ["2024-01-01", "2024-01-02"]) for i in range(3)] +
+            [_forecast(f"SKU-{i:02d}", ["2024-02-01", "2024-02-02"]) for i in range(3, 8)]
+        )
+        pages, after = [], None
+        while True:
+            page = await _collect(export_forecasts(after_sku=after, limit=2, start_date="2024-02-01", end_date="2024-02-28"))
+            if not page:
+                return pages
+            pages.append([forecast["product_sku"] for forecast in page])
+            after = page[-1]["product_sku"]
+
+    pages = asyncio.run(scenario())
+    assert pages == [["SKU-03", "SKU-04"], ["SKU-05", "SKU-06"], ["SKU-07"]]
+
+def test_forecast_predictions_are_trimmed_to_the_date_range(mock_db):
+    async def scenario():
+        await mock_db[settings.COLLECTION_FORECASTS].insert_one(_forecast("SKU-01", ["2024-01-31", "2024-02-01", "2024-02-02"]))
+        return await _collect(export_forecasts(start_date="2024-02-01", end_date="2024-02-01"))
+
+    (forecast,) = asyncio.run(scenario())
+    assert [entry["date"] for entry in forecast["forecasts"]] == ["2024-02-01"]
@@ -0,0 +1,50 @@
+# tests/test_forecast_sweep.py
+import asyncio
+from app.core.config import settings
+from app.services.checkpoint_service import load_checkpoint
+from app.workers.forecast_scheduler import ForecastScheduler, SWEEP_CHECKPOINT
+
+def _scheduler() -> ForecastScheduler:
+    return ForecastScheduler(
+        interval=1.0, batch_size=10, concurrency=1, executor_share=0.5,
+        horizon=7, sweep_hour=0, sweep_velocity_days=30
+    )
+
+def test_only_one_replica_runs_the_nightly_sweep(mock_db):
+    replicas = [_scheduler() for _ in range(3)]
+
+    async def scenario():
+        await mock_db[settings.COLLECTION_DAILY_SNAPSHOTS].insert_many([
+            {"product_sku": sku, "date_key": "2024-01-01", "total_units_sold": 1}
+            for sku in ("A", "B")
+        ])
+        # Every replica reaches the sweep hour in the same cycle
+        await asyncio.gather(*(replica._sweep_if_due() for replica in replicas))
+        # and a later cycle (or a restart) does not sweep again
+        await asyncio.gather(*(replica._sweep_if_due() for replica in replicas))
+        return await load_checkpoint(SWEEP_CHECKPOINT)
+
+    checkpoint = asyncio.run(scenario())
+
+    assert sorted(replica.sweeps for replica in replicas) == [0, 0, 1]
+    assert sum(replica.stats()["dirty"] for replica in replicas) == 2
+    assert checkpoint["status"] == "done" and checkpoint["skus"] == 2
+
+def test_a_failed_sweep_releases_its_claim(mock_db):
+    scheduler = _scheduler()
+
+    async def broken(now):
+        raise RuntimeError("read pool unavailable")
+
+    async def scenario():
+        scheduler._queue_catalog = broken
+        try:
+            await scheduler._sweep_if_due()
+        except RuntimeError:
+            pass
+        del scheduler._queue_catalog
+        await scheduler._sweep_if_due()
+
+    asyncio.run(scenario())
+
+    assert scheduler.sweeps == 1
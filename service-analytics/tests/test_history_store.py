@@ -0,0 +1,51 @@
+# tests/test_history_store.py
+import asyncio
+from datetime import datetime
+import pytest
+from app.core.config import settings
+from app.services.history_store import HistoryStore
+
+pytest.importorskip("pyarrow")
+
+def _snapshot(day: int, units: float, written: int) -> dict:
+    return {
+        "_id": f"2024-01-0{day}_SKU-A", "product_sku": "SKU-A", "date_key": f"2024-01-0{day}",
+        "total_units_sold": units, "total_revenue": units * 2, "generated_at": datetime(2024, 1, 10, written)
+    }
+
+def test_a_failed_delta_is_not_hidden_by_a_later_one(mock_db, tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path), buckets=2, enabled=True)
+    snapshots = mock_db[settings.COLLECTION_DAILY_SNAPSHOTS]
+    write_delta = store.write_delta
+
+    def failing_write_delta(rows):
+        raise OSError("disk full")
+
+    async def scenario():
+        await snapshots.insert_many([_snapshot(1, 5, 1), _snapshot(2, 7, 1)])
+        await store.append(["2024-01-01_SKU-A", "2024-01-02_SKU-A"])
+        store.compact()
+
+        # An order for day 2 lands in MongoDB but its delta fails
+        await snapshots.replace_one({"_id": "2024-01-02_SKU-A"}, _snapshot(2, 9, 2))
+        monkeypatch.setattr(store, "write_delta", failing_write_delta)
+        await store.append(["2024-01-02_SKU-A"])
+        monkeypatch.setattr(store, "write_delta", write_delta)
+        # Other processes see the gap too
+        assert "SKU-A" in HistoryStore(str(tmp_path), buckets=2, enabled=True).load_gaps()
+        gapped = await store.load_sku("SKU-A")
+
+        # Day 3 succeeds; its row is newer than anything in MongoDB, so only the
+        # gap (not the generated_at probe) keeps the incomplete history out
+        await snapshots.insert_one(_snapshot(3, 4, 3))
+        await store.append(["2024-01-03_SKU-A"])
+        still_gapped = await store.load_sku("SKU-A")
+        store.compact()
+        return gapped, still_gapped, await store.load_sku("SKU-A")
+
+    gapped, still_gapped, healed = asyncio.run(scenario())
+    assert gapped is None and still_gapped is None
+    date_keys, units, _ = healed
+    assert list(date_keys) == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert list(units) == [5, 9, 4]
+    assert store.load_gaps() == {}
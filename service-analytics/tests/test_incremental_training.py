@@ -0,0 +1,86 @@
+# tests/test_incremental_training.py
+"""
+Training from the ETL-maintained sufficient statistics must give the same
+model and forecast as the full refit (`train_and_forecast`) as it actually
+runs: on the newest FORECAST_TRAINING_WINDOW snapshots, open day included.
+"""
+import asyncio
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.core.executor import ComputeExecutor
+from app.ml.regression_model import DemandLinearRegression
+from app.services import training_stats_service
+from app.services.forecasting_service import fetch_history, train_and_forecast
+from benchmarks.bench_incremental_training import make_history
+
+pytest.importorskip("sklearn")
+
+SKU = "SKU-1"
+HORIZON = 14
+# Absolute tolerance on coefficients, intercept, R² and forecasts (targets are ~20 units/day)
+TOLERANCE = 1e-9
+
+def _snapshots(history):
+    return [
+        {"_id": f"{date_key}_{SKU}", "product_sku": SKU, "date_key": date_key, "total_units_sold": float(units)}
+        for date_key, units in zip(history["date_key"], history["total_units_sold"])
+    ]
+
+async def _compare_with_full_refit():
+    stats, recent = await training_stats_service.training_statistics(SKU)
+    incremental = DemandLinearRegression()
+    incremental.train_from_stats(stats)
+    start = datetime.strptime(recent[-1]["date_key"], "%Y-%m-%d") + timedelta(days=1)
+    forecast = incremental.forecast_recursive([s["total_units_sold"] for s in recent], start, HORIZON)
+
+    history = await fetch_history(SKU)
+    full_forecast, params, _ = train_and_forecast(history.date_keys, history.units, start, HORIZON)
+
+    window = settings.FORECAST_TRAINING_WINDOW
+    assert stats["n"] == len(history.units) - 14
+    assert len(history.units) == window or not window
+    np.testing.assert_allclose(incremental.coef_, params["coef"], rtol=0, atol=TOLERANCE)
+    assert incremental.intercept_ == pytest.approx(params["intercept"], rel=0, abs=TOLERANCE)
+    assert incremental.r2_score == pytest.approx(params["r2"], rel=0, abs=TOLERANCE)
+    np.testing.assert_allclose(forecast, full_forecast, rtol=0, atol=TOLERANCE)
+
+@pytest.fixture
+def training_stats(mock_db, monkeypatch):
+    executor = ComputeExecutor("thread", max_workers=1, max_pending=4, timeout=30)
+    monkeypatch.setattr(training_stats_service, "compute_executor", executor)
+    monkeypatch.setattr(training_stats_service, "_closed_through", {})
+    yield mock_db
+    executor.shutdown()
+
+def test_fresh_statistics_match_the_full_refit(training_stats):
+    # Longer than the default 730-day window
+    history = make_history(800)
+
+    async def scenario():
+        await training_stats[settings.COLLECTION_DAILY_SNAPSHOTS].insert_many(_snapshots(history))
+        await _compare_with_full_refit()
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("window", [60, 0])
+def test_incrementally_closed_statistics_match_the_full_refit(training_stats, monkeypatch, window):
+    monkeypatch.setattr(settings, "FORECAST_TRAINING_WINDOW", window)
+    snapshots = _snapshots(make_history(150))
+
+    async def scenario():
+        collection = training_stats[settings.COLLECTION_DAILY_SNAPSHOTS]
+        await collection.insert_many(snapshots[:40])
+        await training_stats_service.load_statistics(SKU)
+        # The ETL writes one new day at a time, closing the previous one
+        # (and, with a window, dropping the oldest row)
+        for snapshot in snapshots[40:]:
+            await collection.insert_one(snapshot)
+            await training_stats_service.note_snapshot_days([snapshot])
+
+        doc = await training_stats[settings.COLLECTION_TRAINING_STATS].find_one({"_id": SKU})
+        assert doc["version"] == 1 + len(snapshots) - 40  # Closed in place, never rebuilt
+        await _compare_with_full_refit()
+
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+# tests/test_lease_fencing.py
+import asyncio
+import pytest
+from app.core.config import settings
+from app.services.checkpoint_service import advance_checkpoint, load_checkpoint
+from app.workers import change_stream_listener
+from app.workers.change_stream_listener import LeaseLostError
+from benchmarks.synthetic import make_products, make_orders
+
+@pytest.fixture
+def orders(mock_db, monkeypatch):
+    monkeypatch.setattr(settings, "FORECAST_SCHEDULER_ENABLED", False)
+    products = make_products(2)
+
+    async def insert():
+        await mock_db[settings.COLLECTION_PRODUCTS].insert_many(products)
+
+    asyncio.run(insert())
+    return make_orders(products, 5, days=2)
+
+def test_a_flush_that_outlives_its_lease_does_not_checkpoint(orders):
+    async def scenario():
+        with pytest.raises(LeaseLostError):
+            # The lease expired while the batch was being written
+            await change_stream_listener._flush_batch(orders, {"_data": "82A"}, "orders:0/2", owns=lambda: False)
+        return await load_checkpoint("orders:0/2")
+
+    assert asyncio.run(scenario()) is None
+
+def test_a_stale_owner_cannot_rewind_the_checkpoint(orders):
+    async def scenario():
+        # The new owner already committed further ahead
+        assert await advance_checkpoint("orders:0/2", {"_data": "82B"})
+        with pytest.raises(LeaseLostError):
+            await change_stream_listener._flush_batch(orders, {"_data": "82A"}, "orders:0/2", owns=lambda: True)
+        return await load_checkpoint("orders:0/2")
+
+    assert asyncio.run(scenario())["resume_token"] == {"_data": "82B"}
+
+def test_the_checkpoint_moves_forward_and_accepts_a_replayed_token(mock_db):
+    async def scenario():
+        return [
+            await advance_checkpoint("orders", {"_data": token})
+            for token in ("82A", "82B", "82B", "82A")
+        ]
+
+    assert asyncio.run(scenario()) == [True, True, True, False]
@@ -0,0 +1,112 @@
+# tests/test_product_cache.py
+import asyncio
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+from app.core.config import settings
+from app.services import product_cache as product_cache_module
+from app.services.product_cache import ProductCatalogCache
+from app.workers import change_stream_listener
+
+PRODUCT_ID = ObjectId()
+
+class FakeCursor:
+    """Yields `products`, running `during_read` before the first one arrives."""
+
+    def __init__(self, products, during_read):
+        self.products = products
+        self.during_read = during_read
+
+    async def __aiter__(self):
+        self.during_read()
+        for product in self.products:
+            yield product
+
+class FakeStream:
+    def __init__(self, changes, fail: bool):
+        self.changes = changes
+        self.fail = fail
+        self.drained = False
+
+    async def __aenter__(self):
+        if self.fail:
+            raise PyMongoError("connection reset")
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for change in self.changes:
+            yield change
+        self.drained = True
+        await asyncio.Event().wait() # Stays open until cancelled
+
+class FakeDb:
+    client = object()
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get_db(self):
+        return {settings.COLLECTION_PRODUCTS: self.collection}
+
+def test_a_miss_read_before_an_invalidation_is_not_cached(monkeypatch):
+    cache = ProductCatalogCache(max_size=10)
+
+    class Products:
+        def find(self, *args):
+            # The product changes while its old SKU is on the wire
+            return FakeCursor([{"_id": PRODUCT_ID, "sku": "OLD"}], lambda: cache.invalidate(PRODUCT_ID))
+
+    monkeypatch.setattr(product_cache_module, "db", FakeDb(Products()))
+    resolved = asyncio.run(cache.get_many([PRODUCT_ID]))
+
+    assert resolved == {str(PRODUCT_ID): "OLD"}
+    assert cache.get(PRODUCT_ID) is None
+
+def test_a_miss_read_across_a_clear_is_not_cached(monkeypatch):
+    cache = ProductCatalogCache(max_size=10)
+
+    class Products:
+        def find(self, *args):
+            return FakeCursor([{"_id": PRODUCT_ID, "sku": "OLD"}], cache.clear)
+
+    monkeypatch.setattr(product_cache_module, "db", FakeDb(Products()))
+    asyncio.run(cache.get_many([PRODUCT_ID]))
+
+    assert cache.get(PRODUCT_ID) is None
+
+def test_the_product_stream_reconnects_and_re_enables_the_cache(monkeypatch):
+    cache = ProductCatalogCache(max_size=10)
+    cache._put(str(PRODUCT_ID), "OLD")
+    streams = []
+
+    class Products:
+        def watch(self, pipeline):
+            streams.append(FakeStream(
+                [{"documentKey": {"_id": PRODUCT_ID}}], fail=not streams
+            ))
+            return streams[-1]
+
+    real_sleep = asyncio.sleep
+
+    async def no_backoff(delay):
+        await real_sleep(0)
+
+    monkeypatch.setattr(change_stream_listener, "product_cache", cache)
+    monkeypatch.setattr(change_stream_listener, "db", FakeDb(Products()))
+    monkeypatch.setattr(change_stream_listener.asyncio, "sleep", no_backoff)
+
+    async def scenario():
+        task = asyncio.create_task(change_stream_listener.watch_products())
+        while not (streams and streams[-1].drained):
+            await real_sleep(0)
+        task.cancel()
+        await task
+
+    asyncio.run(scenario())
+
+    assert len(streams) == 2
+    assert cache.enabled
+    # Dropped with the cache when the first stream failed
+    assert cache.get(PRODUCT_ID) is None
@@ -0,0 +1,55 @@
+# tests/test_recursive_forecast.py
+"""
+The NumPy recursive forecast must match the per-step scikit-learn/pandas
+prediction it replaced.
+"""
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app.ml.regression_model import DemandLinearRegression
+from benchmarks.bench_incremental_training import make_history
+
+pytest.importorskip("sklearn")
+
+def _per_step_forecast(model: DemandLinearRegression, recent_history, start_date: datetime, horizon: int):
+    """
+    The original implementation: one DataFrame and one `model.predict` per day.
+    """
+    import pandas as pd
+
+    history = list(recent_history)
+    predictions = []
+    current_date = start_date
+    for _ in range(horizon):
+        lag_1, lag_7, lag_14 = history[-1], history[-7], history[-14]
+        rolling_mean_7 = np.mean(history[-7:])
+        is_weekend = 1 if current_date.weekday() >= 5 else 0
+        is_holiday = model.calendar.range(current_date, 1)[0][1]
+        features = pd.DataFrame(
+            [[lag_1, lag_7, lag_14, rolling_mean_7, (lag_1 - lag_7) / 7.0, is_weekend, is_holiday]],
+            columns=model.feature_order
+        )
+        predicted = float(model.model.predict(features)[0])
+
+        base_mean = rolling_mean_7 if rolling_mean_7 > 0.1 else 1.0
+        predicted = max(base_mean * 0.2, min(predicted, base_mean * 2.0))
+        predictions.append(predicted)
+        history.append(predicted)
+        current_date += timedelta(days=1)
+    return predictions
+
+@pytest.mark.parametrize("horizon", [1, 7, 30])
+def test_numpy_forecast_matches_the_per_step_sklearn_forecast(horizon):
+    from app.services.feature_engineering import InventoryFeatureEngineer
+
+    history = make_history(400)
+    X = InventoryFeatureEngineer(history, target_col='total_units_sold', date_col='date_key').transform()
+    model = DemandLinearRegression()
+    model.train(X, X['total_units_sold'])
+
+    recent = history["total_units_sold"].tolist()[-14:]
+    # Spans Thanksgiving (a holiday) and weekends; 30 days wraps the 14-day ring twice
+    start_date = datetime(2024, 11, 25)
+    expected = _per_step_forecast(model, recent, start_date, horizon)
+
+    np.testing.assert_allclose(model.forecast_recursive(recent, start_date, horizon), expected, rtol=1e-12, atol=1e-9)
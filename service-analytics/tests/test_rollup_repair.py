@@ -0,0 +1,55 @@
+# tests/test_rollup_repair.py
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from app.core.config import settings
+from app.services.rollup_service import month_period, repair_rollups, week_period
+
+def _events():
+    # Spans a year boundary, where ISO weeks and calendar years disagree
+    start = datetime(2024, 12, 20, 9)
+    return [
+        {"product_sku": f"SKU-{n % 3}", "timestamp": start + timedelta(hours=11 * n), "quantity": 1 + n % 4, "unit_price": 2.5}
+        for n in range(60)
+    ]
+
+def _expected(events):
+    expected = {"weekly": defaultdict(float), "monthly": defaultdict(float), "catalog_daily": defaultdict(float)}
+    for event in events:
+        day = event["timestamp"].date()
+        expected["weekly"][f"{week_period(day)[0]}_{event['product_sku']}"] += event["quantity"]
+        expected["monthly"][f"{month_period(day)[0]}_{event['product_sku']}"] += event["quantity"]
+        expected["catalog_daily"][day.isoformat()] += event["quantity"]
+    return {granularity: dict(totals) for granularity, totals in expected.items()}
+
+def test_repair_recomputes_every_period_of_the_range(mock_db):
+    events = _events()
+    expected = _expected(events)
+    collections = {
+        "weekly": settings.COLLECTION_WEEKLY_ROLLUPS,
+        "monthly": settings.COLLECTION_MONTHLY_ROLLUPS,
+        "catalog_daily": settings.COLLECTION_CATALOG_DAILY_ROLLUPS
+    }
+
+    async def scenario():
+        await mock_db[settings.COLLECTION_RAW_EVENTS].insert_many(events)
+        # A drifted row and one for a SKU without events in its period
+        await mock_db[settings.COLLECTION_WEEKLY_ROLLUPS].insert_many([
+            {"_id": "2024-W52_SKU-0", "period": "2024-W52", "product_sku": "SKU-0", "total_units_sold": 999, "generated_at": datetime(2024, 1, 1)},
+            {"_id": "2024-W52_SKU-9", "period": "2024-W52", "product_sku": "SKU-9", "total_units_sold": 5, "generated_at": datetime(2024, 1, 1)}
+        ])
+        written = await repair_rollups(date(2024, 12, 20), date(2025, 1, 20))
+        stored = {
+            granularity: {doc["_id"]: doc for doc in await mock_db[name].find().to_list(length=None)}
+            for granularity, name in collections.items()
+        }
+        return written, stored
+
+    written, stored = asyncio.run(scenario())
+    for granularity, totals in expected.items():
+        assert written[granularity] == len(totals)
+        assert {rollup_id: doc["total_units_sold"] for rollup_id, doc in stored[granularity].items()} == totals
+
+    monday = stored["weekly"]["2025-W01_SKU-1"]
+    assert monday["period_start"] == "2024-12-30"
+    assert monday["total_revenue"] == expected["weekly"]["2025-W01_SKU-1"] * 2.5
@@ -0,0 +1,81 @@
+# tests/test_stream_replay.py
+import asyncio
+import pytest
+from pymongo.errors import AutoReconnect
+from app.core.config import settings
+from app.services import etl_service
+from app.workers import change_stream_listener
+from benchmarks.synthetic import make_products, make_orders
+from tests.test_backfill import _expected_totals, _stored_totals
+
+@pytest.fixture
+def stream(mock_db, monkeypatch):
+    monkeypatch.setattr(settings, "FORECAST_SCHEDULER_ENABLED", False)
+    checkpoints = []
+
+    async def advance_checkpoint(name, resume_token):
+        checkpoints.append(resume_token)
+        return True
+
+    monkeypatch.setattr(change_stream_listener, "advance_checkpoint", advance_checkpoint)
+    return mock_db, checkpoints
+
+def _fail_rollups_once(monkeypatch, error: Exception):
+    apply_rollups = etl_service.apply_rollups
+    failures = [error]
+
+    async def flaky(snapshots):
+        # Snapshots are already incremented when this runs
+        if failures:
+            raise failures.pop()
+        await apply_rollups(snapshots)
+
+    monkeypatch.setattr(etl_service, "apply_rollups", flaky)
+
+def test_replaying_a_flushed_batch_does_not_change_the_totals(stream):
+    database, checkpoints = stream
+    products = make_products(4)
+    orders = make_orders(products, 30, days=10)
+
+    async def scenario():
+        await database[settings.COLLECTION_PRODUCTS].insert_many(products)
+        await change_stream_listener._flush_batch(orders, {"_data": "1"}, "test")
+        first = await _stored_totals(database)
+        # Re-delivered after a reconnect, e.g. the checkpoint write was lost
+        await change_stream_listener._flush_batch(orders, {"_data": "1"}, "test")
+        return first, await _stored_totals(database)
+
+    first, replayed = asyncio.run(scenario())
+    assert first == _expected_totals(orders, products)
+    assert replayed == first
+    assert len(checkpoints) == 2
+
+def test_a_batch_that_failed_after_its_snapshot_writes_is_replayed_exactly_once(stream, monkeypatch):
+    database, checkpoints = stream
+    products = make_products(4)
+    orders = make_orders(products, 30, days=10)
+    _fail_rollups_once(monkeypatch, AutoReconnect("connection reset"))
+
+    async def scenario():
+        await database[settings.COLLECTION_PRODUCTS].insert_many(products)
+        with pytest.raises(AutoReconnect):
+            await change_stream_listener._flush_batch(orders, {"_data": "1"}, "test")
+        # The stream reconnects and replays the batch from the previous checkpoint
+        await change_stream_listener._flush_batch(orders, {"_data": "1"}, "test")
+        return await _stored_totals(database)
+
+    assert asyncio.run(scenario()) == _expected_totals(orders, products)
+    assert checkpoints == [{"_data": "1"}]
+
+def test_the_per_order_fallback_does_not_reapply_written_orders(stream, monkeypatch):
+    database, checkpoints = stream
+    products = make_products(4)
+    orders = make_orders(products, 30, days=10)
+    _fail_rollups_once(monkeypatch, ValueError("bad order"))
+
+    async def scenario():
+        await database[settings.COLLECTION_PRODUCTS].insert_many(products)
+        await change_stream_listener._flush_batch(orders, {"_data": "1"}, "test")
+        return await _stored_totals(database)
+
+    assert asyncio.run(scenario()) == _expected_totals(orders, products)